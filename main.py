@@ -7,6 +7,12 @@ from forestfires_project.sync_data import sync_gcs_to_local_or_mount
 from forestfires_project.train import run_training
 from forestfires_project.evaluate import run_evaluation
 from forestfires_project.visualize import run_visualization
+from forestfires_project.export import run_export
+from forestfires_project.video import run_video
+from forestfires_project.multiplex import run_multiplex
+from forestfires_project.serve import run_serving
+from forestfires_project.autotune import run_autotune
+from forestfires_project.predict import OUTPUT_FORMATS, run_prediction
 
 # Add src directory to path for imports
 project_root = Path(__file__).parent
@@ -19,7 +25,21 @@ def main():
         "--pipeline",
         type=str,
         default="all",
-        choices=["sync", "train", "evaluate", "visualize", "api", "all"],
+        choices=[
+            "sync",
+            "train",
+            "evaluate",
+            "visualize",
+            "export",
+            "quantize",
+            "video",
+            "multiplex",
+            "api",
+            "serve",
+            "autotune",
+            "predict",
+            "all",
+        ],
         help="Choose pipeline stage",
     )
     parser.add_argument("--config", type=str, default="configs/config.yaml", help="Path to config file")
@@ -29,6 +49,30 @@ def main():
         "--gcs_uri", type=str, default="gs://forestfires-data-bucket/data/", help="GCS data prefix (end with /)"
     )
     parser.add_argument("--local_data_dir", type=str, default="data/", help="Local data directory (end with /)")
+    parser.add_argument(
+        "--export_formats", nargs="+", default=["onnx"], choices=["onnx", "openvino"], help="Formats for export stage"
+    )
+
+    parser.add_argument(
+        "--source",
+        type=str,
+        default=None,
+        help="Video file, camera index or rtsp:// / http:// URL for video stage; "
+        "image directory, glob or .txt list for predict stage",
+    )
+    parser.add_argument(
+        "--sources", nargs="+", default=None, help="Camera sources for multiplex stage (overrides multiplex.sources)"
+    )
+    parser.add_argument(
+        "--output", type=str, default=None, help="Output path for predict stage (overrides predict.output_path)"
+    )
+    parser.add_argument(
+        "--format",
+        type=str,
+        default=None,
+        choices=OUTPUT_FORMATS,
+        help="Output format for predict stage (overrides predict.output_format)",
+    )
 
     args = parser.parse_args()
 
@@ -53,10 +97,47 @@ def main():
         print(">>> STAGE: VISUALIZATION")
         run_visualization(config_path=args.config, model_path=model_path)
 
+    if args.pipeline == "export":
+        print(">>> STAGE: EXPORT")
+        run_export(config_path=args.config, model_path=model_path, formats=args.export_formats)
+
+    if args.pipeline == "quantize":
+        print(">>> STAGE: INT8 QUANTIZATION")
+        # Imported here: onnx / onnxruntime.quantization are only needed by this stage
+        from forestfires_project.quantize import run_quantization
+
+        run_quantization(config_path=args.config, model_path=model_path)
+
+    if args.pipeline == "video":
+        print(">>> STAGE: VIDEO INFERENCE")
+        run_video(config_path=args.config, model_path=model_path, source=args.source)
+
+    if args.pipeline == "multiplex":
+        print(">>> STAGE: MULTI-CAMERA INFERENCE")
+        run_multiplex(config_path=args.config, model_path=model_path, sources=args.sources)
+
     if args.pipeline == "api":
         print(">>> STAGE: STARTING API")
         uvicorn.run("forestfires_project.api:app", host="0.0.0.0", port=8000, reload=True)
 
+    if args.pipeline == "serve":
+        print(">>> STAGE: MULTI-PROCESS API")
+        run_serving(config_path=args.config)
+
+    if args.pipeline == "autotune":
+        print(">>> STAGE: EXECUTION AUTOTUNE")
+        run_autotune(config_path=args.config, model_path=model_path)
+
+    if args.pipeline == "predict":
+        print(">>> STAGE: BULK PREDICTION")
+        run_prediction(
+            config_path=args.config,
+            model_path=model_path,
+            source=args.source,
+            output_path=args.output,
+            output_format=args.format,
+        )
+
 
 if __name__ == "__main__":
     main()
@@ -1,27 +1,624 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Query
-from ultralytics import YOLO
-from PIL import Image
-import io
-import torch
-from fastapi.responses import StreamingResponse
-import numpy as np
-import cv2
-import psutil
-
-app = FastAPI(title="YOLO Inference API")
+from fastapi import FastAPI, HTTPException, UploadFile, File, Header, Query, Request, Response
+import asyncio
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+import functools
+import itertools
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+import yaml
+import zipfile
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from concurrent.futures import ThreadPoolExecutor
+
+from forestfires_project.backends import IMAGE_SUFFIXES, decode_downscaled, load_backend, quantization_mode
+from forestfires_project.batching import QueueFullError
+from forestfires_project.tiling import make_tiles, merge_tiles
+from forestfires_project.cache import ResultCache, content_hash, model_version
+from forestfires_project.detection_store import open_store
+from forestfires_project.execution import apply_execution_settings, execution_settings
+from forestfires_project import encoding, jobs, tracing
+from forestfires_project.annotate import FORMATS, draw_detections, encode_image, labels, resize
+from forestfires_project.metrics import ApiMetrics, SystemSampler
+from forestfires_project.registry import ModelRegistry
 
 MODEL_PATH = "models/forest_fire_detection/weights/best.pt"
+# Weights loaded at runtime through POST /models/load must live under this directory
+MODELS_DIR = "models"
+CONFIG_PATH = os.environ.get("API_CONFIG_PATH", "configs/config.yaml")
+
+
+def load_api_config(config_path=CONFIG_PATH, section="api"):
+    """Read one section of the project config, `api` by default (empty dict if missing)"""
+    if not os.path.exists(config_path):
+        return {}
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f) or {}
+    return config.get(section) or {}
+
+
+api_config = load_api_config()
+BACKEND = api_config.get("backend", "torch")
+# Thread counts / core pinning for this process (execution section, `api` overrides)
+EXECUTION = execution_settings(load_api_config(section="execution"), "api")
+
+
+# Replicas of the startup weights loaded by the serving parent before it forks workers
+_preloaded = []
+
+
+def preload_model():
+    """Load the startup weights in the serving parent process (see serve.py).
+    Forked workers then take these replicas and share their weight memory copy-on-write
+    instead of each reading best.pt. Only the torch backend is preloaded: ONNX Runtime and
+    OpenVINO sessions own thread pools that do not survive a fork.
+    """
+    if BACKEND != "torch":
+        return 0
+    _preloaded.extend(_load_model(MODEL_PATH).fuse() for _ in range(num_inference_workers))
+    return len(_preloaded)
+
+
+def _exported_path(weights_path):
+    """Explicitly configured ONNX / OpenVINO model served instead of weights_path (None if not set).
+    It only applies to the startup weights.
+    """
+    if BACKEND == "torch" or weights_path != MODEL_PATH:
+        return None
+    return api_config.get("exported_model_path")
+
+
+def _load_model(weights_path=MODEL_PATH):
+    if weights_path == MODEL_PATH and _preloaded:
+        return _preloaded.pop()
+    return load_backend(
+        BACKEND,
+        weights_path=weights_path,
+        exported_path=_exported_path(weights_path),
+        imgsz=api_config.get("img_size"),
+        num_threads=api_config.get("num_threads") or EXECUTION["intra_op_threads"],
+    )
+
+
+def _model_version(weights_path):
+    """Version of the artifact actually served: an explicit export (e.g. an INT8 model) gets its own"""
+    served = _exported_path(weights_path) or weights_path
+    return model_version(served, BACKEND, quantization_mode(served))
+
+
+# Sliced inference (?tiled=true) for small objects in high-resolution images
+tiling_config = load_api_config(section="tiling")
+TILING = (
+    int(tiling_config.get("tile_size", 640)),
+    float(tiling_config.get("overlap", 0.2)),
+    bool(tiling_config.get("include_full_image", True)),
+)
+
+# Repeated uploads (static cameras, client retries) are answered from this cache
+cache_config = api_config.get("cache", {})
+# The model always runs at this floor confidence with the maximum detection cap, and the
+# raw detections are cached; each request's conf/max_det is then just a filter on them
+FLOOR_CONF = float(cache_config.get("floor_conf", 0.05))
+MAX_DETECTIONS = 3000
+result_cache = (
+    ResultCache(max_bytes=cache_config.get("max_mb", 64) * 1024 * 1024, ttl_s=cache_config.get("ttl_s", 600))
+    if cache_config.get("enabled", True)
+    else None
+)
+
+
+executor_config = api_config.get("executor", {})
+num_inference_workers = max(1, int(executor_config.get("inference_workers", 1)))
+RETRY_AFTER_S = int(executor_config.get("retry_after_s", 1))
+
+# Decode/encode work runs here so it never blocks the event loop
+io_executor = ThreadPoolExecutor(max_workers=executor_config.get("io_workers", 4), thread_name_prefix="api-io")
+
+startup_config = api_config.get("startup", {})
+warmup_config = startup_config.get("warmup", {})
+
+# Every model version gets one replica per inference worker (Ultralytics predictors are not
+# thread-safe) and its own batcher; requests arriving within the batching window share a
+# single forward pass
+batching_config = api_config.get("batching", {})
+registry_config = api_config.get("registry", {})
+registry = ModelRegistry(
+    _load_model,
+    _model_version,
+    batcher_config={
+        "max_batch_size": batching_config.get("max_batch_size", 8),
+        "max_wait_ms": batching_config.get("max_wait_ms", 10),
+        "max_queue_size": executor_config.get("max_queue_size", 64),
+    },
+    num_replicas=num_inference_workers,
+    warmup_sizes=warmup_config.get("sizes") or [api_config.get("img_size") or 640],
+    warmup_batch_sizes=warmup_config.get("batch_sizes") or [1],
+    warmup_runs=warmup_config.get("runs", 1),
+    on_batch=lambda results: api_metrics.observe_batch(results),
+)
+
+
+def _retire_previous_default(old, new):
+    """Drain and free the old default once a new version takes over"""
+    if old is not None and old is not new and registry_config.get("unload_previous", True):
+        registry.unload(old.name)
+
+
+registry.add_listener(_retire_previous_default)
+
+
+def _decode_min_size(backend=None):
+    """Large JPEGs are decoded at a reduced scale, but never below the inference size"""
+    if not decode_config.get("downscale", True):
+        return 0
+    return int(decode_config.get("min_size") or api_config.get("img_size") or getattr(backend, "imgsz", None) or 640)
+
+
+decode_config = api_config.get("decode", {})
+DECODE_MIN_SIZE = _decode_min_size()
+
+# Defaults of /predict/image's format / quality / max_size query parameters
+annotate_config = api_config.get("annotate", {})
+
+# psutil is sampled in the background so scraping /metrics never blocks a worker
+metrics_config = api_config.get("metrics", {})
+system_sampler = SystemSampler(interval_s=metrics_config.get("sample_interval_s", 5))
+
+
+def _predict_job_batch(images, conf, iou, max_det, model=None):
+    """Synchronous batcher round trip for job workers: (img, orig_shape) pairs -> (Detections, model version).
+    Waits instead of failing while the queue is full, so a backfill yields to live traffic.
+    """
+    with registry.acquire(model) as entry:
+        results = []
+        chunk_size = entry.batcher.max_batch_size
+        for start in range(0, len(images), chunk_size):
+            chunk = images[start : start + chunk_size]
+            while True:
+                try:
+                    futures = entry.batcher.submit_many([img for img, _ in chunk], conf=conf, iou=iou, max_det=max_det)
+                    break
+                except QueueFullError:
+                    time.sleep(RETRY_AFTER_S)
+            results.extend(f.result().rescale(orig_shape) for f, (_, orig_shape) in zip(futures, chunk))
+        return results, entry.version
+
+
+def _decode_job_image(path):
+    with open(path, "rb") as f:
+        return decode_downscaled(f.read(), DECODE_MIN_SIZE)
+
+
+def _default_batcher():
+    try:
+        return registry.default.batcher
+    except KeyError:
+        return None  # still starting up
+
+
+api_metrics = ApiMetrics(sampler=system_sampler, batcher=_default_batcher, cache=result_cache)
+
+# Startup: not_started -> loading -> ready (or failed). Importing this module is cheap;
+# the model (and torch / ultralytics with it) is loaded by the lifespan handler
+_startup_lock = threading.Lock()
+startup_state = {"status": "not_started", "error": None, "seconds": None}
+
+
+def startup():
+    """Load and warm up the default model and start the background samplers (idempotent).
+    Runs from the lifespan handler, or on the first request when the app is served without
+    one (e.g. a plain TestClient).
+    """
+    global DECODE_MIN_SIZE
+    with _startup_lock:
+        if startup_state["status"] == "ready":
+            return
+        startup_state.update(status="loading", error=None)
+        start = time.perf_counter()
+        apply_execution_settings(EXECUTION, import_torch=BACKEND == "torch")
+        system_sampler.start()
+        try:
+            registry.load(MODEL_PATH, make_default=True, background=False)
+        except Exception as e:
+            startup_state.update(status="failed", error=str(e))
+            raise RuntimeError(f"Failed to load {BACKEND} model from {MODEL_PATH}: {e}")
+        DECODE_MIN_SIZE = _decode_min_size(registry.default.backend)
+        if registry_config.get("watch_interval_s", 0):
+            # Pick up best.pt rewritten by training without a restart
+            # (and a configured export, which is what is actually served)
+            extra = [_exported_path(MODEL_PATH)] if _exported_path(MODEL_PATH) else []
+            registry.watch(MODEL_PATH, interval_s=registry_config["watch_interval_s"], extra_paths=extra)
+        open_stores()
+        if job_runner is not None:
+            job_runner.start()
+        startup_state.update(status="ready", seconds=time.perf_counter() - start)
+        print(f"API ready in {startup_state['seconds']:.1f}s")
+
+
+def _startup_in_background():
+    try:
+        startup()
+    except RuntimeError as e:
+        print(e)  # reported by /ready
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if startup_config.get("background", False):
+        # Start listening right away; /ready answers 503 until the model is warm
+        startup_state["status"] = "loading"
+        threading.Thread(target=_startup_in_background, name="api-startup", daemon=True).start()
+    else:
+        await asyncio.to_thread(startup)
+    yield
+    registry.stop_watching()
+    if job_runner is not None:
+        job_runner.stop()
+    if detection_store is not None:
+        detection_store.flush()
+    system_sampler.stop()
+
+
+app = FastAPI(title="YOLO Inference API", lifespan=lifespan)
+
+# Per-stage spans feed the stage latency histograms and, optionally, a Server-Timing header
+tracing_config = api_config.get("tracing", {})
+SERVER_TIMING = tracing_config.get("server_timing", True)
+tracing.configure_tracing(
+    tracing_config.get("exporter", "none"), path=tracing_config.get("path", "reports/traces.jsonl")
+)
+tracing.add_listener(api_metrics.observe_stage)
+
+# Backend speed keys -> span names
+SPEED_STAGES = {"preprocess": "preprocess", "inference": "inference", "postprocess": "nms"}
+
+
+# Probes must answer while the model is still loading
+PROBE_PATHS = ("/health", "/ready")
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    if startup_state["status"] == "not_started" and request.url.path not in PROBE_PATHS:
+        # Served without the lifespan handler: load the model on first use
+        try:
+            await asyncio.to_thread(startup)
+        except RuntimeError as e:
+            print(e)  # answered as 503 by the endpoints, reported by /ready
+    start = time.perf_counter()
+    with tracing.start_trace(request.url.path) as trace:
+        response = await call_next(request)
+    # Label by route template (not raw path) to keep cardinality bounded
+    route = request.scope.get("route")
+    endpoint = route.path if route is not None else "unmatched"
+    api_metrics.observe_request(endpoint, request.method, response.status_code, time.perf_counter() - start)
+    if SERVER_TIMING and trace.spans:
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+
+async def run_in_io_pool(fn, *args):
+    """Run a blocking decode/encode function on the IO thread pool.
+    The caller's context is copied so spans recorded in the pool land in the request trace.
+    """
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(io_executor, functools.partial(ctx.run, fn, *args))
+
+
+def checkout_model(name=None):
+    """Check out a registry model (the default when name is None); release it with registry.release.
+    Unknown or not yet ready models are answered with 404, and every request with 503
+    while the API is still starting up (with Retry-After) or after startup failed (without:
+    the model will not load until the service is fixed and restarted).
+    """
+    if startup_state["status"] == "failed":
+        raise HTTPException(status_code=503, detail=f"Model failed to load: {startup_state['error']}")
+    if startup_state["status"] != "ready":
+        raise HTTPException(
+            status_code=503, detail="Model is still loading.", headers={"Retry-After": str(RETRY_AFTER_S)}
+        )
+    try:
+        return registry.checkout(name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+
+@contextmanager
+def acquire_model(name=None):
+    """Hold a registry model for one request (see checkout_model)"""
+    entry = checkout_model(name)
+    try:
+        yield entry
+    finally:
+        registry.release(entry)
+
+
+async def run_inference_many(images, conf, iou, max_det, entry=None):
+    """Queue images on the model's batcher and await their results without blocking the event loop.
+    Returns 503 with Retry-After when the inference queue is full.
+    """
+    entry = entry or registry.default
+    try:
+        futures = entry.batcher.submit_many(images, conf=conf, iou=iou, max_det=max_det)
+    except QueueFullError:
+        raise HTTPException(
+            status_code=503,
+            detail="Inference queue is full, please retry later.",
+            headers={"Retry-After": str(RETRY_AFTER_S)},
+        )
+    return await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+
+
+def _cache_keys(blobs, run_conf, iou, tiled, version):
+    tiling = TILING if tiled else None
+    return [(content_hash(data), run_conf, iou, tiling, version) for data in blobs]
+
+
+async def run_tiled_inference(img, conf, iou, max_det, entry=None):
+    """Slice one full-resolution image into tiles, run them through the batcher one batch
+    at a time and merge the per-tile detections in full-image coordinates
+    """
+    entry = entry or registry.default
+    tile_size, overlap, include_full = TILING
+    tiles, offsets = make_tiles(img, tile_size, overlap, include_full)
+    # A large image has more tiles than the queue holds: submit at most one forward pass worth at a time
+    batcher = entry.batcher
+    chunk_size = min(batcher.max_batch_size, batcher.max_queue_size or batcher.max_batch_size)
+    detections = []
+    for start in range(0, len(tiles), chunk_size):
+        detections.extend(await run_inference_many(tiles[start : start + chunk_size], conf, iou, max_det, entry))
+    with tracing.span("merge"):
+        return await run_in_io_pool(merge_tiles, detections, offsets, img.shape, iou, max_det)
+
+
+async def cached_inference(blobs, conf, iou, max_det, images=None, tiled=False, entry=None):
+    """Run inference on raw image bytes, answering repeated images from the result cache.
+
+    The cache holds the pre-threshold detection set (run at FLOOR_CONF), so the same image
+    with a different conf or max_det is answered by filtering instead of a forward pass.
+    Only cache misses are decoded (unless `images` are passed pre-decoded as (img, orig_shape)
+    pairs) and sent to the batcher. Boxes are always in original-image coordinates, even when
+    the image was decoded downscaled. Returns one Detections per blob, or the decode exception
+    for invalid images. With tiled=True, images are decoded at full resolution and sliced.
+    `entry` is the registry model to run (the default model if None).
+    """
+    entry = entry or registry.default
+    # Requests below the floor get their own (lower) run threshold and cache entries
+    run_conf = min(conf, FLOOR_CONF)
+    raw = [None] * len(blobs)
+    keys = None
+    if result_cache is not None:
+        with tracing.span("cache"):
+            keys = await run_in_io_pool(_cache_keys, blobs, run_conf, iou, tiled, entry.version)
+            raw = [result_cache.get(key) for key in keys]
+
+    misses = [i for i, r in enumerate(raw) if r is None]
+    if images is not None:
+        decoded = [images[i] for i in misses]
+    else:
+        decoded = await asyncio.gather(
+            *(run_in_io_pool(_decode_image, blobs[i], 0 if tiled else DECODE_MIN_SIZE) for i in misses),
+            return_exceptions=True,
+        )
+
+    valid = []
+    for i, img in zip(misses, decoded):
+        if isinstance(img, Exception):
+            raw[i] = img
+        else:
+            valid.append((i, img))
+
+    if valid:
+        # Queue wait + batched forward pass, then the backend's own per-image breakdown
+        with tracing.span("batch"):
+            if tiled:
+                detections = await asyncio.gather(
+                    *(run_tiled_inference(img, run_conf, iou, MAX_DETECTIONS, entry) for _, (img, _) in valid)
+                )
+            else:
+                detections = await run_inference_many(
+                    [img for _, (img, _) in valid], run_conf, iou, MAX_DETECTIONS, entry
+                )
+        for (i, (_, orig_shape)), det in zip(valid, detections):
+            for key, stage in SPEED_STAGES.items():
+                if (det.speed or {}).get(key) is not None:
+                    tracing.record(stage, det.speed[key])
+            det = det.rescale(orig_shape)
+            raw[i] = det
+            if keys is not None:
+                result_cache.put(keys[i], det)
+
+    return [r if isinstance(r, Exception) else r.filter(conf, max_det) for r in raw]
+
+
+def _decode_image(image_bytes, min_size=None):
+    """Decode upload bytes to the BGR array shared by the model and the annotator.
+    Returns (img, orig_shape); img may be downscaled relative to orig_shape.
+    """
+    with tracing.span("decode"):
+        return decode_downscaled(image_bytes, DECODE_MIN_SIZE if min_size is None else min_size)
+
+
+def build_prediction(filename, r, conf, iou, max_det):
+    """Convert one backend Detections object into the /predict response schema"""
+    with tracing.span("serialize"):
+        return _build_prediction(filename, r, conf, iou, max_det)
+
+
+def negotiate_format(accept, binary=True):
+    """Response media type for the request's Accept header (406 if none is supported).
+    The raw binary format only exists for single-image responses.
+    """
+    supported = [t for t in encoding.available_media_types() if binary or t != encoding.BINARY]
+    media_type = encoding.negotiate(accept, supported)
+    if media_type is None:
+        raise HTTPException(status_code=406, detail=f"Supported response formats: {', '.join(supported)}.")
+    return media_type
+
+
+def encode_prediction(filename, r, conf, iou, max_det, media_type):
+    """/predict response in the negotiated format: the regular schema or a compact columnar encoding"""
+    if media_type == encoding.JSON:
+        return build_prediction(filename, r, conf, iou, max_det)
+    with tracing.span("serialize"):
+        if media_type == encoding.BINARY:
+            names = {str(k): v for k, v in (r.names or {}).items()}
+            headers = {"X-Class-Names": json.dumps(names)}
+            return Response(encoding.encode_binary(r), media_type=media_type, headers=headers)
+        payload = encoding.build_columnar(filename, r, conf, iou, max_det)
+        return Response(encoding.encode_columnar(payload, media_type), media_type=media_type)
+
+
+def _build_prediction(filename, r, conf, iou, max_det):
+    # Classes map (id -> name)
+    names = r.names or {}
+
+    detections = []
+
+    if len(r) > 0:
+        # Convert numpy arrays to python types in one go
+        xyxy = r.boxes.tolist()
+        confs = r.scores.tolist()
+        clss = r.class_ids.tolist()
+
+        for box, score, cls_id in zip(xyxy, confs, clss):
+            cls_int = int(cls_id)
+            detections.append(
+                {
+                    "class_id": cls_int,
+                    "class_name": names.get(cls_int, str(cls_int)) if isinstance(names, dict) else str(cls_int),
+                    "confidence": float(score),
+                    "box_xyxy": [float(v) for v in box],  # [x1, y1, x2, y2]
+                }
+            )
+
+    # Optional: include speed info if present
+    speed = getattr(r, "speed", None)
+
+    return {
+        "filename": filename,
+        "image_size": {"width": r.orig_shape[1], "height": r.orig_shape[0]},
+        "conf": conf,
+        "iou": iou,
+        "max_det": max_det,
+        "num_detections": len(detections),
+        "detections": detections,
+        "speed": speed,  # may be None
+    }
+
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+MAX_BATCH_FILES = int(api_config.get("max_batch_files", 512))
+
+
+def iter_upload_images(uploads):
+    """Yield (name, bytes) for every image in the uploads, expanding zip/tar archives.
+    `uploads` is a list of (filename, file object) pairs; archives are read member by member.
+    """
+    for index, (filename, fileobj) in enumerate(uploads):
+        name = filename or f"image_{index}"
+        fileobj.seek(0)
+        if not name.lower().endswith(ARCHIVE_SUFFIXES):
+            yield name, fileobj.read()
+        elif name.lower().endswith(".zip"):
+            with zipfile.ZipFile(fileobj) as zf:
+                for info in zf.infolist():
+                    if not info.is_dir() and info.filename.lower().endswith(IMAGE_SUFFIXES):
+                        yield info.filename, zf.read(info)
+        else:
+            with tarfile.open(fileobj=fileobj, mode="r:*") as tf:
+                for member in tf:
+                    if member.isfile() and member.name.lower().endswith(IMAGE_SUFFIXES):
+                        yield member.name, tf.extractfile(member).read()
+
+
+def _read_uploads(uploads):
+    items = []
+    for item in iter_upload_images(uploads):
+        items.append(item)
+        if len(items) > MAX_BATCH_FILES:
+            raise HTTPException(status_code=413, detail=f"Too many images in one batch (max {MAX_BATCH_FILES}).")
+    return items
+
+
+def _take(iterator, n):
+    return list(itertools.islice(iterator, n))
+
+
+async def read_batch_uploads(files):
+    """Read uploaded files (plain images and/or archives) into (name, bytes) pairs"""
+    try:
+        with tracing.span("read"):
+            items = await run_in_io_pool(_read_uploads, [(f.filename, f.file) for f in files])
+    except (zipfile.BadZipFile, tarfile.TarError):
+        raise HTTPException(status_code=400, detail="Uploaded archive is not valid.")
+
+    if not items:
+        raise HTTPException(status_code=400, detail="No images uploaded.")
+    return items
+
+
+async def predict_chunk(items, conf, iou, max_det, tiled=False, entry=None, columnar=False):
+    """Decode a chunk of images in parallel and run them through the batcher together.
+    Returns one /predict-style dict per item (columnar ones with columnar=True);
+    undecodable images get an `error` entry.
+    """
+    results = await cached_inference([data for _, data in items], conf, iou, max_det, tiled=tiled, entry=entry)
+    record_detections([name for name, _ in items], results, entry or registry.default)
 
-# Load YOLO model once at startup
-try:
-    yolo = YOLO(MODEL_PATH)
-except Exception as e:
-    raise RuntimeError(f"Failed to load YOLO model from {MODEL_PATH}: {e}")
+    outputs = []
+    for (name, _), r in zip(items, results):
+        if isinstance(r, Exception):
+            outputs.append({"filename": name, "error": "Uploaded file is not a valid image."})
+        elif columnar:
+            with tracing.span("serialize"):
+                outputs.append(encoding.build_columnar(name, r, conf, iou, max_det))
+        else:
+            outputs.append(build_prediction(name, r, conf, iou, max_det))
+    return outputs
+
+
+def _chunk_size(entry):
+    return entry.batcher.max_batch_size * entry.batcher.num_workers
 
 
 @app.get("/")
 def read_root():
-    return {"message": "YOLO Inference API is running", "model_path": MODEL_PATH}
+    default = registry.default if startup_state["status"] == "ready" else None
+    return {
+        "message": "YOLO Inference API is running",
+        "model_path": default.weights_path if default else MODEL_PATH,
+        "backend": BACKEND,
+        "model_version": default.version if default else None,
+    }
+
+
+@app.get("/health")
+def health():
+    """Liveness: the process is up and serving HTTP (model may still be loading)"""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready():
+    """Readiness: 200 once the default model is loaded and warmed up, 503 before that"""
+    if startup_state["status"] != "ready":
+        return JSONResponse(
+            status_code=503, content={"status": startup_state["status"], "error": startup_state["error"]}
+        )
+    default = registry.default
+    return {
+        "status": "ready",
+        "model_version": default.version,
+        "startup_seconds": startup_state["seconds"],
+        "warmup_ms": default.warmup_ms,
+    }
 
 
 @app.post("/predict")
@@ -30,72 +627,63 @@ async def predict(
     conf: float = Query(0.25, ge=0.0, le=1.0, description="Confidence threshold"),
     iou: float = Query(0.7, ge=0.0, le=1.0, description="IoU threshold (NMS)"),
     max_det: int = Query(300, ge=1, le=3000, description="Max detections per image"),
+    tiled: bool = Query(False, description="Sliced inference for small objects in high-resolution images"),
+    model: str | None = Query(None, description="Model name or version (default model if omitted)"),
+    accept: str | None = Header(None, description="application/json, columnar JSON, msgpack or octet-stream"),
 ):
     try:
+        media_type = negotiate_format(accept)
+
         # Read and decode image
-        image_bytes = await file.read()
+        with tracing.span("read"):
+            image_bytes = await file.read()
         if not image_bytes:
             raise HTTPException(status_code=400, detail="Empty file uploaded.")
 
-        try:
-            img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        except Exception:
+        # Run inference through the result cache and micro-batcher
+        # Ultralytics handles preprocessing internally
+        with acquire_model(model) as entry:
+            r = (await cached_inference([image_bytes], conf, iou, max_det, tiled=tiled, entry=entry))[0]
+        if isinstance(r, Exception):
             raise HTTPException(status_code=400, detail="Uploaded file is not a valid image.")
+        record_detections([file.filename], [r], entry)
 
-        # Run inference
-        # Ultralytics handles preprocessing internally
-        results = yolo.predict(
-            source=img,
-            conf=conf,
-            iou=iou,
-            max_det=max_det,
-            verbose=False,
-        )
+        return encode_prediction(file.filename, r, conf, iou, max_det, media_type)
 
-        # results is a list (one per image)
-        r = results[0]
-
-        # Classes map (id -> name)
-        names = r.names if hasattr(r, "names") else getattr(yolo.model, "names", {})
-
-        detections = []
-
-        # r.boxes is an ultralytics Boxes object
-        if r.boxes is not None and len(r.boxes) > 0:
-            # xyxy, conf, cls are torch tensors
-            xyxy = r.boxes.xyxy
-            confs = r.boxes.conf
-            clss = r.boxes.cls
-
-            # Move to CPU and convert to python types safely
-            xyxy = xyxy.detach().cpu().tolist()
-            confs = confs.detach().cpu().tolist()
-            clss = clss.detach().cpu().tolist()
-
-            for box, score, cls_id in zip(xyxy, confs, clss):
-                cls_int = int(cls_id)
-                detections.append(
-                    {
-                        "class_id": cls_int,
-                        "class_name": names.get(cls_int, str(cls_int)) if isinstance(names, dict) else str(cls_int),
-                        "confidence": float(score),
-                        "box_xyxy": [float(v) for v in box],  # [x1, y1, x2, y2]
-                    }
-                )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Inference failed: {e}")
 
-        # Optional: include speed info if present
-        speed = getattr(r, "speed", None)
 
-        return {
-            "filename": file.filename,
-            "image_size": {"width": img.width, "height": img.height},
-            "conf": conf,
-            "iou": iou,
-            "max_det": max_det,
-            "num_detections": len(detections),
-            "detections": detections,
-            "speed": speed,  # may be None
-        }
+@app.post("/predict/batch")
+async def predict_batch(
+    files: list[UploadFile] = File(..., description="Image files and/or zip/tar archives of images"),
+    conf: float = Query(0.25, ge=0.0, le=1.0, description="Confidence threshold"),
+    iou: float = Query(0.7, ge=0.0, le=1.0, description="IoU threshold (NMS)"),
+    max_det: int = Query(300, ge=1, le=3000, description="Max detections per image"),
+    tiled: bool = Query(False, description="Sliced inference for small objects in high-resolution images"),
+    model: str | None = Query(None, description="Model name or version (default model if omitted)"),
+    accept: str | None = Header(None, description="application/json, columnar JSON or msgpack"),
+):
+    try:
+        media_type = negotiate_format(accept, binary=False)
+        columnar = media_type != encoding.JSON
+        items = await read_batch_uploads(files)
+
+        # Feed the batcher one chunk at a time so a large upload cannot monopolize the queue
+        results = []
+        with acquire_model(model) as entry:
+            chunk_size = _chunk_size(entry)
+            for start in range(0, len(items), chunk_size):
+                chunk = items[start : start + chunk_size]
+                results.extend(await predict_chunk(chunk, conf, iou, max_det, tiled, entry, columnar))
+
+        response = {"num_images": len(results), "results": results}
+        if columnar:
+            with tracing.span("serialize"):
+                return Response(encoding.encode_columnar(response, media_type), media_type=media_type)
+        return response
 
     except HTTPException:
         raise
@@ -103,11 +691,85 @@ async def predict(
         raise HTTPException(status_code=500, detail=f"Inference failed: {e}")
 
 
+def _spool_uploads(files):
+    """Copy uploads to temp files that outlive the request handler.
+    FastAPI closes UploadFiles before a StreamingResponse body runs.
+    """
+    spooled = []
+    try:
+        for file in files:
+            tmp = tempfile.TemporaryFile()
+            spooled.append((file.filename, tmp))
+            file.file.seek(0)
+            shutil.copyfileobj(file.file, tmp)
+    except BaseException:
+        for _, tmp in spooled:
+            tmp.close()
+        raise
+    return spooled
+
+
+async def stream_predictions(uploads, conf, iou, max_det, tiled=False, entry=None):
+    """Yield one NDJSON line per image as soon as its chunk has been processed.
+    Only one chunk of images is held in memory at a time. A checked-out registry `entry`
+    is released when the stream ends.
+    """
+    images = iter_upload_images(uploads)
+    try:
+        chunk_size = _chunk_size(entry or registry.default)
+        while True:
+            chunk = await run_in_io_pool(_take, images, chunk_size)
+            if not chunk:
+                break
+            for result in await predict_chunk(chunk, conf, iou, max_det, tiled, entry):
+                yield json.dumps(result) + "\n"
+    except HTTPException as e:
+        # Headers are already sent, so report the failure in-band
+        yield json.dumps({"error": e.detail, "status_code": e.status_code}) + "\n"
+    except (zipfile.BadZipFile, tarfile.TarError):
+        yield json.dumps({"error": "Uploaded archive is not valid.", "status_code": 400}) + "\n"
+    finally:
+        for _, tmp in uploads:
+            tmp.close()
+        if entry is not None:
+            registry.release(entry)
+
+
+@app.post("/predict/stream")
+async def predict_stream(
+    files: list[UploadFile] = File(..., description="Image files and/or zip/tar archives of images"),
+    conf: float = Query(0.25, ge=0.0, le=1.0, description="Confidence threshold"),
+    iou: float = Query(0.7, ge=0.0, le=1.0, description="IoU threshold (NMS)"),
+    max_det: int = Query(300, ge=1, le=3000, description="Max detections per image"),
+    tiled: bool = Query(False, description="Sliced inference for small objects in high-resolution images"),
+    model: str | None = Query(None, description="Model name or version (default model if omitted)"),
+):
+    """Like /predict/batch, but streams NDJSON (one line per image) while the batch is processed"""
+    # Checked out here (404 before streaming starts), released when the stream finishes
+    entry = checkout_model(model)
+    try:
+        uploads = await run_in_io_pool(_spool_uploads, files)
+    except BaseException:
+        # The stream never starts, so it cannot release the entry
+        registry.release(entry)
+        raise
+    return StreamingResponse(
+        stream_predictions(uploads, conf, iou, max_det, tiled, entry), media_type="application/x-ndjson"
+    )
+
+
 @app.get("/device")
 def device_info():
+    if BACKEND != "torch":
+        # ONNX Runtime / OpenVINO backends serve on CPU and never import torch
+        return {"torch_cuda_available": False, "device": "cpu", "backend": BACKEND}
+
+    import torch
+
     return {
         "torch_cuda_available": torch.cuda.is_available(),
         "device": "cuda" if torch.cuda.is_available() else "cpu",
+        "backend": BACKEND,
     }
 
 
@@ -117,77 +779,326 @@ async def predict_image(
     conf: float = Query(0.25, ge=0.0, le=1.0),
     iou: float = Query(0.7, ge=0.0, le=1.0),
     max_det: int = Query(300, ge=1, le=3000),
+    tiled: bool = Query(False),
+    model: str | None = Query(None),
+    fmt: str | None = Query(None, alias="format", description="jpeg | webp | png (default api.annotate.format)"),
+    quality: int | None = Query(None, ge=1, le=100, description="JPEG / WebP quality"),
+    max_size: int | None = Query(
+        None, ge=16, le=16384, description="Longer side of the returned image (default: original size)"
+    ),
 ):
+    fmt = (fmt or annotate_config.get("format", "jpeg")).lower()
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{fmt}', use one of {sorted(FORMATS)}")
+    quality = quality or annotate_config.get("quality")
+    max_size = max_size or annotate_config.get("max_size")
+
     try:
-        image_bytes = await file.read()
+        with tracing.span("read"):
+            image_bytes = await file.read()
         if not image_bytes:
             raise HTTPException(status_code=400, detail="Empty file uploaded.")
 
-        # Load image
-        pil_img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        img = np.array(pil_img)
-        img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR)
-
-        # Run YOLO
-        results = yolo.predict(
-            source=pil_img,
-            conf=conf,
-            iou=iou,
-            max_det=max_det,
-            verbose=False,
-        )
-        r = results[0]
-        names = r.names
-
-        # Draw boxes
-        if r.boxes is not None:
-            for box, score, cls_id in zip(r.boxes.xyxy, r.boxes.conf, r.boxes.cls):
-                x1, y1, x2, y2 = map(int, box.tolist())
-                cls_id = int(cls_id)
-                label = f"{names[cls_id]} {score:.2f}"
-
-                cv2.rectangle(img, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                cv2.putText(
-                    img,
-                    label,
-                    (x1, max(y1 - 10, 0)),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.6,
-                    (0, 0, 255),
-                    2,
-                )
+        # Decode once to BGR; the same array feeds the model and the annotator. The returned image
+        # keeps the upload's resolution unless max_size asks for less, so only shrink that far.
+        min_size = 0 if tiled or not max_size or not DECODE_MIN_SIZE else max(DECODE_MIN_SIZE, max_size)
+        try:
+            img, orig_shape = await run_in_io_pool(_decode_image, image_bytes, min_size)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Uploaded file is not a valid image.")
 
-        # Encode image to JPEG
-        _, encoded = cv2.imencode(".jpg", img)
+        # Run YOLO (or reuse cached detections for a repeated image)
+        with acquire_model(model) as entry:
+            images = [(img, orig_shape)]
+            r = (await cached_inference([image_bytes], conf, iou, max_det, images=images, tiled=tiled, entry=entry))[0]
+        record_detections([file.filename], [r], entry)
 
-        return StreamingResponse(
-            io.BytesIO(encoded.tobytes()),
-            media_type="image/jpeg",
-        )
+        # Resize to max_size, draw boxes and encode off the event loop
+        encoded, media_type = await run_in_io_pool(_annotate_and_encode, img, r, fmt, quality, max_size)
+
+        return Response(content=encoded, media_type=media_type)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _annotate_and_encode(img, r, fmt="jpeg", quality=None, max_size=None):
+    """Downscale the BGR image to max_size, draw the predicted boxes on it and encode it"""
+    with tracing.span("encode"):
+        img = resize(img, max_size)
+        return _draw_and_encode(img, r.rescale(img.shape), fmt, quality)
+
+
+def _draw_and_encode(img, r, fmt="jpeg", quality=None):
+    draw_detections(img, r.boxes, labels(r.names, r.class_ids, r.scores), color=(0, 0, 255))
+    return encode_image(img, fmt, quality)
+
+
+@app.get("/stats")
+def get_stats():
+    """Micro-batching (queue depth, batch sizes) and result cache (hit/miss) statistics for tuning"""
+    default = registry.default if startup_state["status"] == "ready" else None
+    return {
+        "model_version": default.version if default else None,
+        "batcher": default.batcher.stats() if default else None,
+        "cache": result_cache.stats() if result_cache is not None else None,
+        "models": registry.list(),
+    }
+
+
+@app.get("/models")
+def list_models():
+    """Loaded model versions, their status and in-flight requests"""
+    return registry.list()
+
+
+@app.post("/models/load", status_code=202)
+def load_model(
+    weights_path: str = Query(..., description=f"Weights file under {MODELS_DIR}/ (e.g. a new best.pt)"),
+    name: str | None = Query(None, description="Name to serve it under (defaults to its version)"),
+    make_default: bool = Query(False, description="Swap it in as the default once warmed up"),
+):
+    """Load and warm up a model version in the background; poll /models until it is ready"""
+    path = os.path.realpath(weights_path)
+    if os.path.commonpath([path, os.path.realpath(MODELS_DIR)]) != os.path.realpath(MODELS_DIR):
+        raise HTTPException(status_code=400, detail=f"Weights must be under {MODELS_DIR}/.")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Weights file {weights_path} not found.")
+    try:
+        entry = registry.load(path, name=name, make_default=make_default)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return entry.info()
+
+
+@app.post("/models/{name}/default")
+def set_default_model(name: str):
+    """Atomically route requests without ?model= to this version (the old default is drained)"""
+    try:
+        registry.set_default(name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    return registry.list()
+
+
+@app.delete("/models/{name}")
+def unload_model(name: str):
+    """Stop serving a version; it is freed once its in-flight requests finish"""
+    try:
+        entry = registry.unload(name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return entry.info()
+
+
+# Every scored image is kept in the detection store (queryable via GET /detections).
+# Opened by startup(), so forked serve workers each get their own SQLite connection
+detection_store = None
+
+
+def record_detections(names, results, entry, source="api"):
+    """Queue successfully scored images for the detection store (no-op if it is disabled)"""
+    if detection_store is None:
+        return
+    detection_store.record(
+        [(name, r) for name, r in zip(names, results) if not isinstance(r, Exception)], source, entry.version
+    )
+
+
+def _record_job_results(paths, results, version):
+    if detection_store is not None:
+        detection_store.record(list(zip(paths, results)), "jobs", version)
+
+
+# Offline jobs (POST /jobs): SQLite-backed queue processed by background worker threads
+jobs_config = api_config.get("jobs", {})
+JOBS_DIR = jobs_config.get("output_dir", "reports/jobs")
+JOB_SOURCE_ROOTS = jobs_config.get("source_roots", ["data"])
+# Every process accepts and reports jobs, but only one per deployment processes them
+# (serve.py elects worker 0)
+RUN_JOBS = True
+job_store = None
+job_runner = None
+
+
+def open_stores():
+    """Open the detection store, job store and (if RUN_JOBS) job runner of this process.
+    Called by startup(), i.e. after serve.py has forked, since SQLite connections must not
+    cross a fork.
+    """
+    global detection_store, job_store, job_runner
+    if detection_store is None:
+        detection_store = open_store({"detection_store": load_api_config(section="detection_store")})
+    if job_store is None and jobs_config.get("enabled", True):
+        job_store = jobs.JobStore(jobs_config.get("db_path", os.path.join(JOBS_DIR, "jobs.db")))
+    if job_runner is None and job_store is not None and RUN_JOBS:
+        job_runner = jobs.JobRunner(
+            job_store,
+            _predict_job_batch,
+            _decode_job_image,
+            _build_prediction,
+            workers=jobs_config.get("workers", 1),
+            batch_size=jobs_config.get("batch_size", 16),
+            decode_workers=executor_config.get("io_workers", 4),
+            poll_interval_s=jobs_config.get("poll_interval_s", 1.0),
+            on_results=_record_job_results,
+        )
+
+
+def _require_jobs():
+    if job_store is None:
+        raise HTTPException(status_code=404, detail="Jobs are disabled (api.jobs.enabled).")
+
+
+def _under_roots(path, roots):
+    path = os.path.realpath(path)
+    return any(os.path.commonpath([path, os.path.realpath(root)]) == os.path.realpath(root) for root in roots)
+
+
+def _extract_upload(file, dest):
+    """Write the images of an uploaded image or zip/tar archive under dest (member paths kept)"""
+    count = 0
+    for name, data in iter_upload_images([(file.filename, file.file)]):
+        relative = os.path.normpath(name).lstrip(os.sep)
+        if relative.startswith(".."):
+            continue
+        path = os.path.join(dest, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        count += 1
+    return count
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(
+    source: str | None = Query(None, description="Directory or glob of images under an api.jobs.source_roots dir"),
+    file: UploadFile | None = File(None, description="Image or zip/tar archive of images (instead of source)"),
+    conf: float = Query(0.25, ge=0.0, le=1.0, description="Confidence threshold"),
+    iou: float = Query(0.7, ge=0.0, le=1.0, description="IoU threshold (NMS)"),
+    max_det: int = Query(300, ge=1, le=3000, description="Max detections per image"),
+    model: str | None = Query(None, description="Model name or version (default model if omitted)"),
+    output: str = Query("jsonl", description="jsonl | parquet (one row per detection)"),
+):
+    """Queue an offline inference job over many images; poll GET /jobs/{id} for progress"""
+    _require_jobs()
+    if (source is None) == (file is None):
+        raise HTTPException(status_code=400, detail="Pass either a source path or an uploaded file.")
+    if output not in jobs.OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Output must be one of {', '.join(jobs.OUTPUT_FORMATS)}.")
+    if output == "parquet" and not jobs.parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet output needs pandas with pyarrow or fastparquet.")
+    params = {"conf": conf, "iou": iou, "max_det": max_det, "model": model}
+
+    if source is not None:
+        if not _under_roots(source, JOB_SOURCE_ROOTS):
+            raise HTTPException(status_code=400, detail=f"Source must be under {', '.join(JOB_SOURCE_ROOTS)}.")
+        paths = await run_in_io_pool(jobs.list_images, source)
+        if not paths:
+            raise HTTPException(status_code=404, detail=f"No images found at {source}.")
+        job = await run_in_io_pool(functools.partial(job_store.create, source, params, output, JOBS_DIR, paths=paths))
+    else:
+        # Uploads are unpacked next to the job's results and processed like a directory
+        job_id = uuid.uuid4().hex[:12]
+        dest = os.path.join(JOBS_DIR, job_id, "input")
+        try:
+            total = await run_in_io_pool(_extract_upload, file, dest)
+        except (zipfile.BadZipFile, tarfile.TarError):
+            raise HTTPException(status_code=400, detail="Uploaded archive is not valid.")
+        if not total:
+            raise HTTPException(status_code=400, detail="No images uploaded.")
+        paths = await run_in_io_pool(jobs.list_images, dest)
+        job = await run_in_io_pool(
+            functools.partial(job_store.create, dest, params, output, JOBS_DIR, paths=paths, job_id=job_id)
+        )
+
+    if job_runner is not None:
+        # Workers are stopped with the lifespan; make sure they run before waking them
+        job_runner.start()
+        job_runner.notify()
+    return jobs.job_info(job)
+
+
+@app.get("/jobs")
+def list_jobs(limit: int = Query(50, ge=1, le=1000)):
+    """Most recent jobs with their progress"""
+    _require_jobs()
+    return {"jobs": [jobs.job_info(job) for job in job_store.list(limit)]}
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Job status, progress (done / total), images/sec and ETA"""
+    _require_jobs()
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return jobs.job_info(job)
+
+
+@app.get("/jobs/{job_id}/results")
+def get_job_results(job_id: str):
+    """Download the job's results written so far (JSONL), or its Parquet file once completed"""
+    info = get_job(job_id)
+    path = info.get("parquet_path") if info["status"] == "completed" else None
+    path = path or info["output_path"]
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="No results yet.")
+    media_type = "application/octet-stream" if path.endswith(".parquet") else "application/x-ndjson"
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path))
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a queued or running job (a running job stops after its current batch)"""
+    _require_jobs()
+    try:
+        job = job_store.cancel(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return jobs.job_info(job)
+
+
+@app.get("/detections")
+def query_detections(
+    class_name: str | None = Query(None, description="e.g. smoke"),
+    min_conf: float | None = Query(None, ge=0.0, le=1.0, description="Minimum detection confidence"),
+    model: str | None = Query(None, description="Model version (see /models)"),
+    source: str | None = Query(None, description="api | jobs | predict | visualize"),
+    image: str | None = Query(None, description="Image filename or path"),
+    since: str | None = Query(None, description="ISO date/time, unix time or duration like 7d / 24h"),
+    until: str | None = Query(None, description="ISO date/time, unix time or duration like 1d"),
+    limit: int = Query(1000, ge=1, le=100000),
+):
+    """Stored detections matching all filters, most recent first (no inference)"""
+    if detection_store is None:
+        raise HTTPException(status_code=404, detail="The detection store is disabled (detection_store.enabled).")
+    try:
+        rows = detection_store.query(class_name, min_conf, model, source, image, since, until, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"num_detections": len(rows), "detections": rows}
+
+
 @app.get("/metrics")
+def get_metrics():
+    """Prometheus exposition: request counts, per-stage latency histograms, batch sizes,
+    queue depth, cache hit rates and system usage from the background sampler
+    """
+    body, content_type = api_metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/metrics/system")
 def get_system_metrics():
-    try:
-        metrics = {
-            "cpu_usage_percent": psutil.cpu_percent(interval=1),
-            "memory": {
-                "total": psutil.virtual_memory().total,
-                "available": psutil.virtual_memory().available,
-                "used": psutil.virtual_memory().used,
-                "percent": psutil.virtual_memory().percent,
-            },
-            "disk": {
-                "total": psutil.disk_usage("/").total,
-                "used": psutil.disk_usage("/").used,
-                "free": psutil.disk_usage("/").free,
-                "percent": psutil.disk_usage("/").percent,
-            },
-            "uptime_seconds": psutil.boot_time(),
-        }
-        return metrics
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to retrieve metrics: {e}")
+    """Latest CPU / memory / disk sample as JSON (no blocking psutil calls)"""
+    metrics = system_sampler.snapshot()
+    if not metrics:
+        raise HTTPException(status_code=503, detail="System metrics not sampled yet.")
+    return metrics
@@ -0,0 +1,175 @@
+"""Sweep CPU execution settings and report the fastest configuration for this host.
+
+Every candidate (inference workers x intra-op threads x batch size) runs the same batches
+through the serving backend; workers run concurrently, each on its own model replica, the
+way the API's inference workers do. Throughput and per-batch latency are reported so the
+`execution` / `api.executor` / `api.batching` config can be set for the host.
+"""
+
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+import yaml
+
+from forestfires_project.backends import IMAGE_SUFFIXES, load_backend
+from forestfires_project.execution import available_cpus, set_threads
+
+
+def powers_of_two(limit):
+    """1, 2, 4, ... up to limit, plus limit itself"""
+    values = [1 << i for i in range(limit.bit_length()) if 1 << i <= limit]
+    return sorted(set(values + [limit]))
+
+
+def candidate_grid(cpu_count, threads=None, workers=None, batch_sizes=(1, 4, 8)):
+    """(workers, threads, batch_size) candidates that do not use more threads than cores"""
+    threads = threads or powers_of_two(cpu_count)
+    workers = workers or powers_of_two(cpu_count)
+    return [(w, t, b) for w in workers for t in threads if w * t <= cpu_count for b in batch_sizes]
+
+
+def benchmark_candidate(replicas, images, batch_size, batches=10):
+    """Run `batches` batches on every replica concurrently.
+    Returns throughput (images/s) and per-batch latency percentiles (ms).
+    """
+    batch = [images[i % len(images)] for i in range(batch_size)]
+    for replica in replicas:
+        replica.predict(batch)  # warm-up for this batch shape
+
+    latencies = []
+    lock = threading.Lock()
+
+    def _run(replica):
+        for _ in range(batches):
+            t0 = time.perf_counter()
+            replica.predict(batch)
+            with lock:
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+
+    workers = [threading.Thread(target=_run, args=(replica,)) for replica in replicas]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "images_per_sec": len(replicas) * batches * batch_size / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def _load_images(image_dir, imgsz, limit=16):
+    """Up to `limit` test images (random noise if the split is not available)"""
+    names = []
+    if os.path.isdir(image_dir):
+        names = sorted(f for f in os.listdir(image_dir) if f.lower().endswith(IMAGE_SUFFIXES))
+    images = [img for img in (cv2.imread(os.path.join(image_dir, name)) for name in names[:limit]) if img is not None]
+    if not images:
+        rng = np.random.default_rng(0)
+        images = [rng.integers(0, 255, (imgsz, imgsz, 3), dtype=np.uint8) for _ in range(4)]
+    return images
+
+
+def run_autotune(config_path="configs/config.yaml", model_path=None, backend=None, output_path=None):
+    """Sweep workers / threads / batch size for the serving backend and report the best settings"""
+    # Resolve config path relative to project root
+    if not os.path.isabs(config_path):
+        config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), config_path)
+
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    # Setup root dir - resolve from config location
+    config_dir = os.path.dirname(config_path)
+    root = os.path.abspath(os.path.join(config_dir, config["paths"]["root_dir"]))
+
+    if model_path is None:
+        model_path = os.path.join(root, config["paths"]["models_dir"], config["project_name"], "weights", "best.pt")
+
+    if not os.path.exists(model_path):
+        print(f"Model not found at {model_path}. Please train first.")
+        return
+
+    api_config = config.get("api") or {}
+    backend = backend or api_config.get("backend", "torch")
+    tune_config = (config.get("execution") or {}).get("autotune") or {}
+    imgsz = api_config.get("img_size") or config["hyperparameters"]["img_size"]
+    images = _load_images(os.path.join(root, config["paths"]["test_images"]), imgsz)
+
+    cpu_count = len(available_cpus())
+    candidates = candidate_grid(
+        cpu_count, tune_config.get("threads"), tune_config.get("workers"), tune_config.get("batch_sizes") or [1, 4, 8]
+    )
+    print(f"Autotuning {backend} on {cpu_count} cores: {len(candidates)} candidates...")
+
+    # torch threads are per process, ONNX Runtime / OpenVINO threads per session
+    replicas = {}
+
+    def get_replicas(num_threads, count):
+        key = None if backend == "torch" else num_threads
+        pool = replicas.setdefault(key, [])
+        while len(pool) < count:
+            pool.append(load_backend(backend, weights_path=model_path, num_threads=num_threads))
+        return pool[:count]
+
+    results = []
+    for workers, num_threads, batch_size in candidates:
+        set_threads(num_threads, import_torch=backend == "torch")
+        stats = benchmark_candidate(
+            get_replicas(num_threads, workers), images, batch_size, batches=tune_config.get("batches", 10)
+        )
+        result = {"workers": workers, "threads": num_threads, "batch_size": batch_size, **stats}
+        results.append(result)
+        print(
+            f"workers={workers} threads={num_threads} batch={batch_size}: {stats['images_per_sec']:.1f} img/s, "
+            f"p50 {stats['p50_ms']:.0f}ms / p95 {stats['p95_ms']:.0f}ms"
+        )
+
+    best_throughput = max(results, key=lambda r: r["images_per_sec"])
+    # Latency is compared at the smallest batch size (what a single interactive request sees)
+    smallest = min(r["batch_size"] for r in results)
+    best_latency = min((r for r in results if r["batch_size"] == smallest), key=lambda r: r["p95_ms"])
+    report = {
+        "backend": backend,
+        "cpu_count": cpu_count,
+        "results": results,
+        "best_throughput": best_throughput,
+        "best_latency": best_latency,
+    }
+
+    if output_path is None:
+        output_path = os.path.join(root, config["paths"]["reports_dir"], "autotune.json")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for label, best in (("throughput", best_throughput), ("latency", best_latency)):
+        print(
+            f"Best {label}: execution.intra_op_threads={best['threads']}, "
+            f"api.executor.inference_workers={best['workers']}, api.batching.max_batch_size={best['batch_size']} "
+            f"({best['images_per_sec']:.1f} img/s, p95 {best['p95_ms']:.0f}ms)"
+        )
+    print(f"Autotune report saved to {output_path}")
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Find the fastest thread / worker / batch settings for this host")
+    parser.add_argument("--config", type=str, default="configs/config.yaml", help="Path to config file")
+    parser.add_argument(
+        "--model_path", type=str, default=None, help="Path to model weights (optional, uses best.pt if not provided)"
+    )
+    parser.add_argument("--backend", type=str, default=None, help="torch | onnx | openvino (defaults to api.backend)")
+    parser.add_argument("--output", type=str, default=None, help="JSON report path")
+    args = parser.parse_args()
+
+    run_autotune(config_path=args.config, model_path=args.model_path, backend=args.backend, output_path=args.output)
@@ -0,0 +1,486 @@
+"""Inference backends for serving.
+
+All backends take a list of images (PIL images or BGR numpy arrays, like Ultralytics)
+and return one Detections object per image. Only the torch backend imports
+torch/ultralytics, so ONNX Runtime / OpenVINO serving stays lightweight.
+"""
+
+import ast
+import io
+import os
+import time
+
+import cv2
+import numpy as np
+
+BACKENDS = ("torch", "onnx", "openvino")
+# File suffixes treated as images by every directory / archive reader (jobs, predict, video, API uploads)
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+class Detections:
+    """Backend-independent detections for one image, in original-image pixel coordinates"""
+
+    def __init__(self, boxes, scores, class_ids, names, orig_shape, speed=None):
+        """
+        Args:
+            boxes: (N, 4) float32 array of [x1, y1, x2, y2]
+            scores: (N,) float32 array of confidences
+            class_ids: (N,) int array of class indices
+            names: Dictionary of class mappings (id -> name)
+            orig_shape: (height, width) of the source image
+            speed: Optional dict of per-stage timings in ms
+        """
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        self.class_ids = np.asarray(class_ids, dtype=np.int64).reshape(-1)
+        self.names = names
+        self.orig_shape = tuple(orig_shape)
+        self.speed = speed
+
+    def __len__(self):
+        return len(self.scores)
+
+    @property
+    def data(self):
+        """(N, 6) array of [x1, y1, x2, y2, conf, class_id] (same layout as Ultralytics boxes.data)"""
+        return np.concatenate([self.boxes, self.scores[:, None], self.class_ids[:, None].astype(np.float32)], axis=1)
+
+    def filter(self, conf=0.0, max_det=None):
+        """Detections scoring above conf, keeping at most the max_det highest-scoring ones.
+        Equivalent to re-running NMS at the higher threshold: lower-scoring boxes never
+        suppress higher-scoring ones in greedy NMS.
+        """
+        keep = np.flatnonzero(self.scores > conf)
+        if max_det is not None and len(keep) > max_det:
+            keep = np.sort(keep[np.argsort(-self.scores[keep], kind="stable")[:max_det]])
+        return Detections(
+            self.boxes[keep], self.scores[keep], self.class_ids[keep], self.names, self.orig_shape, self.speed
+        )
+
+    def rescale(self, orig_shape):
+        """Detections with boxes mapped from this image size to an image of shape `orig_shape` (h, w)"""
+        orig_shape = tuple(orig_shape[:2])
+        if orig_shape == tuple(self.orig_shape[:2]):
+            return self
+        gy = orig_shape[0] / self.orig_shape[0]
+        gx = orig_shape[1] / self.orig_shape[1]
+        boxes = self.boxes * np.array([gx, gy, gx, gy], dtype=self.boxes.dtype)
+        return Detections(boxes, self.scores, self.class_ids, self.names, orig_shape, self.speed)
+
+    @classmethod
+    def from_ultralytics(cls, result):
+        """Convert an Ultralytics Results object"""
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            xyxy, confs, clss = np.zeros((0, 4)), np.zeros(0), np.zeros(0)
+        else:
+            xyxy = boxes.xyxy.detach().cpu().numpy()
+            confs = boxes.conf.detach().cpu().numpy()
+            clss = boxes.cls.detach().cpu().numpy()
+        return cls(xyxy, confs, clss, result.names, result.orig_shape, getattr(result, "speed", None))
+
+
+def nms(boxes, scores, iou_threshold):
+    """Greedy non-maximum suppression. Returns indices of kept boxes, highest score first."""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+
+    return np.array(keep, dtype=np.int64)
+
+
+def box_iou(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy arrays"""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = (br - tl).clip(0).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).clip(0).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).clip(0).prod(axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def letterbox(img, size, stride=None, color=114):
+    """Resize keeping aspect ratio and pad to a size x size square (same as Ultralytics LetterBox).
+    With `stride`, pad only up to the next multiple of stride (minimal rectangle).
+    Returns the padded image, the scale gain and the (left, top) padding.
+    """
+    h, w = img.shape[:2]
+    gain = min(size / h, size / w)
+    nh, nw = round(h * gain), round(w * gain)
+    dh, dw = size - nh, size - nw
+    if stride:
+        dh, dw = dh % stride, dw % stride
+
+    if (nh, nw) != (h, w):
+        img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+
+    top, bottom = round(dh / 2 - 0.1), round(dh / 2 + 0.1)
+    left, right = round(dw / 2 - 0.1), round(dw / 2 + 0.1)
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(color, color, color))
+    return img, gain, (left, top)
+
+
+# cv2.IMREAD_REDUCED_* flags decode JPEGs at 1/2, 1/4 or 1/8 scale in the DCT domain
+REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def decode_image(data, reduce=1):
+    """Decode encoded image bytes straight into a BGR uint8 array (no PIL round-trip).
+
+    Args:
+        data: Encoded image bytes (jpg/png/bmp/webp/tiff via OpenCV; GIF falls back to PIL)
+        reduce: Downscale factor applied while decoding (1, 2, 4 or 8)
+
+    Raises:
+        ValueError: If the bytes are not a decodable image
+    """
+    if reduce not in REDUCED_DECODE_FLAGS:
+        raise ValueError(f"Unsupported decode reduction {reduce}. Choose from {tuple(REDUCED_DECODE_FLAGS)}.")
+
+    # EXIF orientation is ignored, so box coordinates refer to the stored pixel grid
+    flags = REDUCED_DECODE_FLAGS[reduce] | cv2.IMREAD_IGNORE_ORIENTATION
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+    if img is not None:
+        return img
+
+    # Only sniffed formats go to PIL: Ultralytics patches Image.open to install
+    # a HEIF plugin whenever it fails, which must not happen per bad upload
+    if data[:4] != b"GIF8":
+        raise ValueError("Not a valid image.")
+
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as pil_img:
+        img = to_bgr_array(pil_img)
+    if reduce > 1:
+        img = cv2.resize(img, (img.shape[1] // reduce, img.shape[0] // reduce), interpolation=cv2.INTER_AREA)
+    return img
+
+
+def jpeg_size(data):
+    """(width, height) read from a JPEG header without decoding pixels, or None if not a JPEG"""
+    if data[:2] != b"\xff\xd8":
+        return None
+
+    # The plugin class only parses the header (and bypasses the patched Image.open)
+    from PIL import JpegImagePlugin
+
+    try:
+        return JpegImagePlugin.JpegImageFile(io.BytesIO(data)).size
+    except Exception:
+        return None
+
+
+def decode_downscaled(data, min_size):
+    """Decode an image, shrinking large JPEGs while decoding so the longer side stays >= min_size.
+
+    A 4000x3000 JPEG served at 640 is decoded at 1000x750 (1/4 scale in the DCT domain)
+    instead of allocating the full-resolution array. Other formats decode at full size.
+
+    Returns:
+        (img, orig_shape): BGR array and the (h, w) of the full-resolution image
+    """
+    size = jpeg_size(data) if min_size else None
+    reduce = 1
+    if size is not None:
+        reduce = next((f for f in (8, 4, 2) if max(size) // f >= min_size), 1)
+
+    img = decode_image(data, reduce=reduce)
+    orig_shape = (size[1], size[0]) if reduce > 1 else img.shape[:2]
+    return img, orig_shape
+
+
+def to_bgr_array(image):
+    """Accept a PIL image (RGB) or a numpy array (BGR, Ultralytics convention)"""
+    if isinstance(image, np.ndarray):
+        return image
+    return cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+
+
+class TorchBackend:
+    """PyTorch backend wrapping an Ultralytics YOLO model"""
+
+    name = "torch"
+
+    def __init__(self, weights_path, imgsz=None):
+        from ultralytics import YOLO
+
+        self.weights_path = weights_path
+        self.imgsz = imgsz
+        self.model = YOLO(weights_path)
+        self.names = self.model.names
+
+    def fuse(self):
+        """Fold BatchNorm into the convolutions now instead of on the first predict.
+        Done before forking serving workers so they share the fused weights copy-on-write.
+        """
+        self.model.fuse(verbose=False)
+        return self
+
+    def predict(self, images, conf=0.25, iou=0.7, max_det=300):
+        kwargs = {"imgsz": self.imgsz} if self.imgsz else {}
+        results = self.model.predict(source=images, conf=conf, iou=iou, max_det=max_det, verbose=False, **kwargs)
+        return [Detections.from_ultralytics(r) for r in results]
+
+
+class OnnxBackend:
+    """ONNX Runtime backend for models exported with export_model(format="onnx").
+
+    Preprocessing (letterbox) and postprocessing (box decoding + NMS) are done in numpy,
+    mirroring Ultralytics so results match the torch backend within tolerance.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path, imgsz=None, num_threads=None):
+        import onnxruntime as ort
+
+        self.model_path = model_path
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = int(num_threads)
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+        # Ultralytics stores class names and image size in the ONNX metadata
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+        self.imgsz = int(imgsz or ast.literal_eval(metadata.get("imgsz", "[640, 640]"))[0])
+        self.stride = int(metadata.get("stride", 32))
+        input_shape = self.session.get_inputs()[0].shape
+        self.dynamic_batch = not isinstance(input_shape[0], int)
+        self.dynamic_shape = not isinstance(input_shape[2], int)
+
+    def _run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+    def _forward(self, batch):
+        # Static-batch exports can only take one image per call
+        if self.dynamic_batch:
+            return self._run(batch)
+        return np.concatenate([self._run(batch[i : i + 1]) for i in range(len(batch))])
+
+    def predict(self, images, conf=0.25, iou=0.7, max_det=300):
+        t0 = time.perf_counter()
+        arrays = [to_bgr_array(img) for img in images]
+        # Like Ultralytics, use minimal rectangular padding when every image has the same shape
+        rect = self.dynamic_shape and len({img.shape for img in arrays}) == 1
+        padded, transforms = [], []
+        for img in arrays:
+            canvas, gain, pad = letterbox(img, self.imgsz, stride=self.stride if rect else None)
+            padded.append(canvas)
+            transforms.append((gain, pad, img.shape[:2]))
+        # BGR HWC uint8 -> RGB CHW float32 in [0, 1]
+        batch = np.ascontiguousarray(np.stack(padded)[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+
+        t1 = time.perf_counter()
+        preds = self._forward(batch)
+        t2 = time.perf_counter()
+
+        detections = [self._postprocess(p, conf, iou, max_det, *tr) for p, tr in zip(preds, transforms)]
+        t3 = time.perf_counter()
+
+        n = len(images)
+        speed = {
+            "preprocess": (t1 - t0) * 1000.0 / n,
+            "inference": (t2 - t1) * 1000.0 / n,
+            "postprocess": (t3 - t2) * 1000.0 / n,
+        }
+        for det in detections:
+            det.speed = speed
+        return detections
+
+    def _postprocess(self, pred, conf, iou, max_det, gain, pad, orig_shape):
+        # pred: (4 + num_classes, num_anchors) with boxes as cx, cy, w, h
+        pred = pred.T
+        class_scores = pred[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(pred)), class_ids]
+
+        mask = scores > conf
+        pred, scores, class_ids = pred[mask], scores[mask], class_ids[mask]
+
+        boxes = np.empty((len(pred), 4), dtype=np.float32)
+        boxes[:, :2] = pred[:, :2] - pred[:, 2:4] / 2
+        boxes[:, 2:] = pred[:, :2] + pred[:, 2:4] / 2
+
+        # Per-class NMS: offset boxes by class so different classes never overlap
+        keep = nms(boxes + class_ids[:, None] * 7680.0, scores, iou)[:max_det]
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+        # Undo letterbox
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad[0]) / gain).clip(0, orig_shape[1])
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad[1]) / gain).clip(0, orig_shape[0])
+        return Detections(boxes, scores, class_ids, self.names, orig_shape)
+
+
+class OpenVinoBackend(OnnxBackend):
+    """OpenVINO backend for models exported with export_model(format="openvino")"""
+
+    name = "openvino"
+
+    def __init__(self, model_path, imgsz=None, num_threads=None):
+        import openvino as ov
+        import yaml
+
+        # Ultralytics exports a directory containing <name>.xml/.bin and metadata.yaml
+        model_dir = model_path if os.path.isdir(model_path) else os.path.dirname(model_path)
+        xml_path = next(os.path.join(model_dir, f) for f in sorted(os.listdir(model_dir)) if f.endswith(".xml"))
+        with open(os.path.join(model_dir, "metadata.yaml"), "r") as f:
+            metadata = yaml.safe_load(f)
+
+        self.model_path = xml_path
+        self.names = metadata.get("names", {})
+        self.imgsz = int(imgsz or metadata.get("imgsz", [640])[0])
+        self.stride = int(metadata.get("stride", 32))
+        self.dynamic_batch = True
+        self.dynamic_shape = True
+
+        config = {"INFERENCE_NUM_THREADS": int(num_threads)} if num_threads else {}
+        self.compiled = ov.Core().compile_model(xml_path, "CPU", config)
+
+    def _run(self, batch):
+        return self.compiled(batch)[0]
+
+
+def quantization_mode(path):
+    """ "int8" for a model written by the quantize stage (<stem>_int8.onnx), None otherwise"""
+    stem = os.path.splitext(os.path.basename(path.rstrip("/\\")))[0]
+    return "int8" if stem.endswith("_int8") else None
+
+
+def exported_model_path(weights_path, fmt):
+    """Where Ultralytics writes an exported model for the given weights"""
+    stem = os.path.splitext(weights_path)[0]
+    return f"{stem}.onnx" if fmt == "onnx" else f"{stem}_openvino_model"
+
+
+def _digest_path(exported_path):
+    """Sidecar file recording the digest of the weights an export was made from"""
+    return exported_path.rstrip("/\\") + ".source"
+
+
+def export_is_current(exported_path, weights_path):
+    """True if exported_path exists and was exported from the current contents of weights_path"""
+    from forestfires_project.cache import file_digest
+
+    if not os.path.exists(exported_path) or not os.path.exists(_digest_path(exported_path)):
+        return False
+    with open(_digest_path(exported_path)) as f:
+        return f.read().strip() == file_digest(weights_path)
+
+
+def export_model(weights_path, fmt="onnx", imgsz=640):
+    """Export PyTorch weights (e.g. best.pt) to ONNX or OpenVINO IR. Returns the exported path.
+    The digest of the weights is recorded next to the export, so load_backend() can tell when it is stale.
+    """
+    from ultralytics import YOLO
+
+    from forestfires_project.cache import file_digest
+
+    if fmt not in ("onnx", "openvino"):
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    print(f"Exporting {weights_path} to {fmt}...")
+    # Dynamic axes so the micro-batcher can run several images per forward pass
+    path = str(YOLO(weights_path).export(format=fmt, imgsz=imgsz, dynamic=True, simplify=True))
+    with open(_digest_path(path), "w") as f:
+        f.write(file_digest(weights_path))
+    print(f"Exported model saved to {path}")
+    return path
+
+
+def load_backend(backend="torch", weights_path=None, exported_path=None, imgsz=None, num_threads=None):
+    """Create an inference backend.
+
+    Args:
+        backend: One of "torch", "onnx", "openvino"
+        weights_path: PyTorch weights (best.pt); exported models default to live next to it and
+            are re-exported when the weights have changed since the last export
+        exported_path: Explicit path to the .onnx file / OpenVINO model directory (used as is)
+        imgsz: Inference image size (defaults to the size the model was trained/exported at)
+        num_threads: Intra-op threads for ONNX Runtime / OpenVINO
+    """
+    if backend == "torch":
+        return TorchBackend(weights_path, imgsz=imgsz)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+
+    if exported_path:
+        path = exported_path
+    else:
+        path = exported_model_path(weights_path, backend)
+        if not export_is_current(path, weights_path):
+            path = export_model(weights_path, fmt=backend, imgsz=imgsz or 640)
+
+    if backend == "onnx":
+        return OnnxBackend(path, imgsz=imgsz, num_threads=num_threads)
+    return OpenVinoBackend(path, imgsz=imgsz, num_threads=num_threads)
+
+
+def check_parity(reference, candidate, images, conf=0.25, iou=0.7, min_box_iou=0.9, score_tolerance=0.05):
+    """Check that two backends produce matching detections on the same images.
+
+    Each reference detection must match a candidate detection of the same class with
+    box IoU >= min_box_iou and |score difference| <= score_tolerance, and vice versa.
+    Returns a report dict with a boolean `passed`.
+    """
+    ref_dets = reference.predict(images, conf=conf, iou=iou)
+    cand_dets = candidate.predict(images, conf=conf, iou=iou)
+
+    matched, unmatched_ref = 0, 0
+    worst_iou, worst_score_diff = 1.0, 0.0
+
+    for ref, cand in zip(ref_dets, cand_dets):
+        ious = np.zeros((len(ref), len(cand)), dtype=np.float32)
+        if len(ref) and len(cand):
+            ious = box_iou(ref.boxes, cand.boxes)
+        score_diff = np.abs(ref.scores[:, None] - cand.scores[None, :])
+        # Only same-class pairs within both tolerances can match; -1 marks pairs that cannot
+        candidates = np.where(
+            (ref.class_ids[:, None] == cand.class_ids[None, :])
+            & (ious >= min_box_iou)
+            & (score_diff <= score_tolerance),
+            ious,
+            -1.0,
+        )
+        # Greedy by reference score: each reference takes the best candidate still unused
+        for i in np.argsort(-ref.scores):
+            j = int(candidates[i].argmax()) if len(cand) else -1
+            if j >= 0 and candidates[i, j] >= 0:
+                candidates[:, j] = -1.0
+                matched += 1
+                worst_iou = min(worst_iou, float(ious[i, j]))
+                worst_score_diff = max(worst_score_diff, float(score_diff[i, j]))
+            else:
+                unmatched_ref += 1
+    unmatched_cand = sum(len(cand) for cand in cand_dets) - matched
+
+    return {
+        "reference": reference.name,
+        "candidate": candidate.name,
+        "images": len(images),
+        "matched": matched,
+        "unmatched_reference": unmatched_ref,
+        "unmatched_candidate": unmatched_cand,
+        "min_matched_iou": worst_iou,
+        "max_score_diff": worst_score_diff,
+        "passed": unmatched_ref == 0 and unmatched_cand == 0,
+    }
@@ -0,0 +1,186 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class QueueFullError(RuntimeError):
+    """Raised by MicroBatcher.submit when the pending-request queue is at capacity"""
+
+
+class MicroBatcher:
+    """Coalesces single-image inference requests into batched forward passes.
+
+    Requests arriving within ``max_wait_ms`` of the first queued request (up to
+    ``max_batch_size`` images) are grouped by their inference parameters and run
+    through ``predict_fn`` in one call. Each caller gets a Future for its own result.
+    At most ``max_queue_size`` requests may be pending; beyond that submit() fails fast
+    with QueueFullError so callers can shed load instead of queueing unboundedly.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=10.0, max_queue_size=0, num_workers=1):
+        """
+        Args:
+            predict_fn: Callable taking (images, **params) and returning one result per image
+            max_batch_size: Maximum number of images per forward pass
+            max_wait_ms: How long to wait for more requests after the first one arrives
+            max_queue_size: Maximum number of pending requests (0 = unbounded)
+            num_workers: Number of worker threads calling predict_fn concurrently
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_queue_size = max(0, int(max_queue_size))
+        self.num_workers = max(1, int(num_workers))
+
+        self._queue = queue.Queue()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._requests_total = 0
+        self._rejected_total = 0
+        self._batches_total = 0
+        self._images_total = 0
+        self._batch_size_counts = {}
+        self._max_queue_depth = 0
+        self._wait_ms_total = 0.0
+        self._inference_ms_total = 0.0
+
+    def start(self):
+        """Start the background worker threads (called lazily on first submit)"""
+        with self._start_lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.num_workers:
+                thread = threading.Thread(target=self._run, name=f"micro-batcher-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        """Stop the worker threads after the queued requests have been processed"""
+        with self._start_lock:
+            alive = [t for t in self._threads if t.is_alive()]
+            for _ in alive:
+                self._queue.put(None)
+            for thread in alive:
+                thread.join(timeout)
+            self._threads = []
+
+    def submit(self, image, **params):
+        """Queue one image for inference. Returns a concurrent.futures.Future with its result.
+
+        Raises:
+            QueueFullError: If max_queue_size requests are already pending
+        """
+        return self.submit_many([image], **params)[0]
+
+    def submit_many(self, images, **params):
+        """Queue several images sharing the same parameters, all or nothing.
+        Returns one Future per image, in order.
+
+        Raises:
+            QueueFullError: If the queue cannot take all images
+        """
+        self.start()
+        key = tuple(sorted(params.items()))
+
+        with self._stats_lock:
+            depth = self._queue.qsize()
+            if self.max_queue_size and depth + len(images) > self.max_queue_size:
+                self._rejected_total += len(images)
+                raise QueueFullError(f"Inference queue is full ({depth} pending requests)")
+            self._requests_total += len(images)
+            self._max_queue_depth = max(self._max_queue_depth, depth + len(images))
+
+            futures = []
+            submitted = time.perf_counter()
+            for image in images:
+                future = Future()
+                self._queue.put((image, key, future, submitted))
+                futures.append(future)
+
+        return futures
+
+    def stats(self):
+        """Queue-depth and batch-size statistics for tuning the batching window"""
+        with self._stats_lock:
+            batches = self._batches_total
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "max_queue_size": self.max_queue_size,
+                "num_workers": self.num_workers,
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self._max_queue_depth,
+                "requests_total": self._requests_total,
+                "rejected_total": self._rejected_total,
+                "batches_total": batches,
+                "images_total": self._images_total,
+                "avg_batch_size": self._images_total / batches if batches else 0.0,
+                "batch_size_counts": dict(sorted(self._batch_size_counts.items())),
+                "avg_queue_wait_ms": self._wait_ms_total / self._images_total if self._images_total else 0.0,
+                "avg_inference_ms": self._inference_ms_total / batches if batches else 0.0,
+            }
+
+    def _collect(self, first):
+        """Gather more requests until the batch is full or the window closes"""
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        stop = False
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Shutdown sentinel: finish this batch, then exit
+                stop = True
+                break
+            batch.append(item)
+
+        return batch, stop
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch, stop = self._collect(first)
+            self._process(batch)
+
+            if stop:
+                return
+
+    def _process(self, batch):
+        started = time.perf_counter()
+
+        # Requests with different conf/iou/max_det cannot share a forward pass
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[1], []).append(item)
+
+        for key, items in groups.items():
+            images = [item[0] for item in items]
+            t0 = time.perf_counter()
+            try:
+                results = self.predict_fn(images, **dict(key))
+            except Exception as e:
+                for item in items:
+                    item[2].set_exception(e)
+                continue
+            elapsed_ms = (time.perf_counter() - t0) * 1000.0
+
+            for item, result in zip(items, results):
+                item[2].set_result(result)
+
+            with self._stats_lock:
+                self._batches_total += 1
+                self._images_total += len(items)
+                self._batch_size_counts[len(items)] = self._batch_size_counts.get(len(items), 0) + 1
+                self._inference_ms_total += elapsed_ms
+                self._wait_ms_total += sum((started - item[3]) * 1000.0 for item in items)
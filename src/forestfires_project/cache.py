@@ -0,0 +1,133 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_hash(data):
+    """Fast content hash of raw upload bytes"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_digest(path, length=12):
+    """Short content hash of a weights file (or an OpenVINO model directory), used as the model
+    version in cache keys
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if os.path.isdir(path):
+        files = sorted(os.path.join(dirpath, name) for dirpath, _, names in os.walk(path) for name in names)
+    else:
+        files = [path]
+    for file in files:
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:length]
+
+
+def model_version(weights_path, backend="torch", quantization=None):
+    """Version string of a model served by `backend`: "<backend>[-<quantization>]-<digest>".
+    weights_path is the artifact actually loaded (best.pt, or an explicit ONNX / OpenVINO export).
+    Used by the API, predict and visualize, so their cache keys and stored detections line up.
+    """
+    prefix = f"{backend}-{quantization}" if quantization else backend
+    return f"{prefix}-{file_digest(weights_path)}"
+
+
+def _estimate_size(value):
+    """Approximate memory footprint of a cached value in bytes"""
+    size = 256  # object + bookkeeping overhead
+    for attr in ("boxes", "scores", "class_ids"):
+        array = getattr(value, attr, None)
+        if array is not None:
+            size += array.nbytes
+    return size
+
+
+class ResultCache:
+    """Thread-safe LRU cache with a TTL and a memory bound, for inference results.
+
+    Keys are built by the caller (content hash + inference parameters + model version),
+    so a new model version never sees results from the previous one.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl_s=600.0, size_fn=_estimate_size):
+        """
+        Args:
+            max_bytes: Memory bound; least recently used entries are evicted beyond it
+            ttl_s: Seconds an entry stays valid (0 = no expiry)
+            size_fn: Callable estimating the size of a cached value in bytes
+        """
+        self.max_bytes = int(max_bytes)
+        self.ttl_s = float(ttl_s)
+        self.size_fn = size_fn
+
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the cached value or None (counts a hit or a miss)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, expires_at = entry
+            if expires_at and time.monotonic() > expires_at:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self.size_fn(value)
+        if size > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + self.ttl_s if self.ttl_s > 0 else 0.0
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (e.g. when the model is reloaded)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl_s,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -5,6 +5,8 @@ import glob
 import random
 from torch.utils.data import Dataset, DataLoader
 
+from forestfires_project.backends import decode_downscaled
+
 
 class FireDataset(Dataset):
     """Custom Dataset for loading images and labels for Visualization/Manual Eval"""
@@ -59,6 +61,33 @@ class FireDataset(Dataset):
         return img, boxes, img_path
 
 
+class ImageFileDataset(Dataset):
+    """Unlabeled images for bulk inference, decoded in DataLoader workers.
+    Items are (path, BGR image, orig_shape); unreadable files give (path, None, error message).
+    """
+
+    def __init__(self, paths, min_size=0):
+        """
+        Args:
+            paths: Image file paths
+            min_size: Decode large JPEGs downscaled, keeping the longer side >= min_size (0 = full size)
+        """
+        self.paths = list(paths)
+        self.min_size = min_size
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, idx):
+        path = self.paths[idx]
+        try:
+            with open(path, "rb") as f:
+                img, orig_shape = decode_downscaled(f.read(), self.min_size)
+        except Exception as e:
+            return path, None, str(e)
+        return path, img, orig_shape
+
+
 def sample_dataset(img_dir, label_dir, num_samples, random_seed=42):
     """
     Randomly sample a subset of images from a dataset directory.
@@ -169,6 +198,11 @@ def create_yolo_yaml(config, config_path):
     return yaml_path
 
 
+def _collate_test_batch(batch):
+    # Boxes have variable length. Module-level so DataLoader workers can pickle it (spawn start method).
+    return tuple(zip(*batch))
+
+
 def get_test_loader(config, config_path):
     """Returns a PyTorch DataLoader for the test set with optional sampling"""
     # Resolve root from config file location
@@ -189,8 +223,10 @@ def get_test_loader(config, config_path):
 
     dataset = FireDataset(img_dir, lbl_dir, config["hyperparameters"]["classes"], file_list=file_list)
 
-    # Collate function needed because boxes have variable length
-    def collate_fn(batch):
-        return tuple(zip(*batch))
-
-    return DataLoader(dataset, batch_size=6, shuffle=True, collate_fn=collate_fn)
+    return DataLoader(
+        dataset,
+        batch_size=6,
+        shuffle=True,
+        collate_fn=_collate_test_batch,
+        num_workers=config["hyperparameters"].get("workers", 0),
+    )
@@ -0,0 +1,237 @@
+"""Persistent detection store: every image scored by the API, jobs, predict and visualize.
+
+Detections are kept in SQLite, in two tables. `images` holds one row per scored image with
+its model version, source and confidence summary. `detections` holds one row per box.
+Indexes on (class, confidence), (model version, time) and the image path answer queries
+such as "all smoke detections above 0.6 for model X in the last week" without re-running
+inference. The image summaries let visualize re-rank the test set without a forward pass.
+
+Request paths enqueue their results with record(). A background thread commits them in
+batches, so a request never waits on the database.
+"""
+
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    image TEXT NOT NULL,
+    source TEXT NOT NULL,
+    model_version TEXT,
+    width INTEGER,
+    height INTEGER,
+    num_detections INTEGER NOT NULL,
+    max_conf REAL NOT NULL,
+    avg_conf REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS detections (
+    image_id INTEGER NOT NULL REFERENCES images (id),
+    class_id INTEGER NOT NULL,
+    class_name TEXT,
+    confidence REAL NOT NULL,
+    x1 REAL, y1 REAL, x2 REAL, y2 REAL
+);
+CREATE INDEX IF NOT EXISTS images_image ON images (image);
+CREATE INDEX IF NOT EXISTS images_model_time ON images (model_version, created_at);
+CREATE INDEX IF NOT EXISTS detections_class_conf ON detections (class_name, confidence);
+CREATE INDEX IF NOT EXISTS detections_image ON detections (image_id);
+"""
+
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)([smhdw])$")
+_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_time(value, now=None):
+    """Unix time from a timestamp, an ISO date/time or a duration before now ("30m", "24h", "7d", "2w")"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    match = _DURATION.match(value.strip())
+    if match:
+        return (now or time.time()) - float(match.group(1)) * _SECONDS[match.group(2)]
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Not a time or duration: {value}")
+
+
+class DetectionStore:
+    """SQLite detection store shared by the predict paths (thread-safe)"""
+
+    def __init__(self, path, batch_size=256):
+        self.path = path
+        self.batch_size = batch_size
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._queue = queue.Queue()
+        self._writer = None
+
+    def add(self, items, source, model_version=None, created_at=None):
+        """Store (image path or name, Detections) pairs in one transaction. Returns the number of images."""
+        created_at = created_at or time.time()
+        with self._lock, self._conn:
+            for image, r in items:
+                scores = r.scores.tolist()
+                cursor = self._conn.execute(
+                    "INSERT INTO images (image, source, model_version, width, height, num_detections, max_conf, "
+                    "avg_conf, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        image,
+                        source,
+                        model_version,
+                        int(r.orig_shape[1]),
+                        int(r.orig_shape[0]),
+                        len(scores),
+                        max(scores, default=0.0),
+                        sum(scores) / len(scores) if scores else 0.0,
+                        created_at,
+                    ),
+                )
+                if not scores:
+                    continue
+                names = r.names or {}
+                class_ids = [int(c) for c in r.class_ids.tolist()]
+                self._conn.executemany(
+                    "INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (cursor.lastrowid, c, names.get(c, str(c)), s, *box)
+                        for c, s, box in zip(class_ids, scores, r.boxes.tolist())
+                    ],
+                )
+        return len(items)
+
+    def record(self, items, source, model_version=None):
+        """Queue (image, Detections) pairs for the background writer (returns immediately)"""
+        if not items:
+            return
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name="detection-store", daemon=True)
+                    self._writer.start()
+        self._queue.put((list(items), source, model_version, time.time()))
+
+    def flush(self):
+        """Wait until every record()ed result is committed"""
+        self._queue.join()
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            # Coalesce whatever else is waiting into the same transaction
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                for items, source, model_version, created_at in batch:
+                    self.add(items, source, model_version, created_at)
+            except Exception as e:
+                print(f"Detection store write failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def query(
+        self,
+        class_name=None,
+        min_conf=None,
+        model_version=None,
+        source=None,
+        image=None,
+        since=None,
+        until=None,
+        limit=1000,
+    ):
+        """Detections matching all given filters, most recent first.
+        since / until take anything parse_time() accepts.
+        """
+        where, params = [], []
+        for column, value in (
+            ("d.class_name = ?", class_name),
+            ("d.confidence >= ?", min_conf),
+            ("i.model_version = ?", model_version),
+            ("i.source = ?", source),
+            ("i.image = ?", image),
+            ("i.created_at >= ?", parse_time(since)),
+            ("i.created_at < ?", parse_time(until)),
+        ):
+            if value is not None:
+                where.append(column)
+                params.append(value)
+        sql = (
+            "SELECT i.image, i.source, i.model_version, i.width, i.height, i.created_at, "
+            "d.class_id, d.class_name, d.confidence, d.x1, d.y1, d.x2, d.y2 "
+            "FROM detections d JOIN images i ON i.id = d.image_id"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY i.created_at DESC, d.confidence DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(sql, (*params, int(limit))).fetchall()
+        return [dict(row) for row in rows]
+
+    def latest_images(self, model_version, source=None):
+        """{image: (image_id, avg_conf, max_conf, num_detections)} of the most recent run of each image"""
+        sql = (
+            "SELECT image, MAX(id) AS id FROM images WHERE model_version = ?"
+            + (" AND source = ?" if source else "")
+            + " GROUP BY image"
+        )
+        params = (model_version, source) if source else (model_version,)
+        with self._lock:
+            latest = [row["id"] for row in self._conn.execute(sql, params)]
+            rows = []
+            for start in range(0, len(latest), 500):
+                chunk = latest[start : start + 500]
+                rows.extend(
+                    self._conn.execute(
+                        "SELECT id, image, avg_conf, max_conf, num_detections FROM images "
+                        f"WHERE id IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    )
+                )
+        return {row["image"]: (row["id"], row["avg_conf"], row["max_conf"], row["num_detections"]) for row in rows}
+
+    def boxes(self, image_id):
+        """[x1, y1, x2, y2, conf, class_id] rows of one stored image"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT x1, y1, x2, y2, confidence, class_id FROM detections WHERE image_id = ?", (image_id,)
+            ).fetchall()
+        return [list(row) for row in rows]
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+def open_store(config, config_path=None):
+    """DetectionStore from the `detection_store` config section (None if disabled).
+    A relative path is resolved against the project root when config_path is given.
+    """
+    store_config = config.get("detection_store") or {}
+    if not store_config.get("enabled", False):
+        return None
+    path = store_config.get("path", "reports/detections.db")
+    if config_path is not None and not os.path.isabs(path):
+        root = os.path.abspath(os.path.join(os.path.dirname(config_path), config["paths"]["root_dir"]))
+        path = os.path.join(root, path)
+    return DetectionStore(path, batch_size=store_config.get("batch_size", 256))
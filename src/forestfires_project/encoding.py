@@ -0,0 +1,139 @@
+"""Compact /predict response encodings for machine-to-machine clients.
+
+Instead of one dict per detection, the columnar formats return the detections as three
+arrays (boxes, scores, class_ids) plus the class names once. The format is picked from the
+request's Accept header:
+
+- application/json: the regular per-detection schema (default)
+- application/vnd.forestfires.columnar+json: columnar JSON (serialized with orjson if installed)
+- application/msgpack: columnar msgpack, arrays as raw little-endian buffers (needs msgpack)
+- application/octet-stream: a fixed header followed by the raw arrays (see encode_binary)
+"""
+
+import importlib.util
+import json
+import struct
+
+import numpy as np
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.forestfires.columnar+json"
+MSGPACK = "application/msgpack"
+BINARY = "application/octet-stream"
+
+# Array dtypes of the msgpack and binary formats (little-endian)
+BOXES_DTYPE = np.dtype("<f4")  # (N, 4) x1, y1, x2, y2 in original-image pixels
+SCORES_DTYPE = np.dtype("<f4")
+CLASS_IDS_DTYPE = np.dtype("<i4")
+
+# magic, number of detections, image width, image height
+BINARY_MAGIC = b"FFD1"
+BINARY_HEADER = struct.Struct("<4sIII")
+
+_ALIASES = {"application/x-msgpack": MSGPACK}
+
+
+def available_media_types():
+    """Response media types this installation can produce (msgpack is optional)"""
+    types = [JSON, COLUMNAR_JSON, BINARY]
+    if importlib.util.find_spec("msgpack") is not None:
+        types.insert(2, MSGPACK)
+    return types
+
+
+def negotiate(accept, supported=None):
+    """Media type to respond with for an Accept header, or None if nothing acceptable is supported.
+    A missing header or */* gets the regular JSON schema.
+    """
+    supported = supported or available_media_types()
+    if not accept:
+        return JSON
+
+    ranges = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        ranges.append((-q, position, _ALIASES.get(media_type.lower(), media_type.lower())))
+
+    for neg_q, _, media_type in sorted(ranges):
+        if neg_q == 0:
+            break
+        if media_type in ("*/*", "application/*"):
+            return JSON
+        if media_type in supported:
+            return media_type
+    return None
+
+
+def columnar(r):
+    """Detections as contiguous little-endian arrays"""
+    return {
+        "boxes": np.ascontiguousarray(r.boxes, dtype=BOXES_DTYPE).reshape(-1, 4),
+        "scores": np.ascontiguousarray(r.scores, dtype=SCORES_DTYPE),
+        "class_ids": np.ascontiguousarray(r.class_ids, dtype=CLASS_IDS_DTYPE),
+    }
+
+
+def build_columnar(filename, r, conf, iou, max_det):
+    """Columnar counterpart of the /predict response (arrays are numpy until encoded)"""
+    return {
+        "filename": filename,
+        "image_size": {"width": int(r.orig_shape[1]), "height": int(r.orig_shape[0])},
+        "conf": conf,
+        "iou": iou,
+        "max_det": max_det,
+        "num_detections": len(r),
+        "names": {str(k): v for k, v in (r.names or {}).items()},
+        **columnar(r),
+        "speed": getattr(r, "speed", None),
+    }
+
+
+def encode_columnar(payload, media_type):
+    """Serialize build_columnar() payloads (possibly nested in dicts / lists) as columnar JSON or msgpack"""
+    if media_type == MSGPACK:
+        import msgpack
+
+        return msgpack.packb(_map_arrays(payload, lambda a: a.tobytes()), use_bin_type=True)
+
+    try:
+        import orjson
+    except ImportError:
+        return json.dumps(_map_arrays(payload, lambda a: a.tolist())).encode()
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _map_arrays(value, fn):
+    if isinstance(value, np.ndarray):
+        return fn(value)
+    if isinstance(value, list):
+        return [_map_arrays(v, fn) for v in value]
+    if isinstance(value, dict):
+        return {k: _map_arrays(v, fn) for k, v in value.items()}
+    return value
+
+
+def encode_binary(r):
+    """Header (magic, N, width, height) followed by boxes (N x 4 <f4), scores (N <f4) and class_ids (N <i4)"""
+    arrays = columnar(r)
+    header = BINARY_HEADER.pack(BINARY_MAGIC, len(r), int(r.orig_shape[1]), int(r.orig_shape[0]))
+    return header + arrays["boxes"].tobytes() + arrays["scores"].tobytes() + arrays["class_ids"].tobytes()
+
+
+def decode_binary(data):
+    """Inverse of encode_binary (for clients and tests): dict of arrays plus image_size"""
+    magic, n, width, height = BINARY_HEADER.unpack_from(data)
+    if magic != BINARY_MAGIC:
+        raise ValueError("Not a binary detections payload")
+    offset = BINARY_HEADER.size
+    boxes = np.frombuffer(data, BOXES_DTYPE, n * 4, offset).reshape(n, 4)
+    offset += boxes.nbytes
+    scores = np.frombuffer(data, SCORES_DTYPE, n, offset)
+    class_ids = np.frombuffer(data, CLASS_IDS_DTYPE, n, offset + scores.nbytes)
+    return {"boxes": boxes, "scores": scores, "class_ids": class_ids, "image_size": {"width": width, "height": height}}
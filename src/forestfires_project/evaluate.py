@@ -2,6 +2,7 @@ import yaml
 import os
 import wandb
 from dotenv import load_dotenv
+from forestfires_project.execution import apply_execution_settings
 from forestfires_project.model import ForestFireYOLO
 
 
@@ -28,6 +29,8 @@ def run_evaluation(config_path="configs/config.yaml", model_path=None, use_wandb
         print(f"Model not found at {model_path}. Please train first.")
         return
 
+    apply_execution_settings(config.get("execution"), "evaluate")
+
     # Initialize wandb if requested
     if use_wandb:
         wandb.init(
@@ -47,6 +50,7 @@ def run_evaluation(config_path="configs/config.yaml", model_path=None, use_wandb
     # Disable all local file outputs - metrics go to wandb
     metrics = model_wrapper.model.val(
         split="test",
+        workers=config["hyperparameters"].get("workers", 8),
         plots=False,  # No confusion matrix plots
         save_txt=False,  # No results txt
         save_conf=False,  # No confidence files
@@ -0,0 +1,79 @@
+"""CPU execution settings shared by the API, training, evaluation, visualization and bulk prediction.
+
+Thread counts and core pinning come from the `execution` config section (with optional
+per-stage overrides), so the intra-op pools of torch / OpenMP / OpenCV / ONNX Runtime are
+sized once instead of every library defaulting to all cores and oversubscribing them.
+"""
+
+import os
+import sys
+
+SETTINGS = ("intra_op_threads", "inter_op_threads", "cpu_affinity")
+STAGES = ("api", "train", "evaluate", "visualize", "predict")
+
+
+def execution_settings(execution_config=None, stage=None):
+    """Settings for one stage: the section's defaults updated with its `stage` overrides"""
+    execution_config = execution_config or {}
+    settings = {key: execution_config.get(key) for key in SETTINGS}
+    if stage is not None:
+        overrides = execution_config.get(stage) or {}
+        settings.update({key: overrides[key] for key in SETTINGS if overrides.get(key) is not None})
+    return settings
+
+
+def available_cpus():
+    """Cores this process may run on (respects affinity / cgroup pinning where supported)"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def pin_cpus(cores):
+    """Restrict this process (and threads started later) to the given cores. Returns False if unsupported."""
+    if not hasattr(os, "sched_setaffinity"):
+        print("CPU pinning is not supported on this platform, ignoring cpu_affinity")
+        return False
+    os.sched_setaffinity(0, {int(core) for core in cores})
+    return True
+
+
+def set_threads(intra_op_threads=None, inter_op_threads=None, import_torch=False):
+    """Size the intra-op (and torch inter-op) thread pools of this process.
+
+    OMP_NUM_THREADS / MKL_NUM_THREADS cover libraries initialized later; torch and OpenCV are
+    set directly. torch is only touched if already imported, unless import_torch=True.
+    """
+    if intra_op_threads:
+        intra_op_threads = int(intra_op_threads)
+        os.environ["OMP_NUM_THREADS"] = str(intra_op_threads)
+        os.environ["MKL_NUM_THREADS"] = str(intra_op_threads)
+        import cv2
+
+        cv2.setNumThreads(intra_op_threads)
+
+    if not (import_torch or "torch" in sys.modules) or not (intra_op_threads or inter_op_threads):
+        return
+    import torch
+
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(int(inter_op_threads))
+        except RuntimeError as e:
+            # Only possible before the first inter-op parallel work in the process
+            print(f"Could not set inter-op threads: {e}")
+
+
+def apply_execution_settings(execution_config=None, stage=None, import_torch=False):
+    """Apply the (stage) execution settings to this process and return them"""
+    settings = execution_settings(execution_config, stage)
+    if settings["cpu_affinity"]:
+        pin_cpus(settings["cpu_affinity"])
+    set_threads(settings["intra_op_threads"], settings["inter_op_threads"], import_torch=import_torch)
+
+    applied = {key: value for key, value in settings.items() if value is not None}
+    if applied:
+        print(f"Execution settings ({stage or 'default'}): {applied}")
+    return settings
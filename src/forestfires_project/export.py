@@ -0,0 +1,73 @@
+import glob
+import os
+
+import cv2
+import yaml
+
+from forestfires_project.backends import check_parity, export_model, load_backend
+
+
+def get_parity_images(root, config, num_images=16):
+    """Load a few test images (falls back to the bundled samples) for the parity check"""
+    img_dir = os.path.join(root, config["paths"]["test_images"])
+    paths = sorted(glob.glob(os.path.join(img_dir, "*.jpg")))
+    if not paths:
+        paths = sorted(glob.glob(os.path.join(root, "data", "samples", "images", "*.jpg")))
+    return [cv2.imread(p) for p in paths[:num_images]]
+
+
+def run_export(config_path="configs/config.yaml", model_path=None, formats=("onnx",), check=True, conf=0.25):
+    """Export best.pt to CPU-optimized formats and check detections match the PyTorch model"""
+    # Resolve config path relative to project root
+    if not os.path.isabs(config_path):
+        config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), config_path)
+
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    # Setup root dir - resolve from config location
+    config_dir = os.path.dirname(config_path)
+    root = os.path.abspath(os.path.join(config_dir, config["paths"]["root_dir"]))
+
+    if model_path is None:
+        model_path = os.path.join(root, config["paths"]["models_dir"], config["project_name"], "weights", "best.pt")
+
+    if not os.path.exists(model_path):
+        print(f"Model not found at {model_path}. Please train first.")
+        return
+
+    imgsz = config["hyperparameters"]["img_size"]
+    exported = {fmt: export_model(model_path, fmt=fmt, imgsz=imgsz) for fmt in formats}
+
+    reports = {}
+    if check:
+        images = get_parity_images(root, config)
+        reference = load_backend("torch", weights_path=model_path, imgsz=imgsz)
+        for fmt, path in exported.items():
+            candidate = load_backend(fmt, weights_path=model_path, exported_path=path, imgsz=imgsz)
+            report = check_parity(reference, candidate, images, conf=conf)
+            reports[fmt] = report
+
+            status = "PASSED" if report["passed"] else "FAILED"
+            print(f"Parity check torch vs {fmt}: {status}")
+            print(f"  Matched detections: {report['matched']}")
+            print(f"  Unmatched (torch / {fmt}): {report['unmatched_reference']} / {report['unmatched_candidate']}")
+            print(f"  Min matched IoU: {report['min_matched_iou']:.4f}")
+            print(f"  Max score difference: {report['max_score_diff']:.4f}")
+
+    return {"exported": exported, "parity": reports}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export forest fire detection model to ONNX / OpenVINO")
+    parser.add_argument("--config", type=str, default="configs/config.yaml", help="Path to config file")
+    parser.add_argument(
+        "--model_path", type=str, default=None, help="Path to model weights (optional, uses best.pt if not provided)"
+    )
+    parser.add_argument("--formats", nargs="+", default=["onnx"], choices=["onnx", "openvino"], help="Export formats")
+    parser.add_argument("--no_check", action="store_true", help="Skip the parity check against PyTorch")
+    args = parser.parse_args()
+
+    run_export(config_path=args.config, model_path=args.model_path, formats=args.formats, check=not args.no_check)
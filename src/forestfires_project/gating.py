@@ -0,0 +1,122 @@
+"""Scene-change gating in front of the detector.
+
+Tower cameras mostly see the same static scene. ChangeGate keeps a tiny grayscale
+thumbnail of the last frame the detector ran on, per source, and only lets a new frame
+through when enough of the thumbnail changed (or a keepalive interval elapsed); otherwise
+the previous detections are reused.
+"""
+
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class ChangeGate:
+    """Per-source decision whether a frame differs enough from the last inferred one"""
+
+    def __init__(self, threshold=0.01, pixel_delta=12, max_interval_s=60.0, size=64):
+        """
+        Args:
+            threshold: Fraction of thumbnail pixels that must change to run the detector
+            pixel_delta: Grayscale difference (0-255) for a thumbnail pixel to count as changed
+            max_interval_s: Run the detector at least this often per source (0 = never forced)
+            size: Thumbnail side in pixels
+        """
+        self.threshold = float(threshold)
+        self.pixel_delta = int(pixel_delta)
+        self.max_interval_s = float(max_interval_s)
+        self.size = int(size)
+
+        self._state = {}  # source -> {"thumb", "ran_at", "detections"}
+        self._lock = threading.Lock()
+        self.frames_total = 0
+        self.frames_skipped = 0
+
+    def thumbnail(self, img):
+        """Downsampled, slightly blurred grayscale thumbnail of a BGR (or gray) image"""
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+        small = cv2.resize(gray, (self.size, self.size), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def changed_fraction(self, a, b):
+        return float(np.count_nonzero(cv2.absdiff(a, b) > self.pixel_delta)) / a.size
+
+    def check(self, source, img, now=None):
+        """True if the detector should run on this frame.
+        When it returns True the frame becomes the new reference for the source.
+        """
+        now = time.monotonic() if now is None else now
+        thumb = self.thumbnail(img)
+        with self._lock:
+            self.frames_total += 1
+            state = self._state.get(source)
+            run = (
+                state is None
+                or state["detections"] is None
+                or (self.max_interval_s > 0 and now - state["ran_at"] >= self.max_interval_s)
+                or self.changed_fraction(thumb, state["thumb"]) > self.threshold
+            )
+            if run:
+                previous = state["detections"] if state is not None else None
+                self._state[source] = {"thumb": thumb, "ran_at": now, "detections": previous}
+            else:
+                self.frames_skipped += 1
+            return run
+
+    def remember(self, source, detections):
+        """Store the detections from the frame that passed check()"""
+        with self._lock:
+            if source in self._state:
+                self._state[source]["detections"] = detections
+
+    def cached(self, source):
+        """Detections of the last frame the detector ran on for this source"""
+        with self._lock:
+            state = self._state.get(source)
+            return state["detections"] if state is not None else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "frames_total": self.frames_total,
+                "frames_skipped": self.frames_skipped,
+                "skip_rate": self.frames_skipped / self.frames_total if self.frames_total else 0.0,
+            }
+
+
+def make_gate(config):
+    """ChangeGate from the `gating` config section, or None when gating is disabled"""
+    gating = config.get("gating") or {}
+    if not gating.get("enabled", False):
+        return None
+    return ChangeGate(
+        threshold=gating.get("threshold", 0.01),
+        pixel_delta=gating.get("pixel_delta", 12),
+        max_interval_s=gating.get("max_interval_s", 60.0),
+        size=gating.get("size", 64),
+    )
+
+
+def gated_predict(gate, predict_fn, items, **kwargs):
+    """Run predict_fn only on the (source, image) items whose scene changed.
+
+    Unchanged items reuse their source's previous detections. Returns one result per
+    item (in order) and the number of items that went through the detector.
+    """
+    if gate is None:
+        return predict_fn([img for _, img in items], **kwargs), len(items)
+
+    run_idx = [i for i, (source, img) in enumerate(items) if gate.check(source, img)]
+    outputs = [None] * len(items)
+    if run_idx:
+        fresh = predict_fn([items[i][1] for i in run_idx], **kwargs)
+        for i, result in zip(run_idx, fresh):
+            outputs[i] = result
+            gate.remember(items[i][0], result)
+
+    for i, (source, _) in enumerate(items):
+        if outputs[i] is None:
+            outputs[i] = gate.cached(source)
+    return outputs, len(run_idx)
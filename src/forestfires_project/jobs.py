@@ -0,0 +1,431 @@
+"""Persistent offline inference jobs (backfills of archived frames).
+
+Jobs live in a local SQLite database, so they survive restarts. A pool of worker threads
+claims queued jobs. The image list of a job is resolved once, when it is created, and
+stored with it, so files added to or removed from the source later do not shift a resumed
+job. Each worker decodes its job's images in parallel and sends them through
+the model in batches. Results are appended to a JSONL file, one line per image. After
+every batch the file is flushed, and the number of processed images and the file offset are
+committed to the database. A job interrupted by a restart therefore resumes at its last
+committed batch. Parquet output is converted from the JSONL file when the job completes.
+"""
+
+import glob
+import importlib.util
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from forestfires_project.backends import IMAGE_SUFFIXES
+
+OUTPUT_FORMATS = ("jsonl", "parquet")
+FINISHED = ("completed", "failed", "cancelled")
+
+_COLUMNS = (
+    "id",
+    "status",
+    "source",
+    "params",
+    "output_format",
+    "output_path",
+    "total",
+    "done",
+    "failed",
+    "offset",
+    "images_per_sec",
+    "model_version",
+    "worker_pid",
+    "error",
+    "created_at",
+    "started_at",
+    "finished_at",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    source TEXT NOT NULL,
+    params TEXT NOT NULL,
+    output_format TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    offset INTEGER NOT NULL DEFAULT 0,
+    images_per_sec REAL,
+    model_version TEXT,
+    worker_pid INTEGER,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS job_files (
+    job_id TEXT NOT NULL REFERENCES jobs (id),
+    position INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (job_id, position)
+);
+"""
+
+
+def parquet_available():
+    """Parquet output needs pandas with pyarrow or fastparquet"""
+    return importlib.util.find_spec("pandas") is not None and any(
+        importlib.util.find_spec(engine) is not None for engine in ("pyarrow", "fastparquet")
+    )
+
+
+def list_images(source):
+    """Sorted image paths of a directory (recursively), a glob pattern or a single image"""
+    if os.path.isdir(source):
+        paths = (
+            os.path.join(dirpath, name)
+            for dirpath, _, names in os.walk(source)
+            for name in names
+            if name.lower().endswith(IMAGE_SUFFIXES)
+        )
+    else:
+        paths = (p for p in glob.iglob(source, recursive=True) if p.lower().endswith(IMAGE_SUFFIXES))
+    return sorted(p for p in paths if os.path.isfile(p))
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """SQLite-backed job table, safe to share between threads and processes"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def _row(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def create(self, source, params, output_format="jsonl", output_dir="reports/jobs", paths=None, job_id=None):
+        """Queue a new job over `paths` (default: list_images(source), resolved now) and return it"""
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        paths = list_images(source) if paths is None else list(paths)
+        job_id = job_id or uuid.uuid4().hex[:12]
+        output_path = os.path.join(output_dir, job_id, "results.jsonl")
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, status, source, params, output_format, output_path, total, created_at) "
+                    "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+                    (job_id, source, json.dumps(params), output_format, output_path, len(paths), time.time()),
+                )
+                self._conn.executemany(
+                    "INSERT INTO job_files (job_id, position, path) VALUES (?, ?, ?)",
+                    ((job_id, i, path) for i, path in enumerate(paths)),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(job_id)
+
+    def files(self, job_id, start=0):
+        """Image paths of a job in processing order, from position `start` on"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path FROM job_files WHERE job_id = ? AND position >= ? ORDER BY position", (job_id, start)
+            ).fetchall()
+        return [row["path"] for row in rows]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._row(self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def list(self, limit=50):
+        """Most recent jobs first"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def update(self, job_id, **fields):
+        unknown = set(fields) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def claim(self):
+        """Atomically mark the oldest queued job as running in this process and return it (None if idle)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', worker_pid = ?, started_at = COALESCE(started_at, ?) "
+                        "WHERE id = ?",
+                        (os.getpid(), time.time(), row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row["id"]) if row is not None else None
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job (a running one stops after its current batch).
+        Returns the job, None if unknown.
+
+        Raises:
+            ValueError: If the job has already finished
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job["status"] in FINISHED:
+            raise ValueError(f"Job {job_id} already {job['status']}")
+        self.update(job_id, status="cancelled", finished_at=time.time())
+        return self.get(job_id)
+
+    def requeue_orphans(self):
+        """Requeue running jobs whose worker process is gone (e.g. the service restarted). Returns their ids."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, worker_pid FROM jobs WHERE status = 'running'").fetchall()
+        orphans = [row["id"] for row in rows if row["worker_pid"] == os.getpid() or not _pid_alive(row["worker_pid"])]
+        for job_id in orphans:
+            self.update(job_id, status="queued", worker_pid=None)
+        return orphans
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def job_info(job):
+    """Job as returned by the API: progress fraction and ETA added"""
+    info = dict(job)
+    info.pop("worker_pid", None)
+    info["progress"] = job["done"] / job["total"] if job["total"] else None
+    remaining = job["total"] - job["done"]
+    info["eta_s"] = remaining / job["images_per_sec"] if job["images_per_sec"] and job["status"] == "running" else None
+    if job["output_format"] == "parquet":
+        info["parquet_path"] = os.path.splitext(job["output_path"])[0] + ".parquet"
+    return info
+
+
+# Flat columns of the CSV / Parquet outputs, one row per detection
+ROW_COLUMNS = ("filename", "width", "height", "error", "class_id", "class_name", "confidence", "x1", "y1", "x2", "y2")
+
+
+def detection_rows(result):
+    """Flatten one /predict-style result into rows of ROW_COLUMNS (an image without detections gets one empty row)"""
+    size = result.get("image_size") or {}
+    base = {"filename": result["filename"], "width": size.get("width"), "height": size.get("height")}
+    base["error"] = result.get("error")
+    rows = []
+    for det in result.get("detections") or [None]:
+        box = det["box_xyxy"] if det else [None] * 4
+        rows.append(
+            {
+                **base,
+                "class_id": det["class_id"] if det else None,
+                "class_name": det["class_name"] if det else None,
+                "confidence": det["confidence"] if det else None,
+                "x1": box[0],
+                "y1": box[1],
+                "x2": box[2],
+                "y2": box[3],
+            }
+        )
+    return rows
+
+
+def write_parquet(jsonl_path, parquet_path):
+    """Convert /predict-style JSONL results into a Parquet file of detection_rows()"""
+    import pandas as pd
+
+    with open(jsonl_path) as f:
+        rows = [row for line in f for row in detection_rows(json.loads(line))]
+    pd.DataFrame(rows, columns=list(ROW_COLUMNS)).to_parquet(parquet_path, index=False)
+
+
+class JobRunner:
+    """Worker threads that claim queued jobs and process them batch by batch.
+
+    Args:
+        store: JobStore
+        predict_fn: predict_fn(images, conf, iou, max_det, model) -> (list of Detections, model version)
+        decode_fn: decode_fn(path) -> (BGR image, orig_shape); raises on unreadable images
+        serialize_fn: serialize_fn(filename, detections, conf, iou, max_det) -> JSON-serializable dict
+        workers: Jobs processed concurrently
+        batch_size: Images per predict_fn call (and per progress commit)
+        decode_workers: Threads decoding the images of a batch
+        poll_interval_s: How often idle workers look for new jobs
+        on_results: Optional on_results(paths, detections, model version) called for every batch
+    """
+
+    def __init__(
+        self,
+        store,
+        predict_fn,
+        decode_fn,
+        serialize_fn,
+        workers=1,
+        batch_size=16,
+        decode_workers=4,
+        poll_interval_s=1.0,
+        on_results=None,
+    ):
+        self.store = store
+        self.predict_fn = predict_fn
+        self.decode_fn = decode_fn
+        self.serialize_fn = serialize_fn
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.poll_interval_s = poll_interval_s
+        self.on_results = on_results
+        self._decode_pool = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="job-decode")
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Requeue jobs interrupted by a restart and start the worker threads (idempotent)"""
+        if self._threads:
+            return
+        resumed = self.store.requeue_orphans()
+        if resumed:
+            print(f"Resuming {len(resumed)} interrupted job(s): {', '.join(resumed)}")
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=10.0):
+        """Stop after the current batches; running jobs are resumed by the next start()"""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Wake idle workers (a job was just queued)"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            job = self.store.claim()
+            if job is None:
+                self._wake.wait(self.poll_interval_s)
+                self._wake.clear()
+                continue
+            try:
+                self.run_job(job)
+            except Exception as e:
+                print(f"Job {job['id']} failed: {e}")
+                self.store.update(job["id"], status="failed", error=str(e), finished_at=time.time())
+
+    def run_job(self, job):
+        """Process a claimed job from its last committed batch to the end"""
+        params = job["params"]
+        conf, iou, max_det = params.get("conf", 0.25), params.get("iou", 0.7), params.get("max_det", 300)
+        # The file list stored at creation, so a resumed job continues exactly where it stopped
+        done, failed = job["done"], job["failed"]
+        paths = self.store.files(job["id"], start=done)
+        if not paths and done < job["total"]:
+            paths = list_images(job["source"])[done:]  # Queued before file lists were stored
+        root = job["source"] if os.path.isdir(job["source"]) else os.path.dirname(job["source"])
+
+        os.makedirs(os.path.dirname(job["output_path"]), exist_ok=True)
+        mode = "r+" if os.path.exists(job["output_path"]) else "w"
+        with open(job["output_path"], mode) as out:
+            # Drop whatever was written after the last committed batch
+            out.seek(job["offset"])
+            out.truncate()
+
+            start, processed = time.perf_counter(), 0
+            for batch_start in range(0, len(paths), self.batch_size):
+                if self._stop.is_set():
+                    return  # resumed (as an orphan) by the next start()
+                if self.store.get(job["id"])["status"] == "cancelled":
+                    print(f"Job {job['id']} cancelled after {done} images")
+                    return
+
+                batch = paths[batch_start : batch_start + self.batch_size]
+                lines, errors, version = self._process_batch(batch, root, conf, iou, max_det, params.get("model"))
+                out.write("".join(lines))
+                out.flush()
+                os.fsync(out.fileno())
+
+                done += len(batch)
+                failed += errors
+                processed += len(batch)
+                self.store.update(
+                    job["id"],
+                    done=done,
+                    failed=failed,
+                    offset=out.tell(),
+                    model_version=version,
+                    images_per_sec=processed / (time.perf_counter() - start),
+                )
+
+        if self.store.get(job["id"])["status"] == "cancelled":
+            return
+        if job["output_format"] == "parquet":
+            write_parquet(job["output_path"], os.path.splitext(job["output_path"])[0] + ".parquet")
+        self.store.update(job["id"], status="completed", finished_at=time.time())
+        final = self.store.get(job["id"])
+        print(f"Job {job['id']} completed: {final['done']} images ({final['failed']} failed)")
+
+    def _process_batch(self, paths, root, conf, iou, max_det, model=None):
+        def _decode(path):
+            try:
+                return self.decode_fn(path)
+            except Exception as e:
+                return e
+
+        decoded = list(self._decode_pool.map(_decode, paths))
+        valid = [d for d in decoded if not isinstance(d, Exception)]
+        results, version = self.predict_fn(valid, conf, iou, max_det, model) if valid else ([], None)
+        if self.on_results is not None and results:
+            self.on_results([p for p, d in zip(paths, decoded) if not isinstance(d, Exception)], results, version)
+
+        lines, errors, results = [], 0, iter(results)
+        for path, d in zip(paths, decoded):
+            filename = os.path.relpath(path, root) if root else path
+            if isinstance(d, Exception):
+                errors += 1
+                result = {"filename": filename, "error": f"Could not read image: {d}"}
+            else:
+                result = self.serialize_fn(filename, next(results), conf, iou, max_det)
+            lines.append(json.dumps(result) + "\n")
+        return lines, errors, version
@@ -0,0 +1,181 @@
+import threading
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+class SystemSampler:
+    """Samples CPU, memory and disk usage in a background thread.
+
+    Scrapes read the latest snapshot instead of calling psutil themselves, so they
+    never block a worker (cpu_percent is measured over the sampling interval).
+    psutil is only imported once the sampler starts.
+    """
+
+    def __init__(self, interval_s=5.0, disk_path="/"):
+        self.interval_s = max(0.1, float(interval_s))
+        self.disk_path = disk_path
+        self._process = None
+        self._snapshot = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        import psutil
+
+        self._process = self._process or psutil.Process()
+        # First call primes psutil's CPU counters (it always returns 0.0)
+        psutil.cpu_percent(interval=None)
+        self._process.cpu_percent(interval=None)
+        self.sample()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="system-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def sample(self):
+        """Take one sample (one call per psutil function) and store it as the latest snapshot"""
+        import psutil
+
+        self._process = self._process or psutil.Process()
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        snapshot = {
+            "cpu_usage_percent": psutil.cpu_percent(interval=None),
+            "memory": {
+                "total": memory.total,
+                "available": memory.available,
+                "used": memory.used,
+                "percent": memory.percent,
+            },
+            "disk": {
+                "total": disk.total,
+                "used": disk.used,
+                "free": disk.free,
+                "percent": disk.percent,
+            },
+            "process": {
+                "cpu_percent": self._process.cpu_percent(interval=None),
+                "rss_bytes": self._process.memory_info().rss,
+                "num_threads": self._process.num_threads(),
+            },
+            "uptime_seconds": time.time() - psutil.boot_time(),
+            "sampled_at": time.time(),
+        }
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"System metrics sampling failed: {e}")
+
+
+class _StatsCollector:
+    """Exposes batcher, cache and system statistics read at scrape time"""
+
+    def __init__(self, sampler=None, batcher=None, cache=None):
+        self.sampler = sampler
+        self.batcher = batcher
+        self.cache = cache
+
+    def collect(self):
+        # The batcher may be given as a callable returning the current one (it changes on model swaps)
+        batcher = self.batcher() if callable(self.batcher) else self.batcher
+        if batcher is not None:
+            stats = batcher.stats()
+            yield GaugeMetricFamily(
+                "api_queue_depth", "Inference requests waiting in the batcher", stats["queue_depth"]
+            )
+            yield GaugeMetricFamily("api_queue_depth_max", "Highest queue depth seen", stats["max_queue_depth"])
+            yield CounterMetricFamily(
+                "api_queue_rejected", "Requests rejected because the queue was full", stats["rejected_total"]
+            )
+
+        if self.cache is not None:
+            stats = self.cache.stats()
+            yield CounterMetricFamily("api_cache_hits", "Result cache hits", stats["hits"])
+            yield CounterMetricFamily("api_cache_misses", "Result cache misses", stats["misses"])
+            yield CounterMetricFamily("api_cache_evictions", "Result cache LRU evictions", stats["evictions"])
+            yield GaugeMetricFamily("api_cache_hit_ratio", "Result cache hit ratio", stats["hit_rate"])
+            yield GaugeMetricFamily("api_cache_entries", "Entries in the result cache", stats["entries"])
+            yield GaugeMetricFamily("api_cache_bytes", "Estimated result cache size", stats["bytes"])
+
+        snapshot = self.sampler.snapshot() if self.sampler is not None else {}
+        if snapshot:
+            yield GaugeMetricFamily("system_cpu_percent", "Host CPU usage", snapshot["cpu_usage_percent"])
+            yield GaugeMetricFamily("system_memory_used_bytes", "Host memory in use", snapshot["memory"]["used"])
+            yield GaugeMetricFamily(
+                "system_memory_available_bytes", "Host memory available", snapshot["memory"]["available"]
+            )
+            yield GaugeMetricFamily("system_disk_used_bytes", "Disk space in use", snapshot["disk"]["used"])
+            yield GaugeMetricFamily("process_cpu_percent", "API process CPU usage", snapshot["process"]["cpu_percent"])
+            yield GaugeMetricFamily(
+                "process_rss_bytes", "API process resident memory", snapshot["process"]["rss_bytes"]
+            )
+
+
+class ApiMetrics:
+    """Prometheus metrics for the inference API, kept in their own registry.
+
+    Request counts and latency histograms are recorded as requests run; queue depth,
+    cache hit rates and system usage are read from their owners when scraped.
+    """
+
+    def __init__(self, sampler=None, batcher=None, cache=None):
+        self.registry = CollectorRegistry()
+        self.requests = Counter(
+            "api_requests", "HTTP requests", ["endpoint", "method", "status"], registry=self.registry
+        )
+        self.request_latency = Histogram(
+            "api_request_duration_seconds",
+            "HTTP request latency",
+            ["endpoint"],
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.stage_latency = Histogram(
+            "api_stage_duration_seconds",
+            "Per-image latency of each processing stage",
+            ["stage"],
+            buckets=LATENCY_BUCKETS,
+            registry=self.registry,
+        )
+        self.batch_size = Histogram(
+            "api_batch_size", "Images per forward pass", buckets=BATCH_SIZE_BUCKETS, registry=self.registry
+        )
+        self.registry.register(_StatsCollector(sampler, batcher, cache))
+
+    def observe_request(self, endpoint, method, status, seconds):
+        self.requests.labels(endpoint, method, str(status)).inc()
+        self.request_latency.labels(endpoint).observe(seconds)
+
+    def observe_stage(self, stage, seconds, attributes=None):
+        """Record the duration of one stage (signature matches tracing.add_listener)"""
+        self.stage_latency.labels(stage).observe(seconds)
+
+    def observe_batch(self, results):
+        self.batch_size.observe(len(results))
+
+    def render(self):
+        """Prometheus text exposition of all metrics, with its content type"""
+        return generate_latest(self.registry), CONTENT_TYPE_LATEST
@@ -1,7 +1,30 @@
 from ultralytics import YOLO
+import cv2
 import wandb
 import os
 
+from forestfires_project import tracing
+from forestfires_project.backends import Detections, to_bgr_array
+from forestfires_project.gating import gated_predict, make_gate
+from forestfires_project.tiling import predict_tiled
+
+
+def _load_image(source):
+    """BGR array of an image path, numpy array or PIL image
+
+    Raises:
+        FileNotFoundError: If a path does not exist
+        ValueError: If a path exists but cannot be decoded as an image
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        return to_bgr_array(source)
+    if not os.path.isfile(source):
+        raise FileNotFoundError(f"Image not found: {source}")
+    img = cv2.imread(str(source))
+    if img is None:
+        raise ValueError(f"Could not read image: {source}")
+    return img
+
 
 class ForestFireYOLO:
     def __init__(self, config, config_path):
@@ -10,6 +33,8 @@ class ForestFireYOLO:
         self.model_name = config["hyperparameters"]["model_type"]
         # Load a pretrained YOLO model (n, s, m, l, x)
         self.model = YOLO(self.model_name)
+        # Optional scene-change gate for predict(..., source=...), see the `gating` config
+        self.gate = make_gate(config)
         print(f"Initialized YOLO model: {self.model_name}")
 
     def train(self, data_yaml_path):
@@ -29,6 +54,7 @@ class ForestFireYOLO:
             epochs=hp["epochs"],
             imgsz=hp["img_size"],
             batch=hp["batch_size"],
+            workers=hp.get("workers", 8),  # DataLoader processes
             lr0=hp["lr"],
             project=project_path,
             name=self.config["project_name"],
@@ -61,20 +87,90 @@ class ForestFireYOLO:
         print("Training completed.")
         return results
 
-    def predict(self, image, conf=0.25, save=False, draw_boxes=False):
+    def predict(self, image, conf=0.25, save=False, draw_boxes=False, iou=0.7, max_det=300, tiled=False, source=None):
         """Run inference on a single image or batch.
         Returns Results object with predictions.
         If draw_boxes=True, results include drawn images with bboxes and confidence scores.
+        If tiled=True, each image is sliced into overlapping tiles (see the `tiling` config)
+        so small objects in high-resolution images keep enough pixels to be detected.
+        If `source` names the camera the frames come from and gating is enabled, frames
+        whose scene has not changed reuse that camera's previous results.
+        save=True (Ultralytics' annotated copies under runs/) is only supported without
+        tiling or gating.
         """
-        results = self.model.predict(image, conf=conf, verbose=False, save=save)
+        if save and (tiled or (self.gate is not None and source is not None)):
+            raise ValueError("save=True is not supported with tiled or gated inference; draw the results instead")
+        with tracing.span("predict"):
+            if tiled:
+                results = self._predict_tiled(image, conf, iou, max_det)
+            elif self.gate is not None and source is not None:
+                results = self._predict_gated(image, source, conf, iou, max_det)
+            else:
+                results = self.model.predict(image, conf=conf, iou=iou, max_det=max_det, verbose=False, save=save)
+
+        # Ultralytics' own per-image breakdown (ms)
+        for result in results:
+            for stage, ms in (getattr(result, "speed", None) or {}).items():
+                tracing.record(stage, ms)
 
         # Optionally draw boxes on results
         if draw_boxes:
-            for result in results:
-                result.plot(conf=True)  # Includes confidence scores on boxes
+            with tracing.span("draw"):
+                for result in results:
+                    result.plot(conf=True)  # Includes confidence scores on boxes
+
+        return results
+
+    def _predict_gated(self, image, source, conf, iou, max_det):
+        """Frames (paths / BGR arrays / PIL images) of one source through the change gate"""
+        images = image if isinstance(image, (list, tuple)) else [image]
+        items = [(source, _load_image(img)) for img in images]
 
+        def predict_fn(images, conf, iou, max_det):
+            return self.model.predict(images, conf=conf, iou=iou, max_det=max_det, verbose=False)
+
+        results, _ = gated_predict(self.gate, predict_fn, items, conf=conf, iou=iou, max_det=max_det)
+        return results
+
+    def _predict_tiled(self, image, conf, iou, max_det):
+        """Tiled inference on paths / BGR arrays / PIL images, returning Ultralytics Results"""
+        import torch
+        from ultralytics.engine.results import Results
+
+        tiling = self.config.get("tiling", {})
+
+        def predict_fn(images, conf, iou, max_det):
+            results = self.model.predict(images, conf=conf, iou=iou, max_det=max_det, verbose=False)
+            return [Detections.from_ultralytics(r) for r in results]
+
+        results = []
+        for source in image if isinstance(image, (list, tuple)) else [image]:
+            is_path = isinstance(source, (str, os.PathLike))
+            img = _load_image(source)
+            det = predict_tiled(
+                predict_fn,
+                img,
+                conf=conf,
+                iou=iou,
+                max_det=max_det,
+                tile_size=tiling.get("tile_size", 640),
+                overlap=tiling.get("overlap", 0.2),
+                include_full=tiling.get("include_full_image", True),
+            )
+            result = Results(
+                img, path=str(source) if is_path else "", names=self.model.names, boxes=torch.from_numpy(det.data)
+            )
+            result.speed = det.speed or {}
+            results.append(result)
         return results
 
+    def predict_stream(self, source, conf=0.25, batch_size=1):
+        """Generator variant of predict for large inputs (directories, globs, videos, lists).
+        Yields one Results object per image as soon as it is processed, so memory stays flat
+        regardless of how many images the source contains.
+        """
+        yield from self.model.predict(source, conf=conf, batch=batch_size, stream=True, verbose=False)
+
     def load_weights(self, weights_path):
         """Load specific weights (e.g., best.pt)"""
         print(f"Loading weights from {weights_path}")
@@ -0,0 +1,246 @@
+"""Multi-camera inference on one shared model.
+
+Every source (video file, frame directory, camera or stream) gets its own decoder thread
+and bounded queue; the multiplexer pulls frames from them by weighted round-robin into
+shared batches for a single loaded model and routes the detections back per source.
+"""
+
+import json
+import os
+import time
+
+import yaml
+
+from forestfires_project.backends import load_backend
+from forestfires_project.gating import gated_predict, make_gate
+from forestfires_project.video import PersistenceFilter, open_source
+
+
+class SourceStats:
+    """Per-source throughput and lag (capture -> result) counters"""
+
+    def __init__(self):
+        self.frames_processed = 0
+        self.lag_total = 0.0
+        self.max_lag = 0.0
+        self.first_at = None
+        self.last_at = None
+
+    def update(self, lag):
+        now = time.perf_counter()
+        self.first_at = self.first_at or now
+        self.last_at = now
+        self.frames_processed += 1
+        self.lag_total += lag
+        self.max_lag = max(self.max_lag, lag)
+
+    def to_dict(self, reader):
+        elapsed = (self.last_at - self.first_at) if self.first_at else 0.0
+        return {
+            "frames_read": reader.frames_read,
+            "frames_dropped": reader.frames_dropped,
+            "frames_processed": self.frames_processed,
+            "fps": (self.frames_processed - 1) / elapsed if elapsed > 0 else 0.0,
+            "avg_lag_ms": self.lag_total * 1000.0 / self.frames_processed if self.frames_processed else 0.0,
+            "max_lag_ms": self.max_lag * 1000.0,
+        }
+
+
+class StreamMultiplexer:
+    """Schedules frames from many sources into shared batches on one model.
+
+    Each scheduling round takes up to `priority` queued frames from every source
+    (weighted round-robin; equal priorities give plain round-robin) until the batch is
+    full. The starting source rotates between batches so no camera is starved.
+    """
+
+    def __init__(
+        self, predict_fn, batch_size=8, conf=0.25, iou=0.7, max_det=300, persistence_frames=None, names=None, gate=None
+    ):
+        """
+        Args:
+            predict_fn: Callable (images, conf=, iou=, max_det=) -> list of Detections
+            batch_size: Maximum frames per forward pass (across all sources)
+            persistence_frames: If set, emit per-source events via PersistenceFilter
+            names: Class names for events
+            gate: Optional ChangeGate; unchanged frames reuse their source's last detections
+        """
+        self.predict_fn = predict_fn
+        self.batch_size = max(1, int(batch_size))
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.persistence_frames = persistence_frames
+        self.names = names
+        self.gate = gate
+
+        self.sources = {}  # name -> {"reader", "priority", "stats", "persistence"}
+        self._order = []
+        self._next = 0
+        self.batches_total = 0
+
+    def add_source(self, name, reader, priority=1):
+        """Register a (not yet started) FrameReader / DirectoryReader under `name`"""
+        if name in self.sources:
+            raise ValueError(f"Duplicate source name '{name}'")
+        persistence = PersistenceFilter(self.persistence_frames, self.names) if self.persistence_frames else None
+        self.sources[name] = {
+            "reader": reader,
+            "priority": max(1, int(priority)),
+            "stats": SourceStats(),
+            "persistence": persistence,
+        }
+        self._order.append(name)
+
+    def start(self):
+        for source in self.sources.values():
+            source["reader"].start()
+
+    def stop(self):
+        for source in self.sources.values():
+            source["reader"].stop()
+
+    def _schedule(self):
+        """Collect up to batch_size (name, frame) pairs from the source queues"""
+        batch = []
+        n = len(self._order)
+        order = self._order[self._next :] + self._order[: self._next]
+        self._next = (self._next + 1) % n if n else 0
+
+        progress = True
+        while len(batch) < self.batch_size and progress:
+            progress = False
+            for name in order:
+                source = self.sources[name]
+                for _ in range(source["priority"]):
+                    if len(batch) >= self.batch_size:
+                        break
+                    frame = source["reader"].poll()
+                    if frame is None:
+                        break
+                    batch.append((name, frame))
+                    progress = True
+        return batch
+
+    def run(self, idle_sleep_s=0.005):
+        """Yield (source_name, frame, detections, events) until every source is exhausted"""
+        while True:
+            batch = self._schedule()
+            if not batch:
+                if all(source["reader"].done for source in self.sources.values()):
+                    return
+                time.sleep(idle_sleep_s)
+                continue
+
+            detections, num_run = gated_predict(
+                self.gate,
+                self.predict_fn,
+                [(name, frame.image) for name, frame in batch],
+                conf=self.conf,
+                iou=self.iou,
+                max_det=self.max_det,
+            )
+            if num_run:
+                self.batches_total += 1
+            now = time.perf_counter()
+            for (name, frame), det in zip(batch, detections):
+                source = self.sources[name]
+                source["stats"].update(now - frame.captured_at)
+                events = source["persistence"].update(frame, det) if source["persistence"] else []
+                yield name, frame, det, events
+
+    def stats(self):
+        """Per-source FPS / lag / drop statistics"""
+        return {name: source["stats"].to_dict(source["reader"]) for name, source in self.sources.items()}
+
+
+def run_multiplex(config_path="configs/config.yaml", model_path=None, sources=None, output_path=None):
+    """Run many camera sources through one shared model and write per-source events as JSON lines"""
+    # Resolve config path relative to project root
+    if not os.path.isabs(config_path):
+        config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), config_path)
+
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    # Setup root dir - resolve from config location
+    config_dir = os.path.dirname(config_path)
+    root = os.path.abspath(os.path.join(config_dir, config["paths"]["root_dir"]))
+
+    if model_path is None:
+        model_path = os.path.join(root, config["paths"]["models_dir"], config["project_name"], "weights", "best.pt")
+
+    if not os.path.exists(model_path):
+        print(f"Model not found at {model_path}. Please train first.")
+        return
+
+    mux_config = config.get("multiplex", {})
+    video_config = config.get("video", {})
+    if sources:
+        # CLI sources: name each camera after its position
+        sources = [{"name": f"cam{i}", "source": source} for i, source in enumerate(sources)]
+    else:
+        sources = mux_config.get("sources") or []
+    if not sources:
+        print("No sources given. Use --sources or set multiplex.sources in the config.")
+        return
+
+    if output_path is None:
+        output_path = os.path.join(root, config["paths"]["reports_dir"], "multiplex_events.jsonl")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    # One model instance for every camera
+    backend = load_backend(video_config.get("backend", "torch"), weights_path=model_path)
+    mux = StreamMultiplexer(
+        backend.predict,
+        batch_size=mux_config.get("batch_size", 8),
+        conf=video_config.get("conf", 0.25),
+        iou=video_config.get("iou", 0.7),
+        persistence_frames=video_config.get("persistence_frames", 3),
+        names=backend.names,
+        gate=make_gate(config),
+    )
+    for entry in sources:
+        reader = open_source(
+            entry["source"], queue_size=mux_config.get("queue_size", 2), realtime=mux_config.get("realtime")
+        )
+        mux.add_source(entry["name"], reader, priority=entry.get("priority", 1))
+
+    print(f"Multiplexing {len(sources)} sources on one {backend.name} model...")
+    mux.start()
+    try:
+        with open(output_path, "w") as out:
+            for name, _, _, events in mux.run():
+                for event in events:
+                    print(f"[{name} {event['timestamp_s']:.1f}s] {event['class_name']} {event['event']}")
+                    out.write(json.dumps({"source": name, **event}) + "\n")
+    finally:
+        mux.stop()
+
+    stats = mux.stats()
+    for name, s in stats.items():
+        print(
+            f"{name}: {s['frames_processed']}/{s['frames_read']} frames ({s['frames_dropped']} dropped), "
+            f"{s['fps']:.1f} FPS, lag avg {s['avg_lag_ms']:.0f}ms / max {s['max_lag_ms']:.0f}ms"
+        )
+    if mux.gate is not None:
+        print(f"Scene-change gating skipped {mux.gate.stats()['skip_rate']:.0%} of forward passes")
+    print(f"Events saved to {output_path}")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Multi-camera fire/smoke detection on one shared model")
+    parser.add_argument("--config", type=str, default="configs/config.yaml", help="Path to config file")
+    parser.add_argument(
+        "--model_path", type=str, default=None, help="Path to model weights (optional, uses best.pt if not provided)"
+    )
+    parser.add_argument(
+        "--sources", nargs="+", default=None, help="Video files, frame directories or stream URLs (overrides config)"
+    )
+    parser.add_argument("--output", type=str, default=None, help="JSON lines file for detection events")
+    args = parser.parse_args()
+
+    run_multiplex(config_path=args.config, model_path=args.model_path, sources=args.sources, output_path=args.output)
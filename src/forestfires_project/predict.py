@@ -0,0 +1,278 @@
+"""Offline bulk inference over a directory, glob or list of image files.
+
+Images are decoded by DataLoader worker processes (large JPEGs downscaled while decoding)
+and sent through the backend in batches. Detections are streamed to JSONL (one line per
+image), CSV or Parquet (one row per detection). After every `checkpoint_every` batches the
+output is flushed, the batches' detections are committed to the detection store (if enabled),
+and the processed files plus the output position are appended to a checkpoint file next to
+the output. A rerun skips the checkpointed files and continues
+from there, so an interrupted nightly run does not start over.
+"""
+
+import csv
+import json
+import os
+import time
+
+import yaml
+from torch.utils.data import DataLoader
+
+from forestfires_project.backends import load_backend
+from forestfires_project.cache import model_version
+from forestfires_project.data import ImageFileDataset
+from forestfires_project.detection_store import open_store
+from forestfires_project.execution import apply_execution_settings, available_cpus
+from forestfires_project.jobs import ROW_COLUMNS, detection_rows, list_images, parquet_available
+
+OUTPUT_FORMATS = ("jsonl", "csv", "parquet")
+
+
+def resolve_sources(source):
+    """Image paths of a directory, glob, single image or .txt file with one path per line"""
+    if source.lower().endswith(".txt") and os.path.isfile(source):
+        with open(source) as f:
+            lines = [line.strip() for line in f]
+        return [line for line in lines if line and not line.startswith("#")]
+    return list_images(source)
+
+
+def prediction_dict(filename, r):
+    """Per-image result in the /predict schema (without the request parameters)"""
+    names = r.names or {}
+    detections = [
+        {
+            "class_id": int(cls_id),
+            "class_name": names.get(int(cls_id), str(int(cls_id))),
+            "confidence": float(score),
+            "box_xyxy": [float(v) for v in box],
+        }
+        for box, score, cls_id in zip(r.boxes.tolist(), r.scores.tolist(), r.class_ids.tolist())
+    ]
+    return {
+        "filename": filename,
+        "image_size": {"width": int(r.orig_shape[1]), "height": int(r.orig_shape[0])},
+        "num_detections": len(detections),
+        "detections": detections,
+    }
+
+
+def read_checkpoint(checkpoint_path):
+    """(processed files, output position) recorded by earlier runs; a torn last line is ignored"""
+    done, position = set(), 0
+    if not os.path.exists(checkpoint_path):
+        return done, position
+    with open(checkpoint_path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            done.update(entry["files"])
+            position = entry["position"]
+    return done, position
+
+
+class ResultWriter:
+    """Appends results to a JSONL / CSV file, or a directory of Parquet part files.
+    flush() makes everything written so far durable and returns the position to resume from
+    (a byte offset, or the number of Parquet parts); anything past `position` is discarded on open.
+    """
+
+    def __init__(self, path, output_format="jsonl", position=0):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}. Choose from {OUTPUT_FORMATS}.")
+        self.path = path
+        self.output_format = output_format
+        self._rows = []
+
+        if output_format == "parquet":
+            os.makedirs(path, exist_ok=True)
+            for name in os.listdir(path):
+                if name.startswith("part-") and int(name[5:10]) >= position:
+                    os.remove(os.path.join(path, name))
+            self._parts = position
+            return
+
+        exists = position and os.path.exists(path)
+        self._file = open(path, "r+" if exists else "w", newline="")
+        self._file.seek(position if exists else 0)
+        self._file.truncate()
+        if output_format == "csv":
+            self._csv = csv.DictWriter(self._file, fieldnames=ROW_COLUMNS)
+            if not exists:
+                self._csv.writeheader()
+
+    def write(self, result):
+        if self.output_format == "jsonl":
+            self._file.write(json.dumps(result) + "\n")
+        elif self.output_format == "csv":
+            self._csv.writerows(detection_rows(result))
+        else:
+            self._rows.extend(detection_rows(result))
+
+    def flush(self):
+        if self.output_format == "parquet":
+            if self._rows:
+                import pandas as pd
+
+                part = os.path.join(self.path, f"part-{self._parts:05d}.parquet")
+                pd.DataFrame(self._rows, columns=list(ROW_COLUMNS)).to_parquet(part, index=False)
+                self._parts += 1
+                self._rows = []
+            return self._parts
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self):
+        if self.output_format != "parquet":
+            self._file.close()
+
+
+def _collate(batch):
+    return batch
+
+
+def run_prediction(
+    config_path="configs/config.yaml", model_path=None, source=None, output_path=None, output_format=None
+):
+    """Score every image of `source` (directory, glob or .txt list) and stream detections to a file"""
+    # Resolve config path relative to project root
+    if not os.path.isabs(config_path):
+        config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), config_path)
+
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    # Setup root dir - resolve from config location
+    config_dir = os.path.dirname(config_path)
+    root = os.path.abspath(os.path.join(config_dir, config["paths"]["root_dir"]))
+
+    if model_path is None:
+        model_path = os.path.join(root, config["paths"]["models_dir"], config["project_name"], "weights", "best.pt")
+
+    if not os.path.exists(model_path):
+        print(f"Model not found at {model_path}. Please train first.")
+        return
+
+    predict_config = config.get("predict", {})
+    source = source or predict_config.get("source")
+    if source is None:
+        print("No image source given. Use --source or set predict.source in the config.")
+        return
+
+    output_format = output_format or predict_config.get("output_format", "jsonl")
+    if output_format not in OUTPUT_FORMATS:
+        print(f"Unsupported output format: {output_format}. Choose from {OUTPUT_FORMATS}.")
+        return
+    if output_format == "parquet" and not parquet_available():
+        print(
+            "Parquet output needs pandas with pyarrow or fastparquet. "
+            "Install them, or use --format jsonl/csv (or set predict.output_format)."
+        )
+        return
+    if output_path is None:
+        output_path = predict_config.get("output_path") or os.path.join(
+            root, config["paths"]["reports_dir"], f"predictions.{output_format}"
+        )
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    checkpoint_path = output_path + ".checkpoint.jsonl"
+
+    paths = resolve_sources(source)
+    done, position = read_checkpoint(checkpoint_path)
+    todo = [p for p in paths if p not in done]
+    print(f"Found {len(paths)} images in {source}: {len(paths) - len(todo)} already processed, {len(todo)} to go")
+    if not todo:
+        return output_path
+
+    apply_execution_settings(config.get("execution"), "predict")
+    batch_size = predict_config.get("batch_size", 16)
+    min_size = config["hyperparameters"]["img_size"] if predict_config.get("downscale", True) else 0
+    loader = DataLoader(
+        ImageFileDataset(todo, min_size=min_size),
+        batch_size=batch_size,
+        num_workers=min(predict_config.get("num_workers", 4), len(available_cpus())),
+        collate_fn=_collate,
+    )
+    # Start the decode workers before the model (and its thread pools) exist in this process
+    batches = iter(loader)
+    backend_name = predict_config.get("backend", "torch")
+    backend = load_backend(backend_name, weights_path=model_path)
+    store = open_store(config, config_path)
+    version = model_version(model_path, backend_name)
+
+    conf = predict_config.get("conf", 0.25)
+    iou = predict_config.get("iou", 0.7)
+    max_det = predict_config.get("max_det", 300)
+    checkpoint_every = max(1, predict_config.get("checkpoint_every", 10))
+
+    writer = ResultWriter(output_path, output_format, position if done else 0)
+    processed, failed, pending, scored = 0, 0, [], []
+    start = time.perf_counter()
+    with open(checkpoint_path, "a" if done else "w") as checkpoint:
+
+        def _checkpoint():
+            position = writer.flush()
+            # Store exactly what the checkpoint covers, so a resumed run does not record images twice
+            if store is not None and scored:
+                store.record(scored, "predict", version)
+                store.flush()
+            checkpoint.write(json.dumps({"files": pending, "position": position}) + "\n")
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+            pending.clear()
+            scored.clear()
+
+        for batch_idx, batch in enumerate(batches):
+            images = [(img, orig_shape) for _, img, orig_shape in batch if img is not None]
+            detections = iter(
+                backend.predict([img for img, _ in images], conf=conf, iou=iou, max_det=max_det) if images else []
+            )
+            for path, img, orig_shape in batch:
+                if img is None:
+                    failed += 1
+                    writer.write({"filename": path, "error": f"Could not read image: {orig_shape}"})
+                else:
+                    r = next(detections).rescale(orig_shape)
+                    scored.append((path, r))
+                    writer.write(prediction_dict(path, r))
+                pending.append(path)
+
+            processed += len(batch)
+            if (batch_idx + 1) % checkpoint_every == 0:
+                _checkpoint()
+                rate = processed / (time.perf_counter() - start)
+                print(f"{len(paths) - len(todo) + processed}/{len(paths)} images ({rate:.1f} img/s)")
+        _checkpoint()
+    writer.close()
+    if store is not None:
+        store.close()
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Scored {processed} images in {elapsed:.1f}s ({processed / elapsed:.1f} img/s, {failed} unreadable). "
+        f"Results saved to {output_path}"
+    )
+    return output_path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk inference over a directory, glob or list of images")
+    parser.add_argument("--config", type=str, default="configs/config.yaml", help="Path to config file")
+    parser.add_argument(
+        "--model_path", type=str, default=None, help="Path to model weights (optional, uses best.pt if not provided)"
+    )
+    parser.add_argument("--source", type=str, default=None, help="Directory, glob or .txt file of image paths")
+    parser.add_argument("--output", type=str, default=None, help="Output path (default reports/predictions.<format>)")
+    parser.add_argument("--format", type=str, default=None, choices=OUTPUT_FORMATS, help="Output format")
+    args = parser.parse_args()
+
+    run_prediction(
+        config_path=args.config,
+        model_path=args.model_path,
+        source=args.source,
+        output_path=args.output,
+        output_format=args.format,
+    )
@@ -0,0 +1,189 @@
+import os
+import time
+
+import cv2
+import numpy as np
+import onnx
+import wandb
+import yaml
+from dotenv import load_dotenv
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+from forestfires_project.backends import OnnxBackend, export_model, letterbox
+from forestfires_project.data import create_yolo_yaml, sample_dataset
+
+
+class ValCalibrationReader(CalibrationDataReader):
+    """Feeds letterboxed validation images to ONNX Runtime's static quantization calibrator"""
+
+    def __init__(self, image_paths, input_name, imgsz):
+        self.image_paths = image_paths
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self._iter = iter(image_paths)
+
+    def get_next(self):
+        path = next(self._iter, None)
+        if path is None:
+            return None
+        img, _, _ = letterbox(cv2.imread(path), self.imgsz)
+        # BGR HWC uint8 -> RGB NCHW float32 in [0, 1], same as OnnxBackend
+        batch = np.ascontiguousarray(img[None, ..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        return {self.input_name: batch}
+
+    def rewind(self):
+        self._iter = iter(self.image_paths)
+
+
+def quantize_onnx(fp32_path, int8_path, calibration_paths, imgsz, per_channel=True):
+    """Statically quantize an exported YOLO ONNX model to INT8 (QDQ format, CPU-runnable)"""
+    model = onnx.load(fp32_path)
+    input_name = model.graph.input[0].name
+
+    # Keep the Detect head's DFL decoding in float - box coordinates need the full range
+    nodes_to_exclude = [node.name for node in model.graph.node if "dfl" in node.name.lower()]
+
+    reader = ValCalibrationReader(calibration_paths, input_name, imgsz)
+    print(f"Calibrating INT8 model on {len(calibration_paths)} validation images...")
+    quantize_static(
+        fp32_path,
+        int8_path,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=per_channel,
+        op_types_to_quantize=["Conv", "MatMul"],
+        nodes_to_exclude=nodes_to_exclude,
+    )
+    print(f"INT8 model saved to {int8_path}")
+    return int8_path
+
+
+def benchmark_latency(model_path, image_paths, imgsz, num_threads=1, warmup=3):
+    """Mean single-image latency (ms) with ONNX Runtime pinned to `num_threads` threads"""
+    backend = OnnxBackend(model_path, imgsz=imgsz, num_threads=num_threads)
+    images = [cv2.imread(p) for p in image_paths]
+    for img in images[:warmup]:
+        backend.predict([img])
+
+    start = time.perf_counter()
+    for img in images:
+        backend.predict([img])
+    return (time.perf_counter() - start) * 1000.0 / len(images)
+
+
+def evaluate_map(model_path, data_yaml_path, imgsz):
+    """mAP on the test split, as in run_evaluation"""
+    from ultralytics import YOLO
+
+    metrics = YOLO(model_path, task="detect").val(
+        data=data_yaml_path,
+        split="test",
+        imgsz=imgsz,
+        batch=1,
+        plots=False,
+        save_txt=False,
+        save_conf=False,
+        save_crop=False,
+        verbose=False,
+    )
+    return {"mAP50": metrics.box.map50, "mAP50-95": metrics.box.map}
+
+
+def run_quantization(config_path="configs/config.yaml", model_path=None, use_wandb=True):
+    """Export best.pt to ONNX, produce an INT8 model calibrated on the val split and
+    report the accuracy / latency trade-off against FP32.
+    """
+    # Load environment variables
+    load_dotenv()
+
+    # Resolve config path relative to project root
+    if not os.path.isabs(config_path):
+        config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), config_path)
+
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    # Setup root dir - resolve from config location
+    config_dir = os.path.dirname(config_path)
+    root = os.path.abspath(os.path.join(config_dir, config["paths"]["root_dir"]))
+
+    if model_path is None:
+        model_path = os.path.join(root, config["paths"]["models_dir"], config["project_name"], "weights", "best.pt")
+
+    if not os.path.exists(model_path):
+        print(f"Model not found at {model_path}. Please train first.")
+        return
+
+    quant_config = config.get("quantization", {})
+    imgsz = config["hyperparameters"]["img_size"]
+    seed = config.get("data_sampling", {}).get("random_seed", 42)
+
+    # Step 1: FP32 ONNX export
+    fp32_path = export_model(model_path, fmt="onnx", imgsz=imgsz)
+    int8_path = os.path.splitext(fp32_path)[0] + "_int8.onnx"
+
+    # Step 2: Calibrate on a sampled subset of the val split
+    val_img_dir = os.path.join(root, config["paths"]["val_images"])
+    val_lbl_dir = os.path.join(root, config["paths"]["val_labels"])
+    calib_files = sample_dataset(val_img_dir, val_lbl_dir, quant_config.get("calibration_samples", 100), seed)
+    calib_paths = [os.path.join(val_img_dir, f"{fname}.jpg") for fname in calib_files]
+    if not calib_paths:
+        print(f"No calibration images found in {val_img_dir}.")
+        return
+
+    quantize_onnx(fp32_path, int8_path, calib_paths, imgsz, per_channel=quant_config.get("per_channel", True))
+
+    # Step 3: Accuracy / latency trade-off
+    yaml_path = create_yolo_yaml(config, config_path)
+    bench_paths = calib_paths[: quant_config.get("benchmark_images", 20)]
+    num_threads = quant_config.get("benchmark_threads", 1)
+
+    report = {}
+    for precision, path in (("fp32", fp32_path), ("int8", int8_path)):
+        print(f"Evaluating {precision} model...")
+        latency_ms = benchmark_latency(path, bench_paths, imgsz, num_threads=num_threads)
+        report[precision] = {
+            **evaluate_map(path, yaml_path, imgsz),
+            "latency_ms": latency_ms,
+            "images_per_sec": 1000.0 / latency_ms,
+            "size_mb": os.path.getsize(path) / 1e6,
+        }
+
+    fp32, int8 = report["fp32"], report["int8"]
+    print(f"Quantization Results ({num_threads} thread(s)):")
+    for precision, r in report.items():
+        print(
+            f"{precision.upper()}: mAP@50={r['mAP50']:.4f} mAP@50-95={r['mAP50-95']:.4f} "
+            f"latency={r['latency_ms']:.1f}ms ({r['images_per_sec']:.1f} img/s) size={r['size_mb']:.1f}MB"
+        )
+    print(f"Speedup: {fp32['latency_ms'] / int8['latency_ms']:.2f}x, mAP@50 drop: {fp32['mAP50'] - int8['mAP50']:.4f}")
+
+    # Log to wandb
+    if use_wandb:
+        wandb.init(
+            project=config["wandb_project"],
+            name=f"{config['project_name']}_quantization",
+            config=config,
+            job_type="quantization",
+        )
+        wandb.log({f"quantize/{p}/{k}": v for p, r in report.items() for k, v in r.items()})
+        wandb.finish()
+
+    report["int8"]["path"] = int8_path
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="INT8 post-training quantization of the forest fire model")
+    parser.add_argument("--config", type=str, default="configs/config.yaml", help="Path to config file")
+    parser.add_argument(
+        "--model_path", type=str, default=None, help="Path to model weights (optional, uses best.pt if not provided)"
+    )
+    parser.add_argument("--no_wandb", action="store_true", help="Disable wandb logging")
+    args = parser.parse_args()
+
+    run_quantization(config_path=args.config, model_path=args.model_path, use_wandb=not args.no_wandb)
@@ -0,0 +1,320 @@
+"""Versioned model registry for the API.
+
+Each loaded model version owns its replicas and its own MicroBatcher, so batches never
+mix versions. New versions are loaded and warmed up in the background, the default is
+swapped atomically, and retired versions are drained (in-flight requests finish) before
+their batcher is stopped and their weights are released.
+"""
+
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from forestfires_project.batching import MicroBatcher
+
+
+def _mtime(path):
+    """Latest modification time of a file, or of any file in a directory (None if missing)"""
+    if os.path.isdir(path):
+        return max(
+            (os.path.getmtime(os.path.join(dirpath, name)) for dirpath, _, names in os.walk(path) for name in names),
+            default=None,
+        )
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+
+class ModelEntry:
+    """One loaded model version: backend replicas, batcher and in-flight bookkeeping"""
+
+    def __init__(self, name, version, weights_path, on_batch=None):
+        self.name = name
+        self.version = version
+        self.weights_path = weights_path
+        self.status = "loading"  # loading -> ready -> draining -> unloaded (or failed)
+        self.error = None
+        self.loaded_at = None
+        self.warmup_ms = None
+        self.backend = None
+        self.batcher = None
+        self._pool = queue.Queue()
+        self._in_flight = 0
+        self._on_batch = on_batch
+
+    @property
+    def names(self):
+        return self.backend.names if self.backend is not None else {}
+
+    def _predict_batch(self, images, conf, iou, max_det):
+        """One batched forward pass on a free replica (called from a batcher worker thread)"""
+        model = self._pool.get()
+        try:
+            results = model.predict(images, conf=conf, iou=iou, max_det=max_det)
+        finally:
+            self._pool.put(model)
+        if self._on_batch is not None:
+            self._on_batch(results)
+        return results
+
+    def info(self):
+        return {
+            "name": self.name,
+            "version": self.version,
+            "weights_path": self.weights_path,
+            "status": self.status,
+            "error": self.error,
+            "loaded_at": self.loaded_at,
+            "warmup_ms": self.warmup_ms,
+            "in_flight": self._in_flight,
+        }
+
+
+class ModelRegistry:
+    """Loads model versions by name, serves a swappable default and drains retired versions"""
+
+    def __init__(
+        self,
+        load_fn,
+        version_fn,
+        batcher_config=None,
+        num_replicas=1,
+        warmup_sizes=(640,),
+        warmup_batch_sizes=(1,),
+        warmup_runs=1,
+        on_batch=None,
+    ):
+        """
+        Args:
+            load_fn: Callable weights_path -> backend (one replica)
+            version_fn: Callable weights_path -> version string (e.g. backend + file digest)
+            batcher_config: MicroBatcher keyword arguments (max_batch_size, max_wait_ms, max_queue_size)
+            num_replicas: Backend replicas (and batcher workers) per version
+            warmup_sizes: Square image sizes run through each replica before it serves
+            warmup_batch_sizes: Batch sizes warmed up at every size (the first real batch of each
+                shape otherwise pays kernel selection / graph initialization)
+            warmup_runs: Passes per (size, batch size)
+            on_batch: Optional callable(results) after every forward pass (e.g. batch size metrics)
+        """
+        self.load_fn = load_fn
+        self.version_fn = version_fn
+        self.batcher_config = batcher_config or {}
+        self.num_replicas = max(1, int(num_replicas))
+        self.warmup_sizes = [int(size) for size in warmup_sizes]
+        self.warmup_batch_sizes = [max(1, int(bs)) for bs in warmup_batch_sizes]
+        self.warmup_runs = max(0, int(warmup_runs))
+        self.on_batch = on_batch
+
+        self._entries = {}  # name -> ModelEntry
+        self._default = None
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._watch_stop = threading.Event()
+
+    def add_listener(self, fn):
+        """Call fn(old_entry, new_entry) whenever the default model is swapped"""
+        self._listeners.append(fn)
+
+    def load(self, weights_path, name=None, make_default=False, background=True):
+        """Load (and warm up) a model version. Returns its ModelEntry immediately when
+        background=True; poll entry.status until it is "ready" (or "failed").
+        """
+        version = self.version_fn(weights_path)
+        name = name or version
+        with self._lock:
+            existing = self._entries.get(name)
+            if existing is not None and existing.status in ("loading", "ready"):
+                raise ValueError(f"Model '{name}' is already {existing.status}")
+            entry = ModelEntry(name, version, weights_path, on_batch=self.on_batch)
+            self._entries[name] = entry
+
+        if background:
+            threading.Thread(
+                target=self._load_entry, args=(entry, make_default), name=f"model-load-{name}", daemon=True
+            ).start()
+        else:
+            self._load_entry(entry, make_default)
+            if entry.status == "failed":
+                raise RuntimeError(f"Failed to load model '{name}' from {weights_path}: {entry.error}")
+        return entry
+
+    def _load_entry(self, entry, make_default):
+        try:
+            warmup_s = 0.0
+            for _ in range(self.num_replicas):
+                backend = self.load_fn(entry.weights_path)
+                warmup_s += self.warmup(backend)
+                entry.backend = entry.backend or backend
+                entry._pool.put(backend)
+            entry.warmup_ms = warmup_s * 1000.0
+            entry.batcher = MicroBatcher(entry._predict_batch, num_workers=self.num_replicas, **self.batcher_config)
+            entry.batcher.start()
+            entry.loaded_at = time.time()
+            with self._lock:
+                # unload() while loading wins: it already removed the entry, so discard what was loaded
+                cancelled = entry.status != "loading"
+                if not cancelled:
+                    entry.status = "ready"
+        except Exception as e:
+            with self._lock:
+                if entry.status == "loading":
+                    entry.status = "failed"
+            entry.error = str(e)
+            print(f"Failed to load model '{entry.name}' from {entry.weights_path}: {e}")
+            return
+
+        if cancelled:
+            entry.batcher.stop()
+            with self._lock:
+                entry.backend = None
+                entry._pool = queue.Queue()
+            print(f"Model '{entry.name}' ({entry.version}) was unloaded while loading; discarded")
+            return
+
+        print(f"Model '{entry.name}' ({entry.version}) ready")
+        if make_default:
+            self.set_default(entry.name)
+
+    def warmup(self, backend):
+        """Run dummy passes at every configured size / batch size so the first requests do not
+        pay kernel and graph initialization. Returns the time spent in seconds.
+        """
+        start = time.perf_counter()
+        for size in self.warmup_sizes:
+            dummy = np.zeros((size, size, 3), dtype=np.uint8)
+            for batch_size in self.warmup_batch_sizes:
+                for _ in range(self.warmup_runs):
+                    backend.predict([dummy] * batch_size)
+        return time.perf_counter() - start
+
+    def _resolve(self, name):
+        """Ready entry by name or version, the default when name is None (call with the lock held)"""
+        if name is None:
+            entry = self._default
+        else:
+            entry = self._entries.get(name) or next(
+                (e for e in self._entries.values() if e.version == name and e.status == "ready"), None
+            )
+        if entry is None or entry.status != "ready":
+            raise KeyError(f"Model '{name or 'default'}' is not loaded")
+        return entry
+
+    def get(self, name=None):
+        """Ready entry by name or version (the default when name is None)
+
+        Raises:
+            KeyError: If no ready model matches
+        """
+        with self._lock:
+            return self._resolve(name)
+
+    @property
+    def default(self):
+        return self.get()
+
+    def set_default(self, name):
+        """Atomically route new requests without an explicit model to `name`"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.status != "ready":
+                raise KeyError(f"Model '{name}' is not loaded")
+            old, self._default = self._default, entry
+        for fn in self._listeners:
+            fn(old, entry)
+        return old
+
+    def checkout(self, name=None):
+        """Like get(), but counts the caller as in flight until release(entry)"""
+        with self._lock:
+            entry = self._resolve(name)
+            entry._in_flight += 1
+            return entry
+
+    def release(self, entry):
+        with self._lock:
+            entry._in_flight -= 1
+            free = entry.status == "draining" and entry._in_flight == 0
+        if free:
+            self._free(entry)
+
+    @contextmanager
+    def acquire(self, name=None):
+        """Use a model for the duration of a request; drained versions are freed on last release"""
+        entry = self.checkout(name)
+        try:
+            yield entry
+        finally:
+            self.release(entry)
+
+    def unload(self, name):
+        """Stop serving `name`: new requests are refused, in-flight ones finish first
+
+        Raises:
+            KeyError: If the model is unknown
+            ValueError: If it is the current default
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                raise KeyError(f"Model '{name}' is not loaded")
+            if entry is self._default:
+                raise ValueError(f"Model '{name}' is the default; set another default first")
+            entry.status = "draining"
+            free = entry._in_flight == 0
+        if free:
+            self._free(entry)
+        return entry
+
+    def _free(self, entry):
+        if entry.batcher is not None:
+            entry.batcher.stop()
+        with self._lock:
+            entry.status = "unloaded"
+            entry.backend = None
+            entry._pool = queue.Queue()
+            if self._entries.get(entry.name) is entry:
+                del self._entries[entry.name]
+        print(f"Model '{entry.name}' ({entry.version}) unloaded")
+
+    def watch(self, weights_path, interval_s=10.0, extra_paths=()):
+        """Poll a weights file (e.g. best.pt written by training) and load it as the new default
+        when it changes. A change is only picked up once the file has stopped changing for one
+        interval, so a checkpoint that is still being written is never loaded. Changes to
+        `extra_paths` (e.g. the ONNX / INT8 export served for these weights) also trigger a reload.
+        """
+        paths = [weights_path, *extra_paths]
+
+        def _mtimes():
+            return tuple(_mtime(path) for path in paths)
+
+        def _run():
+            loaded_mtimes = _mtimes()
+            last_mtimes = loaded_mtimes
+            while not self._watch_stop.wait(interval_s):
+                if not os.path.exists(weights_path):
+                    continue
+                mtimes = _mtimes()
+                if mtimes != loaded_mtimes and mtimes == last_mtimes:
+                    loaded_mtimes = mtimes
+                    try:
+                        if self.version_fn(weights_path) != self.get().version:
+                            print(f"{', '.join(paths)} changed, loading new version...")
+                            self.load(weights_path, make_default=True)
+                    except (KeyError, ValueError) as e:
+                        print(f"Skipping reload of {weights_path}: {e}")
+                last_mtimes = mtimes
+
+        self._watch_stop.clear()
+        thread = threading.Thread(target=_run, name="model-watch", daemon=True)
+        thread.start()
+        return thread
+
+    def stop_watching(self):
+        self._watch_stop.set()
+
+    def list(self):
+        with self._lock:
+            default = self._default.name if self._default is not None else None
+            return {"default": default, "models": [e.info() for e in self._entries.values()]}
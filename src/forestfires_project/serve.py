@@ -0,0 +1,154 @@
+"""Multi-process API serving with shared model weights.
+
+The parent process loads (and fuses) the model once, binds the listening socket and forks
+the uvicorn workers. Workers inherit the weights copy-on-write instead of each loading
+their own copy of best.pt, and every worker gets an equal share of the cores for its
+intra-op threads so the workers do not oversubscribe the node.
+"""
+
+import gc
+import os
+import signal
+import socket
+import time
+
+import yaml
+
+from forestfires_project.execution import available_cpus
+
+
+def plan_workers(workers=None, threads_per_worker=None, cpu_count=None):
+    """(workers, threads_per_worker) that together use every core once.
+    Missing values are derived from the other one (both missing = one single-threaded worker per core).
+    """
+    cpu_count = cpu_count or len(available_cpus())
+    if workers is None:
+        workers = max(1, cpu_count // (threads_per_worker or 1))
+    if threads_per_worker is None:
+        threads_per_worker = max(1, cpu_count // workers)
+    return max(1, int(workers)), max(1, int(threads_per_worker))
+
+
+def worker_cores(index, num_threads, cpus=None):
+    """Disjoint slice of the available cores for worker `index` (wraps around when oversubscribed)"""
+    cpus = cpus or available_cpus()
+    start = (index * num_threads) % len(cpus)
+    return [cpus[(start + i) % len(cpus)] for i in range(min(num_threads, len(cpus)))]
+
+
+def _run_worker(index, sock, num_threads, pin):
+    """Body of a forked worker: serve the already-imported app on the shared socket"""
+    import uvicorn
+
+    from forestfires_project import api
+
+    # Applied by the app's startup: torch / OpenMP / ONNX Runtime get this worker's share of cores
+    api.EXECUTION["intra_op_threads"] = num_threads
+    # One job runner per deployment; a respawned worker 0 takes over (and resumes) its jobs
+    api.RUN_JOBS = index == 0
+    if pin:
+        api.EXECUTION["cpu_affinity"] = worker_cores(index, num_threads)
+    print(f"Worker {index} (pid {os.getpid()}) serving with {num_threads} threads")
+    uvicorn.Server(uvicorn.Config(api.app, log_level="info")).run(sockets=[sock])
+
+
+def _fork_worker(index, sock, num_threads, pin=False):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(index, sock, num_threads, pin)
+        except BaseException as e:
+            print(f"Worker {index} failed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def run_serving(config_path="configs/config.yaml", host=None, port=None, workers=None):
+    """Serve the API from several forked worker processes sharing one set of model weights"""
+    # Resolve config path relative to project root
+    if not os.path.isabs(config_path):
+        config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), config_path)
+
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    serving_config = (config.get("api") or {}).get("serving", {})
+    host = host or serving_config.get("host", "0.0.0.0")
+    port = int(port or serving_config.get("port", 8000))
+    workers, num_threads = plan_workers(
+        workers or serving_config.get("workers"), serving_config.get("threads_per_worker")
+    )
+
+    # The API module reads its config at import time
+    os.environ.setdefault("API_CONFIG_PATH", config_path)
+    import uvicorn
+
+    from forestfires_project import api
+
+    if not hasattr(os, "fork"):
+        print("os.fork is not available on this platform, serving from a single process")
+        uvicorn.run(api.app, host=host, port=port)
+        return
+
+    start = time.perf_counter()
+    replicas = api.preload_model()
+    if replicas:
+        print(f"Loaded {replicas} model replica(s) in the parent in {time.perf_counter() - start:.1f}s")
+    # Move everything allocated so far out of the GC's reach, so collections in the workers
+    # do not touch (and copy) the shared pages
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    print(f"Serving on http://{host}:{port} with {workers} workers x {num_threads} threads")
+    pin = serving_config.get("pin_workers", False)
+    children = {_fork_worker(i, sock, num_threads, pin): i for i in range(workers)}
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            # Replace a crashed worker; it forks from the parent's preloaded weights again
+            print(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+            children[_fork_worker(index, sock, num_threads, pin)] = index
+
+    sock.close()
+    print("All workers stopped")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the inference API from forked workers sharing one model")
+    parser.add_argument("--config", type=str, default="configs/config.yaml", help="Path to config file")
+    parser.add_argument("--host", type=str, default=None, help="Bind address (overrides api.serving.host)")
+    parser.add_argument("--port", type=int, default=None, help="Port (overrides api.serving.port)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (overrides api.serving.workers)")
+    args = parser.parse_args()
+
+    run_serving(config_path=args.config, host=args.host, port=args.port, workers=args.workers)
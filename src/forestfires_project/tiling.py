@@ -0,0 +1,90 @@
+"""Sliced (tiled) inference for high-resolution frames.
+
+The image is cut into overlapping tiles that are run through the model at its native
+input size, so small distant smoke plumes keep enough pixels to be detected. Tiles are
+sent as one batch, and their detections are shifted back to full-image coordinates and
+merged with class-aware NMS.
+"""
+
+import numpy as np
+
+from forestfires_project.backends import Detections, nms
+
+# Offset added per class id so NMS never merges boxes of different classes
+MAX_WH = 7680
+
+
+def tile_windows(height, width, tile_size=640, overlap=0.2):
+    """(x1, y1, x2, y2) windows of at most tile_size covering the image with at least the given
+    overlap. Tiles are spread evenly from edge to edge, so none needs padding.
+    """
+    if not 0.0 <= overlap < 1.0:
+        raise ValueError(f"Tile overlap must be in [0, 1), got {overlap}")
+    step = max(1, int(tile_size * (1.0 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        n = -(-(length - tile_size) // step) + 1
+        return np.linspace(0, length - tile_size, n).round().astype(int).tolist()
+
+    return [
+        (x, y, min(x + tile_size, width), min(y + tile_size, height)) for y in starts(height) for x in starts(width)
+    ]
+
+
+def make_tiles(img, tile_size=640, overlap=0.2, include_full=True):
+    """Cut a BGR image into tiles (array views, no copies).
+
+    Args:
+        img: (H, W, 3) BGR array
+        tile_size: Tile side in pixels (use the model input size)
+        overlap: Fraction of overlap between neighbouring tiles
+        include_full: Also return the whole image, so objects larger than a tile are still found
+
+    Returns:
+        (tiles, offsets): list of arrays and their (x, y) offsets in the full image
+    """
+    height, width = img.shape[:2]
+    windows = tile_windows(height, width, tile_size, overlap)
+    tiles = [img[y1:y2, x1:x2] for x1, y1, x2, y2 in windows]
+    offsets = [(x1, y1) for x1, y1, _, _ in windows]
+    if include_full and len(windows) > 1:
+        tiles.append(img)
+        offsets.append((0, 0))
+    return tiles, offsets
+
+
+def merge_tiles(detections, offsets, orig_shape, iou=0.7, max_det=300, names=None):
+    """Shift per-tile Detections into full-image coordinates and merge them with class-aware NMS"""
+    boxes = [d.boxes + np.array([x, y, x, y], dtype=np.float32) for d, (x, y) in zip(detections, offsets)]
+    boxes = np.concatenate(boxes) if boxes else np.zeros((0, 4), dtype=np.float32)
+    scores = np.concatenate([d.scores for d in detections]) if detections else np.zeros(0, dtype=np.float32)
+    class_ids = np.concatenate([d.class_ids for d in detections]) if detections else np.zeros(0, dtype=np.int64)
+    if names is None:
+        names = detections[0].names if detections else {}
+
+    keep = nms(boxes + (class_ids * MAX_WH)[:, None], scores, iou) if len(scores) else np.zeros(0, dtype=np.int64)
+    keep = keep[:max_det]
+
+    # Per-image timings: sum over tiles
+    speed = None
+    timed = [d.speed for d in detections if d.speed]
+    if timed:
+        speed = {key: sum(s.get(key, 0.0) for s in timed) for key in timed[0]}
+
+    return Detections(boxes[keep], scores[keep], class_ids[keep], names, orig_shape[:2], speed)
+
+
+def predict_tiled(predict_fn, img, conf=0.25, iou=0.7, max_det=300, tile_size=640, overlap=0.2, include_full=True):
+    """Tiled inference on one BGR image.
+
+    Args:
+        predict_fn: Callable (images, conf=, iou=, max_det=) -> list of Detections, e.g. a backend's predict
+        img: (H, W, 3) BGR array
+
+    All tiles go through a single predict_fn call. Returns Detections in full-image coordinates.
+    """
+    tiles, offsets = make_tiles(img, tile_size, overlap, include_full)
+    detections = predict_fn(tiles, conf=conf, iou=iou, max_det=max_det)
+    return merge_tiles(detections, offsets, img.shape, iou=iou, max_det=max_det)
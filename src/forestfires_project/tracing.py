@@ -0,0 +1,152 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+EXPORTERS = ("none", "file", "otel")
+
+_current_trace = contextvars.ContextVar("forestfires_trace", default=None)
+_listeners = []
+
+
+class Trace:
+    """Spans recorded while handling one request (or one pipeline run)"""
+
+    def __init__(self, name="trace"):
+        self.name = name
+        self.spans = []  # (name, duration_ms, attributes)
+        self._lock = threading.Lock()
+
+    def add(self, name, duration_ms, attributes=None):
+        with self._lock:
+            self.spans.append((name, duration_ms, attributes or {}))
+
+    def durations(self):
+        """Total milliseconds per span name, in first-seen order"""
+        totals = {}
+        with self._lock:
+            for name, duration_ms, _ in self.spans:
+                totals[name] = totals.get(name, 0.0) + duration_ms
+        return totals
+
+    def server_timing(self):
+        """Value for the Server-Timing response header"""
+        return ", ".join(f"{name};dur={ms:.2f}" for name, ms in self.durations().items())
+
+
+class NoOpExporter:
+    def export(self, record):
+        pass
+
+    def shutdown(self):
+        pass
+
+
+class FileExporter:
+    """Appends one JSON line per span to a local file"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a")
+        self._lock = threading.Lock()
+
+    def export(self, record):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
+
+
+class OpenTelemetryExporter:
+    """Re-emits spans through the OpenTelemetry API.
+    Where they go is decided by the OTel SDK setup (OTEL_* env vars); without one they are no-ops.
+    """
+
+    def __init__(self, service_name="forestfires"):
+        from opentelemetry import trace
+
+        self._tracer = trace.get_tracer(service_name)
+
+    def export(self, record):
+        span = self._tracer.start_span(record["name"], start_time=record["start_ns"], attributes=record["attributes"])
+        span.end(end_time=record["start_ns"] + int(record["duration_ms"] * 1e6))
+
+    def shutdown(self):
+        pass
+
+
+_exporter = NoOpExporter()
+
+
+def configure_tracing(exporter="none", path="reports/traces.jsonl", service_name="forestfires"):
+    """Select where finished spans are exported: "none", "file" (JSON lines) or "otel" """
+    global _exporter
+    if exporter not in EXPORTERS:
+        raise ValueError(f"Unknown tracing exporter '{exporter}'. Choose from {EXPORTERS}.")
+
+    _exporter.shutdown()
+    if exporter == "file":
+        _exporter = FileExporter(path)
+    elif exporter == "otel":
+        _exporter = OpenTelemetryExporter(service_name)
+    else:
+        _exporter = NoOpExporter()
+    return _exporter
+
+
+def add_listener(fn):
+    """Call fn(name, seconds, attributes) for every finished span (e.g. to feed metrics)"""
+    _listeners.append(fn)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(name="trace"):
+    """Collect every span recorded in this context (including copied contexts) into a Trace"""
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def record(name, duration_ms, start_ns=None, **attributes):
+    """Record an already-measured span (e.g. timings reported by a backend)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, duration_ms, attributes)
+    for fn in _listeners:
+        fn(name, duration_ms / 1000.0, attributes)
+    if start_ns is None:
+        start_ns = time.time_ns() - int(duration_ms * 1e6)
+    _exporter.export(
+        {
+            "trace": trace.name if trace is not None else None,
+            "name": name,
+            "start_ns": start_ns,
+            "duration_ms": duration_ms,
+            "attributes": attributes,
+        }
+    )
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the enclosed block and record it as a span named `name`"""
+    start_ns = time.time_ns()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - t0) * 1000.0, start_ns, **attributes)
@@ -3,6 +3,7 @@ import os
 import wandb
 from dotenv import load_dotenv
 from forestfires_project.data import create_yolo_yaml
+from forestfires_project.execution import apply_execution_settings
 from forestfires_project.model import ForestFireYOLO
 
 
@@ -26,6 +27,9 @@ def run_training(config_path="configs/config.yaml", lr_override=None, epochs_ove
     if batch_size_override is not None:
         config["hyperparameters"]["batch_size"] = batch_size_override
 
+    # Thread pools / core pinning before the model and data loaders start
+    apply_execution_settings(config.get("execution"), "train")
+
     # Initialize wandb
     config_dir = os.path.dirname(config_path)
     root = os.path.abspath(os.path.join(config_dir, config["paths"]["root_dir"]))
@@ -0,0 +1,365 @@
+"""Video file and live-stream (RTSP/HTTP) inference.
+
+A decoder thread reads frames into a small bounded queue. For live sources the oldest
+queued frame is dropped when inference falls behind, so latency stays bounded instead of
+building a backlog. Frames waiting in the queue are batched into one forward pass, and
+detections are turned into events only when a class persists across several frames.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+import yaml
+
+from forestfires_project.backends import IMAGE_SUFFIXES, load_backend
+from forestfires_project.gating import gated_predict, make_gate
+
+LIVE_PREFIXES = ("rtsp://", "rtmp://", "http://", "https://")
+
+# index: frame number in the source, timestamp_s: position in the video,
+# captured_at: time.perf_counter() when the frame was decoded
+Frame = namedtuple("Frame", ["index", "timestamp_s", "captured_at", "image"])
+
+_END = object()
+
+
+def is_live_source(source):
+    source = str(source)
+    return source.isdigit() or source.lower().startswith(LIVE_PREFIXES)
+
+
+class FrameReader:
+    """Decodes frames from a video file, camera index or stream URL in a background thread"""
+
+    def __init__(self, source, queue_size=4, realtime=None):
+        """
+        Args:
+            source: Video file path, camera index or rtsp:// / http:// URL
+            queue_size: Frames buffered between the decoder and inference
+            realtime: Drop the oldest frame when the queue is full (and pace files at their
+                native FPS) instead of blocking the decoder. None = only for live sources.
+        """
+        self.source = source
+        self.live = is_live_source(source)
+        self.realtime = self.live if realtime is None else bool(realtime)
+        self.fps = None
+
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._stop = threading.Event()
+        self._done = False
+        self._thread = None
+
+    def start(self):
+        self._open()
+        self._thread = threading.Thread(target=self._run, name="frame-reader", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def done(self):
+        """True once the source is exhausted and every frame has been taken"""
+        return self._done
+
+    def _open(self):
+        source = int(self.source) if str(self.source).isdigit() else str(self.source)
+        self._cap = cv2.VideoCapture(source)
+        if not self._cap.isOpened():
+            raise ValueError(f"Could not open video source {self.source}")
+        self.fps = self._cap.get(cv2.CAP_PROP_FPS) or 25.0
+
+    def _read(self):
+        """Next decoded BGR frame, or None at the end of the source"""
+        ok, image = self._cap.read()
+        return image if ok else None
+
+    def _close(self):
+        self._cap.release()
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            while not self._stop.is_set():
+                image = self._read()
+                if image is None:
+                    break
+                now = time.perf_counter()
+                if self.live:
+                    timestamp_s = now - started
+                else:
+                    timestamp_s = self.frames_read / self.fps
+                    if self.realtime:
+                        # Decode a file no faster than it would play
+                        delay = started + timestamp_s - now
+                        if delay > 0:
+                            time.sleep(delay)
+                            now = time.perf_counter()
+
+                self._put(Frame(self.frames_read, timestamp_s, now, image))
+                self.frames_read += 1
+        finally:
+            self._close()
+            self._put(_END)
+
+    def _put(self, item):
+        if not self.realtime:
+            # Back-pressure: the decoder waits for inference (every frame is processed)
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+            return
+
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                # Inference is behind: drop the oldest frame to keep latency bounded
+                try:
+                    self._queue.get_nowait()
+                    self.frames_dropped += 1
+                except queue.Empty:
+                    pass
+
+    def poll(self):
+        """Next queued frame without blocking, or None if nothing is ready (or the source ended)"""
+        if self._done:
+            return None
+        try:
+            item = self._queue.get_nowait()
+        except queue.Empty:
+            return None
+        if item is _END:
+            self._done = True
+            return None
+        return item
+
+    def next_batch(self, max_size):
+        """Block for the next frame, then take up to max_size - 1 more already queued.
+        Returns an empty list once the source is exhausted.
+        """
+        if self._done:
+            return []
+        batch = []
+        item = self._queue.get()
+        while item is not _END:
+            batch.append(item)
+            if len(batch) >= max_size:
+                return batch
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return batch
+        self._done = True
+        return batch
+
+
+class DirectoryReader(FrameReader):
+    """Reads a directory of image frames (sorted by name) like a video at `fps`"""
+
+    def __init__(self, source, queue_size=4, realtime=False, fps=1.0):
+        super().__init__(source, queue_size=queue_size, realtime=realtime)
+        self.live = False
+        self.fps = float(fps)
+
+    def _open(self):
+        if not os.path.isdir(self.source):
+            raise ValueError(f"Frame directory {self.source} does not exist")
+        names = sorted(f for f in os.listdir(self.source) if f.lower().endswith(IMAGE_SUFFIXES))
+        self._paths = iter(os.path.join(self.source, name) for name in names)
+
+    def _read(self):
+        for path in self._paths:
+            image = cv2.imread(path)
+            if image is not None:
+                return image
+        return None
+
+    def _close(self):
+        pass
+
+
+def open_source(source, queue_size=4, realtime=None):
+    """FrameReader for a video file / camera / stream URL, DirectoryReader for a frame directory"""
+    if os.path.isdir(str(source)):
+        return DirectoryReader(source, queue_size=queue_size, realtime=bool(realtime))
+    return FrameReader(source, queue_size=queue_size, realtime=realtime)
+
+
+class PersistenceFilter:
+    """Turns per-frame detections into events.
+
+    A "start" event is emitted when a class has been detected in `min_frames` consecutive
+    processed frames, and an "end" event when it disappears again, so single-frame false
+    positives never raise an alarm.
+    """
+
+    def __init__(self, min_frames=3, names=None):
+        self.min_frames = max(1, int(min_frames))
+        self.names = names or {}
+        self._counts = {}  # class_id -> consecutive frames with a detection
+        self._active = set()
+
+    def update(self, frame, det):
+        """Feed one frame's Detections; returns the list of events it triggers"""
+        events = []
+        present = {}
+        for cls_id, score in zip(det.class_ids.tolist(), det.scores.tolist()):
+            present[cls_id] = max(score, present.get(cls_id, 0.0))
+
+        for cls_id, score in present.items():
+            self._counts[cls_id] = self._counts.get(cls_id, 0) + 1
+            if self._counts[cls_id] >= self.min_frames and cls_id not in self._active:
+                self._active.add(cls_id)
+                events.append(self._event("start", cls_id, frame, score))
+
+        for cls_id in list(self._counts):
+            if cls_id not in present:
+                if cls_id in self._active:
+                    self._active.discard(cls_id)
+                    events.append(self._event("end", cls_id, frame, None))
+                del self._counts[cls_id]
+
+        return events
+
+    def _event(self, kind, cls_id, frame, confidence):
+        return {
+            "event": kind,
+            "class_id": cls_id,
+            "class_name": self.names.get(cls_id, str(cls_id)),
+            "frame_index": frame.index,
+            "timestamp_s": round(frame.timestamp_s, 3),
+            "confidence": confidence,
+            "frames": self._counts.get(cls_id, 0),
+        }
+
+
+def iter_video_detections(
+    predict_fn, reader, batch_size=4, conf=0.25, iou=0.7, max_det=300, persistence=None, gate=None
+):
+    """Run batched inference on frames from a started FrameReader.
+    With a ChangeGate, frames showing an unchanged scene reuse the previous detections.
+    Yields (frame, detections, events) for every processed frame.
+    """
+    while True:
+        batch = reader.next_batch(batch_size)
+        if not batch:
+            return
+        detections, _ = gated_predict(
+            gate, predict_fn, [(reader.source, frame.image) for frame in batch], conf=conf, iou=iou, max_det=max_det
+        )
+        for frame, det in zip(batch, detections):
+            events = persistence.update(frame, det) if persistence is not None else []
+            yield frame, det, events
+
+
+def run_video(config_path="configs/config.yaml", model_path=None, source=None, output_path=None):
+    """Detect fire/smoke in a video file or live stream and write persistence events as JSON lines"""
+    # Resolve config path relative to project root
+    if not os.path.isabs(config_path):
+        config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), config_path)
+
+    with open(config_path, "r") as f:
+        config = yaml.safe_load(f)
+
+    # Setup root dir - resolve from config location
+    config_dir = os.path.dirname(config_path)
+    root = os.path.abspath(os.path.join(config_dir, config["paths"]["root_dir"]))
+
+    if model_path is None:
+        model_path = os.path.join(root, config["paths"]["models_dir"], config["project_name"], "weights", "best.pt")
+
+    if not os.path.exists(model_path):
+        print(f"Model not found at {model_path}. Please train first.")
+        return
+
+    video_config = config.get("video", {})
+    source = source or video_config.get("source")
+    if source is None:
+        print("No video source given. Use --source or set video.source in the config.")
+        return
+
+    if output_path is None:
+        output_path = os.path.join(root, config["paths"]["reports_dir"], "video_events.jsonl")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    backend = load_backend(video_config.get("backend", "torch"), weights_path=model_path)
+    reader = open_source(source, queue_size=video_config.get("queue_size", 4), realtime=video_config.get("realtime"))
+    persistence = PersistenceFilter(video_config.get("persistence_frames", 3), names=backend.names)
+    gate = make_gate(config)
+
+    print(f"Running video inference on {source} (realtime={reader.realtime})...")
+    reader.start()
+    processed = 0
+    num_events = 0
+    latency_total = 0.0
+    started = time.perf_counter()
+    try:
+        with open(output_path, "w") as out:
+            for frame, _, events in iter_video_detections(
+                backend.predict,
+                reader,
+                batch_size=video_config.get("batch_size", 4),
+                conf=video_config.get("conf", 0.25),
+                iou=video_config.get("iou", 0.7),
+                persistence=persistence,
+                gate=gate,
+            ):
+                processed += 1
+                latency_total += time.perf_counter() - frame.captured_at
+                for event in events:
+                    num_events += 1
+                    print(f"[{event['timestamp_s']:.1f}s] {event['class_name']} {event['event']}")
+                    out.write(json.dumps(event) + "\n")
+    finally:
+        reader.stop()
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "frames_read": reader.frames_read,
+        "frames_dropped": reader.frames_dropped,
+        "frames_processed": processed,
+        "events": num_events,
+        "processing_fps": processed / elapsed if elapsed else 0.0,
+        "avg_latency_ms": latency_total * 1000.0 / processed if processed else 0.0,
+        "gating": gate.stats() if gate is not None else None,
+    }
+    print(
+        f"Processed {processed}/{reader.frames_read} frames ({reader.frames_dropped} dropped) "
+        f"at {stats['processing_fps']:.1f} FPS, avg latency {stats['avg_latency_ms']:.0f}ms"
+    )
+    if gate is not None:
+        print(f"Scene-change gating skipped {stats['gating']['skip_rate']:.0%} of forward passes")
+    print(f"Events saved to {output_path}")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Fire/smoke detection on a video file or live stream")
+    parser.add_argument("--config", type=str, default="configs/config.yaml", help="Path to config file")
+    parser.add_argument(
+        "--model_path", type=str, default=None, help="Path to model weights (optional, uses best.pt if not provided)"
+    )
+    parser.add_argument(
+        "--source", type=str, default=None, help="Video file, frame directory, camera index or rtsp:// / http:// URL"
+    )
+    parser.add_argument("--output", type=str, default=None, help="JSON lines file for detection events")
+    args = parser.parse_args()
+
+    run_video(config_path=args.config, model_path=args.model_path, source=args.source, output_path=args.output)
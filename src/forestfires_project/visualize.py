@@ -1,8 +1,14 @@
 import matplotlib.pyplot as plt
-import cv2
 import yaml
 import os
+import numpy as np
+from forestfires_project import tracing
+from forestfires_project.annotate import draw_detections, labels
+from forestfires_project.backends import Detections
+from forestfires_project.cache import model_version
 from forestfires_project.data import get_test_loader
+from forestfires_project.detection_store import open_store
+from forestfires_project.execution import apply_execution_settings
 from forestfires_project.model import ForestFireYOLO
 
 
@@ -13,24 +19,53 @@ def draw_boxes(img, boxes, color=(0, 255, 0), label_names=None, is_pred=False):
     Note: color is in RGB format for matplotlib compatibility
     """
     img_copy = img.copy()
-    for box in boxes:
-        if is_pred:
-            x1, y1, x2, y2, conf, cls = box
-            label = f"{label_names[int(cls)]} {conf:.2f}"
-        else:
-            x1, y1, x2, y2, cls = box
-            label = f"{label_names[int(cls)]}"
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 6 if is_pred else 5)
+    if is_pred:
+        texts = labels(label_names, boxes[:, 5], boxes[:, 4])
+    else:
+        texts = labels(label_names, boxes[:, 4])
+    return draw_detections(img_copy, boxes[:, :4], texts, color=color, font_scale=0.5)
 
-        # Draw rectangle and text in RGB color format
 
-        # For RGB images (matplotlib), we can draw directly with RGB colors
-        # Using a simple approach: overlay colored rectangles
-        cv2.rectangle(img_copy, (int(x1), int(y1)), (int(x2), int(y2)), color, 2)
-        cv2.putText(img_copy, label, (int(x1), int(y1) - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-    return img_copy
+def rank_from_store(store, model_version, dataset, top_k=24):
+    """Top-k test images by average confidence from stored detections of an earlier run.
+    Returns None unless every test image has been scored by this model version.
+    """
+    img_files = list(getattr(dataset, "img_files", None) or [])
+    stored = store.latest_images(model_version, source="visualize")
+    if not img_files or any(path not in stored for path in img_files):
+        return None
+
+    ranked = sorted(range(len(img_files)), key=lambda i: stored[img_files[i]][1], reverse=True)[:top_k]
+    results = []
+    for idx in ranked:
+        image, gt_boxes, img_path = dataset[idx]
+        image_id, avg_conf, max_conf, num_detections = stored[img_path]
+        pred_boxes = np.asarray(store.boxes(image_id), dtype=np.float32).reshape(-1, 6)
+        results.append(
+            {
+                "image": image,
+                "gt_boxes": gt_boxes,
+                "pred_boxes": pred_boxes,
+                "avg_conf": avg_conf,
+                "max_conf": max_conf,
+                "num_detections": num_detections,
+            }
+        )
+    return results
 
 
 def run_visualization(config_path="configs/config.yaml", model_path=None):
+    with tracing.start_trace("visualize") as trace:
+        _run_visualization(config_path, model_path)
+
+    # Where the time went: model vs drawing vs plotting
+    print("Stage timings:")
+    for name, ms in trace.durations().items():
+        print(f"  {name}: {ms:.1f}ms")
+
+
+def _run_visualization(config_path, model_path):
     # Resolve config path relative to project root
     if not os.path.isabs(config_path):
         config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), config_path)
@@ -47,9 +82,9 @@ def run_visualization(config_path="configs/config.yaml", model_path=None):
     if model_path is None:
         model_path = os.path.join(root, config["paths"]["models_dir"], config["project_name"], "weights", "best.pt")
 
-    # Load Model and Data
-    model_wrapper = ForestFireYOLO(config, config_path)
-    model_wrapper.load_weights(model_path)
+    apply_execution_settings(config.get("execution"), "visualize")
+
+    # Load Data (the model only if the test set has to be scored)
     loader = get_test_loader(config, config_path)
 
     # Convert class dict to list in correct order
@@ -57,18 +92,42 @@ def run_visualization(config_path="configs/config.yaml", model_path=None):
     class_names = [classes_dict[i] for i in sorted(classes_dict.keys())]
     print(f"Classes: {class_names}")
 
-    # Collect predictions for all images to find most confident ones
-    print("Running inference on test set to find most confident predictions...")
-    all_results = []
+    # Detections of an earlier run of this model re-rank the test set without inference
+    store = open_store(config, config_path)
+    # Scored with the torch model below, so stored under the torch version of these weights
+    version = model_version(model_path, "torch") if store is not None and os.path.exists(model_path) else None
+    all_results = None
+    if version is not None:
+        with tracing.span("store"):
+            all_results = rank_from_store(store, version, getattr(loader, "dataset", None))
+    if all_results is not None:
+        print(f"Ranked test images from the detection store ({store.path}), skipping inference")
 
     # Debug counters
     total_gt_boxes = 0
     total_images_with_gt = 0
 
-    for batch_idx, (images, gt_boxes_batch, img_paths) in enumerate(loader):
+    scored = all_results is None
+    if scored:
+        # Collect predictions for all images to find most confident ones
+        print("Running inference on test set to find most confident predictions...")
+        model_wrapper = ForestFireYOLO(config, config_path)
+        model_wrapper.load_weights(model_path)
+        all_results = []
+        batches = loader
+    else:
+        batches = []
+
+    for batch_idx, (images, gt_boxes_batch, img_paths) in enumerate(batches):
         # Convert tensor images to numpy for YOLO inference
         # Use conf threshold to filter predictions
         results = model_wrapper.predict(images, conf=0.3, draw_boxes=False)
+        if version is not None:
+            store.record(
+                [(path, Detections.from_ultralytics(r)) for path, r in zip(img_paths, results)],
+                "visualize",
+                version,
+            )
 
         for i, result in enumerate(results):
             # Extract predictions with confidence and class info
@@ -108,12 +167,16 @@ def run_visualization(config_path="configs/config.yaml", model_path=None):
                 }
             )
 
+    if store is not None:
+        store.close()
+
     # Sort by average confidence and get top 24 (4 grids of 6)
     all_results.sort(key=lambda x: x["avg_conf"], reverse=True)
     top_24 = all_results[:24]
 
     conf_scores = [f"{r['avg_conf']:.3f}" for r in top_24]
-    print(f"\nGround Truth Stats: {total_images_with_gt} images with GT, {total_gt_boxes} total GT boxes")
+    if scored:
+        print(f"\nGround Truth Stats: {total_images_with_gt} images with GT, {total_gt_boxes} total GT boxes")
     print(f"Selected top 24 images with confidence scores: {conf_scores}")
 
     # Create 4 separate grid files (6 images each)
@@ -131,15 +194,20 @@ def run_visualization(config_path="configs/config.yaml", model_path=None):
         axes = axes.flatten()
 
         for i, result_data in enumerate(grid_images):
-            # Prepare GT Image
-            img_gt = draw_boxes(
-                result_data["image"], result_data["gt_boxes"], color=(0, 255, 0), label_names=class_names, is_pred=False
-            )
-
-            # Draw predictions in Red (RGB format) on top of the GT image
-            img_final = draw_boxes(
-                img_gt, result_data["pred_boxes"], color=(255, 0, 0), label_names=class_names, is_pred=True
-            )
+            with tracing.span("draw"):
+                # Prepare GT Image
+                img_gt = draw_boxes(
+                    result_data["image"],
+                    result_data["gt_boxes"],
+                    color=(0, 255, 0),
+                    label_names=class_names,
+                    is_pred=False,
+                )
+
+                # Draw predictions in Red (RGB format) on top of the GT image
+                img_final = draw_boxes(
+                    img_gt, result_data["pred_boxes"], color=(255, 0, 0), label_names=class_names, is_pred=True
+                )
 
             axes[i].imshow(img_final)
             axes[i].set_title(
@@ -152,9 +220,10 @@ def run_visualization(config_path="configs/config.yaml", model_path=None):
             axes[j].axis("off")
 
         output_path = os.path.join(save_dir, f"predictions_grid_{grid_idx + 1}.png")
-        plt.tight_layout()
-        plt.savefig(output_path)
-        plt.close()
+        with tracing.span("save"):
+            plt.tight_layout()
+            plt.savefig(output_path)
+            plt.close()
 
         print(f"Visualization {grid_idx + 1}/4 saved to {output_path}")
 
@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+import yaml
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_state_dir = None
+
+
+def _write_test_config(state_dir):
+    """Copy of configs/config.yaml whose detection store and job queue live in state_dir"""
+    with open(os.path.join(PROJECT_ROOT, "configs", "config.yaml")) as f:
+        config = yaml.safe_load(f)
+    config["paths"]["root_dir"] = PROJECT_ROOT
+    config["detection_store"]["path"] = os.path.join(state_dir, "detections.db")
+    config["api"]["jobs"]["db_path"] = os.path.join(state_dir, "jobs", "jobs.db")
+    config["api"]["jobs"]["output_dir"] = os.path.join(state_dir, "jobs")
+    path = os.path.join(state_dir, "config.yaml")
+    with open(path, "w") as f:
+        yaml.safe_dump(config, f)
+    return path
+
+
+def pytest_configure(config):
+    # The API reads its config when it is imported (at collection), so point it at the copy first
+    global _state_dir
+    _state_dir = tempfile.mkdtemp(prefix="forestfires-tests-")
+    os.environ["API_CONFIG_PATH"] = _write_test_config(_state_dir)
+
+
+def pytest_unconfigure(config):
+    if _state_dir is not None:
+        shutil.rmtree(_state_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def config_path():
+    """Project config with the SQLite stores redirected away from reports/"""
+    return os.environ["API_CONFIG_PATH"]
@@ -0,0 +1,35 @@
+import cv2
+import numpy as np
+from forestfires_project.annotate import draw_detections, encode_image, labels, resize
+from forestfires_project.visualize import draw_boxes
+
+
+def test_labels_accept_dict_or_list_names():
+    assert labels({0: "fire", 1: "smoke"}, [1, 0], [0.91, 0.5]) == ["smoke 0.91", "fire 0.50"]
+    assert labels(["fire", "smoke"], np.array([1.0])) == ["smoke"]
+
+
+def test_draw_detections_matches_per_box_rectangles():
+    boxes = np.array([[10.2, 20.7, 60.4, 80.0], [30, 5, 90, 40]], dtype=np.float32)
+    expected = np.zeros((100, 100, 3), dtype=np.uint8)
+    for x1, y1, x2, y2 in np.rint(boxes).astype(int).tolist():
+        cv2.rectangle(expected, (x1, y1), (x2, y2), (0, 0, 255), 2)
+    img = draw_detections(np.zeros((100, 100, 3), dtype=np.uint8), boxes)
+    np.testing.assert_array_equal(img, expected)
+
+
+def test_visualize_draw_boxes_leaves_input_untouched():
+    img = np.zeros((64, 64, 3), dtype=np.uint8)
+    out = draw_boxes(img, [[4, 4, 30, 30, 0.8, 1]], color=(255, 0, 0), label_names=["fire", "smoke"], is_pred=True)
+    assert not img.any() and out.any()
+    assert draw_boxes(img, [], label_names=["fire"]).sum() == 0
+
+
+def test_resize_and_encode_formats():
+    img = np.random.default_rng(0).integers(0, 255, (400, 800, 3), dtype=np.uint8)
+    small = resize(img, 200)
+    assert small.shape == (100, 200, 3)
+    assert resize(img, None) is img
+    data, media_type = encode_image(small, "jpeg", quality=50)
+    assert media_type == "image/jpeg" and cv2.imdecode(np.frombuffer(data, np.uint8), 1).shape == small.shape
+    assert encode_image(small, "png")[1] == "image/png"
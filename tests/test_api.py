@@ -1,6 +1,16 @@
+import io
+import json
 import os
 import random
+import subprocess
+import sys
+import time
+import zipfile
+from unittest import mock
+import cv2
+import numpy as np
 from fastapi.testclient import TestClient
+from src.forestfires_project import api, encoding
 from src.forestfires_project.api import app
 
 client = TestClient(app)
@@ -32,3 +42,339 @@ def test_predict_endpoint():
         response = client.post("/predict", files=files)
     assert response.status_code == 200
     assert "detections" in response.json()
+
+
+def get_sample_image_path():
+    folder_path = "data/samples/images"
+    image_files = sorted(f for f in os.listdir(folder_path) if f.endswith((".jpg", ".jpeg", ".png")))
+    return os.path.join(folder_path, image_files[0])
+
+
+def test_predict_image_endpoint():
+    with open(get_sample_image_path(), "rb") as image:
+        response = client.post("/predict/image", files={"file": image})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+
+
+def test_predict_image_format_and_size():
+    with open(get_sample_image_path(), "rb") as image:
+        response = client.post("/predict/image?format=png&max_size=128", files={"file": image})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    img = cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_COLOR)
+    assert max(img.shape[:2]) == 128
+
+    with open(get_sample_image_path(), "rb") as image:
+        assert client.post("/predict/image?format=gif", files={"file": image}).status_code == 400
+
+
+def test_predict_image_keeps_original_resolution_of_large_jpeg():
+    img = cv2.resize(cv2.imread(get_sample_image_path()), (2800, 2100))
+    data = cv2.imencode(".jpg", img)[1].tobytes()
+
+    response = client.post("/predict/image", files={"file": ("large.jpg", data, "image/jpeg")})
+    assert response.status_code == 200
+    annotated = cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_COLOR)
+    assert annotated.shape[:2] == (2100, 2800)
+
+    response = client.post("/predict/image?max_size=1000", files={"file": ("large.jpg", data, "image/jpeg")})
+    annotated = cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_COLOR)
+    assert annotated.shape[:2] == (750, 1000)
+
+
+def test_predict_returns_503_when_queue_full():
+    # Make sure the request is not answered from the result cache
+    api.startup()
+    api.result_cache.clear()
+    with mock.patch.object(api.registry.default.batcher, "submit_many", side_effect=api.QueueFullError("full")):
+        with open(get_sample_image_path(), "rb") as image:
+            response = client.post("/predict", files={"file": image})
+    assert response.status_code == 503
+    assert "retry-after" in response.headers
+
+
+def test_predict_returns_503_without_retry_after_when_startup_failed():
+    api.startup()
+    failed = {**api.startup_state, "status": "failed", "error": "best.pt is corrupt"}
+    with mock.patch.dict(api.startup_state, failed):
+        with open(get_sample_image_path(), "rb") as image:
+            response = client.post("/predict", files={"file": image})
+    assert response.status_code == 503
+    assert "best.pt is corrupt" in response.json()["detail"]
+    assert "retry-after" not in response.headers
+
+
+def test_stats_endpoint():
+    response = client.get("/stats")
+    assert response.status_code == 200
+    stats = response.json()["batcher"]
+    assert "queue_depth" in stats
+    assert "batch_size_counts" in stats
+
+
+def test_predict_batch_endpoint():
+    folder_path = "data/samples/images"
+    image_files = sorted(f for f in os.listdir(folder_path) if f.endswith(".jpg"))[:3]
+    files = []
+    for name in image_files:
+        with open(os.path.join(folder_path, name), "rb") as image:
+            files.append(("files", (name, image.read(), "image/jpeg")))
+    files.append(("files", ("broken.jpg", b"not an image", "image/jpeg")))
+
+    response = client.post("/predict/batch", files=files)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["num_images"] == 4
+    assert [r["filename"] for r in body["results"]] == image_files + ["broken.jpg"]
+    assert all("detections" in r for r in body["results"][:3])
+    assert "error" in body["results"][3]
+
+
+def test_predict_batch_accepts_zip_archive():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.write(get_sample_image_path(), arcname="a.jpg")
+        zf.write(get_sample_image_path(), arcname="nested/b.jpg")
+        zf.writestr("notes.txt", "ignored")
+
+    response = client.post("/predict/batch", files={"files": ("frames.zip", buffer.getvalue(), "application/zip")})
+    assert response.status_code == 200
+    assert [r["filename"] for r in response.json()["results"]] == ["a.jpg", "nested/b.jpg"]
+
+
+def test_predict_stream_endpoint():
+    with open(get_sample_image_path(), "rb") as image:
+        data = image.read()
+    files = [("files", ("a.jpg", data, "image/jpeg")), ("files", ("b.jpg", data, "image/jpeg"))]
+
+    response = client.post("/predict/stream", files=files)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["filename"] for line in lines] == ["a.jpg", "b.jpg"]
+    assert all("detections" in line for line in lines)
+
+
+def test_predict_stream_releases_model_when_spooling_fails():
+    with open(get_sample_image_path(), "rb") as image:
+        data = image.read()
+    entry = api.registry.default
+    in_flight = entry._in_flight
+
+    with mock.patch.object(api, "_spool_uploads", side_effect=OSError("disk full")):
+        response = TestClient(app, raise_server_exceptions=False).post(
+            "/predict/stream", files=[("files", ("a.jpg", data, "image/jpeg"))]
+        )
+    assert response.status_code == 500
+    assert entry._in_flight == in_flight
+
+
+def test_predict_repeated_image_hits_cache():
+    api.result_cache.clear()
+    hits_before = api.result_cache.stats()["hits"]
+    with open(get_sample_image_path(), "rb") as image:
+        data = image.read()
+
+    first = client.post("/predict", files={"file": ("a.jpg", data, "image/jpeg")})
+    second = client.post("/predict", files={"file": ("b.jpg", data, "image/jpeg")})
+    assert first.status_code == 200 and second.status_code == 200
+    assert second.json()["filename"] == "b.jpg"
+    assert second.json()["detections"] == first.json()["detections"]
+    assert client.get("/stats").json()["cache"]["hits"] == hits_before + 1
+
+
+def test_predict_different_conf_reuses_cached_detections():
+    api.result_cache.clear()
+    hits_before = api.result_cache.stats()["hits"]
+    with open(get_sample_image_path(), "rb") as image:
+        data = image.read()
+
+    low = client.post("/predict?conf=0.1", files={"file": ("a.jpg", data, "image/jpeg")}).json()
+    high = client.post("/predict?conf=0.5&max_det=1", files={"file": ("a.jpg", data, "image/jpeg")}).json()
+    assert client.get("/stats").json()["cache"]["hits"] == hits_before + 1
+    expected = [d for d in low["detections"] if d["confidence"] > 0.5][:1]
+    assert high["detections"] == expected
+
+
+def test_prometheus_metrics_endpoint():
+    with open(get_sample_image_path(), "rb") as image:
+        client.post("/predict", files={"file": image})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'api_requests_total{endpoint="/predict",method="POST",status="200"}' in body
+    assert 'api_stage_duration_seconds_count{stage="decode"}' in body
+    assert "api_queue_depth" in body
+    assert "api_cache_hit_ratio" in body
+
+
+def test_system_metrics_endpoint():
+    response = client.get("/metrics/system")
+    assert response.status_code == 200
+    metrics = response.json()
+    assert "cpu_usage_percent" in metrics
+    assert metrics["memory"]["total"] > 0
+
+
+def test_predict_returns_server_timing_header():
+    api.result_cache.clear()
+    with open(get_sample_image_path(), "rb") as image:
+        response = client.post("/predict", files={"file": image})
+    assert response.status_code == 200
+    stages = [entry.split(";")[0].strip() for entry in response.headers["server-timing"].split(",")]
+    assert {"read", "decode", "batch", "inference", "serialize"} <= set(stages)
+
+
+def test_predict_downscaled_decode_reports_original_size():
+    img = cv2.imread(get_sample_image_path())
+    big = cv2.resize(img, (img.shape[1] * 4, img.shape[0] * 4))
+    data = cv2.imencode(".jpg", big)[1].tobytes()
+
+    response = client.post("/predict?conf=0.01", files={"file": ("big.jpg", data, "image/jpeg")})
+    assert response.status_code == 200
+    result = response.json()
+    assert result["image_size"] == {"width": big.shape[1], "height": big.shape[0]}
+    for detection in result["detections"]:
+        x1, y1, x2, y2 = detection["box_xyxy"]
+        assert 0 <= x1 <= x2 <= big.shape[1] and 0 <= y1 <= y2 <= big.shape[0]
+
+
+def test_predict_tiled_returns_full_image_coordinates():
+    img = cv2.imread(get_sample_image_path())
+    wide = cv2.hconcat([img, img, img])
+    data = cv2.imencode(".jpg", wide)[1].tobytes()
+
+    response = client.post("/predict?conf=0.01&tiled=true", files={"file": ("wide.jpg", data, "image/jpeg")})
+    assert response.status_code == 200
+    result = response.json()
+    assert result["image_size"] == {"width": wide.shape[1], "height": wide.shape[0]}
+    for detection in result["detections"]:
+        x1, y1, x2, y2 = detection["box_xyxy"]
+        assert 0 <= x1 <= x2 <= wide.shape[1] and 0 <= y1 <= y2 <= wide.shape[0]
+
+
+def test_predict_tiled_with_more_tiles_than_queue_slots():
+    img = cv2.imread(get_sample_image_path())
+    wide = cv2.hconcat([img, img, img, img])
+    data = cv2.imencode(".jpg", wide)[1].tobytes()
+    client.get("/")  # load the model before shrinking its queue
+    batcher = api.registry.default.batcher
+    tiles, _ = api.make_tiles(wide, *api.TILING)
+    queue_size = 2
+
+    assert len(tiles) > queue_size
+    with mock.patch.object(batcher, "max_queue_size", queue_size), mock.patch.object(batcher, "max_batch_size", 2):
+        response = client.post("/predict?tiled=true", files={"file": ("wide.jpg", data, "image/jpeg")})
+    assert response.status_code == 200
+    assert response.json()["image_size"] == {"width": wide.shape[1], "height": wide.shape[0]}
+
+
+def test_models_endpoint_and_model_query_param():
+    models = client.get("/models").json()
+    default = models["default"]
+    assert [m["name"] for m in models["models"] if m["status"] == "ready"] == [default]
+
+    version = api.registry.default.version
+    with open(get_sample_image_path(), "rb") as image:
+        response = client.post(f"/predict?model={version}", files={"file": image})
+    assert response.status_code == 200
+
+    with open(get_sample_image_path(), "rb") as image:
+        response = client.post("/predict?model=missing", files={"file": image})
+    assert response.status_code == 404
+
+    # Weights outside the models directory are refused; the default cannot be unloaded
+    assert client.post("/models/load?weights_path=/etc/passwd").status_code == 400
+    assert client.delete(f"/models/{default}").status_code == 409
+
+
+def test_import_is_lazy_and_lifespan_warms_up_model():
+    # Importing the API must not load the model (or torch)
+    code = (
+        "import sys; from src.forestfires_project import api; "
+        "print(api.startup_state['status'], 'torch' in sys.modules)"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out.split()[-2:] == ["not_started", "False"]
+
+    with TestClient(app) as lifespan_client:
+        assert lifespan_client.get("/health").json() == {"status": "ok"}
+        response = lifespan_client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["warmup_ms"] >= 0
+
+
+def test_predict_compact_response_formats():
+    with open(get_sample_image_path(), "rb") as image:
+        data = image.read()
+    regular = client.post("/predict?conf=0.01", files={"file": ("img.jpg", data, "image/jpeg")}).json()
+    expected_boxes = [d["box_xyxy"] for d in regular["detections"]]
+
+    response = client.post(
+        "/predict?conf=0.01",
+        files={"file": ("img.jpg", data, "image/jpeg")},
+        headers={"Accept": encoding.COLUMNAR_JSON},
+    )
+    assert response.headers["content-type"].startswith(encoding.COLUMNAR_JSON)
+    columnar = response.json()
+    assert columnar["num_detections"] == regular["num_detections"]
+    assert columnar["image_size"] == regular["image_size"]
+    np.testing.assert_allclose(
+        np.array(columnar["boxes"]).reshape(-1, 4), np.array(expected_boxes).reshape(-1, 4), rtol=1e-5
+    )
+
+    response = client.post(
+        "/predict?conf=0.01", files={"file": ("img.jpg", data, "image/jpeg")}, headers={"Accept": encoding.BINARY}
+    )
+    decoded = encoding.decode_binary(response.content)
+    assert decoded["image_size"] == regular["image_size"]
+    assert decoded["class_ids"].tolist() == [d["class_id"] for d in regular["detections"]]
+    assert json.loads(response.headers["x-class-names"])
+
+    response = client.post("/predict", files={"file": ("img.jpg", data, "image/jpeg")}, headers={"Accept": "text/csv"})
+    assert response.status_code == 406
+
+
+def test_job_api_runs_job_to_completion():
+    response = client.post("/jobs", params={"source": get_sample_image_path()})
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+
+    deadline = time.time() + 120
+    while client.get(f"/jobs/{job_id}").json()["status"] in ("queued", "running") and time.time() < deadline:
+        time.sleep(0.2)
+    job = client.get(f"/jobs/{job_id}").json()
+    assert job["status"] == "completed" and job["done"] == job["total"] > 0
+
+    lines = client.get(f"/jobs/{job_id}/results").text.splitlines()
+    assert len(lines) == job["total"] and "detections" in json.loads(lines[0])
+    assert client.delete(f"/jobs/{job_id}").status_code == 409
+    assert client.post("/jobs", params={"source": "/etc"}).status_code == 400
+
+
+def test_predictions_are_queryable_from_detection_store():
+    with open(get_sample_image_path(), "rb") as image:
+        name = f"store-{random.random()}.jpg"
+        prediction = client.post("/predict", files={"file": (name, image)}, params={"conf": 0.01}).json()
+    api.detection_store.flush()
+
+    response = client.get("/detections", params={"image": name, "since": "1h"})
+    assert response.status_code == 200
+    rows = response.json()["detections"]
+    assert len(rows) == prediction["num_detections"]
+    assert all(row["image"] == name and row["source"] == "api" for row in rows)
+    assert client.get("/detections", params={"since": "last week"}).status_code == 400
+
+
+def test_model_version_follows_the_served_export(tmp_path):
+    int8 = tmp_path / "best_int8.onnx"
+    int8.write_bytes(b"int8 model")
+    config = {**api.api_config, "exported_model_path": str(int8)}
+    with mock.patch.object(api, "BACKEND", "onnx"), mock.patch.object(api, "api_config", config):
+        version = api._model_version(api.MODEL_PATH)
+        assert version.startswith("onnx-int8-")
+        int8.write_bytes(b"another int8 model")
+        assert api._model_version(api.MODEL_PATH) != version
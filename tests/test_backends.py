@@ -0,0 +1,154 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+from forestfires_project.backends import (
+    Detections,
+    box_iou,
+    check_parity,
+    decode_downscaled,
+    decode_image,
+    export_is_current,
+    letterbox,
+    nms,
+)
+
+
+def test_nms_suppresses_overlapping_boxes():
+    """Overlapping boxes above the IoU threshold are suppressed, highest score kept first."""
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 10, 10], [20, 20, 30, 30]], dtype=np.float32)
+    scores = np.array([0.6, 0.9, 0.5], dtype=np.float32)
+    keep = nms(boxes, scores, iou_threshold=0.5)
+    assert keep.tolist() == [1, 2]
+
+
+def test_letterbox_pads_to_square_and_rect():
+    """Square letterbox pads to size x size; with a stride only up to the next multiple."""
+    img = np.zeros((500, 900, 3), dtype=np.uint8)
+    square, gain, (left, top) = letterbox(img, 320)
+    assert square.shape == (320, 320, 3)
+    assert gain == pytest.approx(320 / 900)
+    assert left == 0 and top > 0
+
+    rect, _, _ = letterbox(img, 320, stride=32)
+    assert rect.shape == (192, 320, 3)
+
+
+def test_check_parity_matches_identical_backends():
+    """Two backends returning the same detections pass the parity check."""
+
+    class FakeBackend:
+        name = "fake"
+
+        def __init__(self, shift=0.0):
+            self.shift = shift
+
+        def predict(self, images, conf=0.25, iou=0.7):
+            boxes = np.array([[10, 10, 50, 50], [60, 60, 90, 90]], dtype=np.float32) + self.shift
+            return [Detections(boxes, [0.9, 0.8], [0, 1], {0: "fire", 1: "smoke"}, (100, 100)) for _ in images]
+
+    images = [np.zeros((100, 100, 3), dtype=np.uint8)] * 2
+    assert check_parity(FakeBackend(), FakeBackend(0.5), images)["passed"]
+    report = check_parity(FakeBackend(), FakeBackend(20.0), images)
+    assert not report["passed"]
+    assert report["unmatched_reference"] == 4
+
+
+def test_check_parity_falls_back_to_next_best_unused_candidate():
+    """Overlapping duplicates match one-to-one even when both prefer the same candidate box."""
+
+    class FakeBackend:
+        name = "fake"
+
+        def __init__(self, boxes, scores):
+            self.boxes, self.scores = np.array(boxes, dtype=np.float32), scores
+
+        def predict(self, images, conf=0.25, iou=0.7):
+            return [Detections(self.boxes, self.scores, [0, 0], {0: "fire"}, (100, 100)) for _ in images]
+
+    reference = FakeBackend([[10, 10, 50, 50], [10, 10, 50, 51]], [0.9, 0.88])
+    candidate = FakeBackend([[10, 10, 50, 50.5], [10, 10, 50, 49.5]], [0.9, 0.88])
+    report = check_parity(reference, candidate, [np.zeros((100, 100, 3), dtype=np.uint8)])
+    assert report["passed"]
+    assert report["matched"] == 2
+
+
+def test_box_iou_identity():
+    boxes = np.array([[0, 0, 10, 10], [5, 5, 15, 15]], dtype=np.float32)
+    ious = box_iou(boxes, boxes)
+    assert np.allclose(np.diag(ious), 1.0)
+    assert ious[0, 1] == pytest.approx(25 / 175)
+
+
+def test_detections_filter_by_conf_and_max_det():
+    boxes = np.array([[0, 0, 10, 10], [20, 20, 30, 30], [40, 40, 50, 50], [60, 60, 70, 70]], dtype=np.float32)
+    det = Detections(boxes, np.array([0.9, 0.1, 0.6, 0.3]), np.array([0, 1, 0, 1]), {0: "fire", 1: "smoke"}, (100, 100))
+
+    filtered = det.filter(conf=0.25)
+    np.testing.assert_allclose(filtered.scores, [0.9, 0.6, 0.3])
+    np.testing.assert_array_equal(filtered.class_ids, [0, 0, 1])
+
+    top = det.filter(conf=0.25, max_det=2)
+    np.testing.assert_allclose(top.scores, [0.9, 0.6])
+    assert top.orig_shape == (100, 100)
+
+
+def test_decode_image_returns_bgr_and_reduces():
+    img = np.zeros((64, 96, 3), dtype=np.uint8)
+    img[..., 2] = 255  # red in BGR
+    _, encoded = cv2.imencode(".png", img)
+
+    decoded = decode_image(encoded.tobytes())
+    assert decoded.shape == (64, 96, 3)
+    assert decoded[0, 0].tolist() == [0, 0, 255]
+
+    _, encoded = cv2.imencode(".jpg", img)
+    assert decode_image(encoded.tobytes(), reduce=2).shape == (32, 48, 3)
+
+
+def test_decode_image_pil_fallback_and_invalid():
+    buffer = io.BytesIO()
+    Image.new("RGB", (20, 10), (255, 0, 0)).save(buffer, format="GIF")
+    decoded = decode_image(buffer.getvalue())
+    assert decoded.shape == (10, 20, 3)
+    assert decoded[0, 0, 2] > 200
+
+    with pytest.raises(ValueError):
+        decode_image(b"not an image")
+
+
+def test_decode_downscaled_keeps_original_shape():
+    _, encoded = cv2.imencode(".jpg", np.zeros((1500, 2400, 3), dtype=np.uint8))
+
+    img, orig_shape = decode_downscaled(encoded.tobytes(), min_size=640)
+    assert orig_shape == (1500, 2400)
+    assert img.shape[:2] == (750, 1200)  # 1/4 would put the longer side below 640
+
+    img, orig_shape = decode_downscaled(encoded.tobytes(), min_size=0)
+    assert img.shape[:2] == orig_shape == (1500, 2400)
+
+
+def test_detections_rescale_maps_boxes():
+    det = Detections(np.array([[10, 20, 30, 40]], dtype=np.float32), [0.9], [0], {0: "fire"}, (100, 200))
+    scaled = det.rescale((400, 400))
+    np.testing.assert_allclose(scaled.boxes, [[20, 80, 60, 160]])
+    assert scaled.orig_shape == (400, 400)
+
+
+def test_export_is_current_tracks_weights_digest(tmp_path):
+    """An export only counts as current while the weights it was made from are unchanged."""
+    from forestfires_project.cache import file_digest
+
+    weights = tmp_path / "best.pt"
+    weights.write_bytes(b"v1")
+    exported = tmp_path / "best.onnx"
+    exported.write_bytes(b"onnx")
+    assert not export_is_current(str(exported), str(weights))  # no recorded digest
+
+    (tmp_path / "best.onnx.source").write_text(file_digest(str(weights)))
+    assert export_is_current(str(exported), str(weights))
+
+    weights.write_bytes(b"v2")
+    assert not export_is_current(str(exported), str(weights))
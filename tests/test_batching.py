@@ -0,0 +1,91 @@
+import threading
+import time
+import pytest
+from forestfires_project.batching import MicroBatcher, QueueFullError
+
+
+def test_batcher_coalesces_requests():
+    """Requests submitted within the window should share one forward pass."""
+    calls = []
+
+    def predict_fn(images, conf):
+        calls.append(list(images))
+        return [f"{img}@{conf}" for img in images]
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit(i, conf=0.5) for i in range(4)]
+    results = [f.result(timeout=5) for f in futures]
+    batcher.stop()
+
+    assert results == ["0@0.5", "1@0.5", "2@0.5", "3@0.5"]
+    assert calls == [[0, 1, 2, 3]]
+    stats = batcher.stats()
+    assert stats["batches_total"] == 1
+    assert stats["batch_size_counts"] == {4: 1}
+
+
+def test_batcher_groups_by_params():
+    """Requests with different inference parameters must not be mixed in one batch."""
+    gate = threading.Event()
+    seen = []
+
+    def predict_fn(images, conf):
+        gate.wait(5)
+        seen.append((conf, len(images)))
+        return images
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=8, max_wait_ms=100)
+    futures = [batcher.submit("a", conf=0.25), batcher.submit("b", conf=0.5), batcher.submit("c", conf=0.25)]
+    gate.set()
+    assert [f.result(timeout=5) for f in futures] == ["a", "b", "c"]
+    batcher.stop()
+
+    assert sorted(seen) == [(0.25, 2), (0.5, 1)]
+
+
+def test_batcher_propagates_errors():
+    """An exception in the forward pass is raised to every waiting caller."""
+
+    def predict_fn(images):
+        raise ValueError("boom")
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=2, max_wait_ms=0)
+    future = batcher.submit("img")
+    with pytest.raises(ValueError):
+        future.result(timeout=5)
+    batcher.stop()
+
+
+def test_batcher_rejects_when_queue_full():
+    """submit() fails fast with QueueFullError once max_queue_size requests are pending."""
+    gate = threading.Event()
+
+    def predict_fn(images):
+        gate.wait(5)
+        return images
+
+    batcher = MicroBatcher(predict_fn, max_batch_size=1, max_wait_ms=0, max_queue_size=2)
+    first = batcher.submit("busy")
+    # Wait until the worker picked up the first request and is blocked in predict_fn
+    while batcher.stats()["queue_depth"]:
+        time.sleep(0.001)
+    pending = [batcher.submit("a"), batcher.submit("b")]
+    with pytest.raises(QueueFullError):
+        batcher.submit("c")
+
+    gate.set()
+    assert [f.result(timeout=5) for f in [first, *pending]] == ["busy", "a", "b"]
+    assert batcher.stats()["rejected_total"] == 1
+    batcher.stop()
+
+
+def test_batcher_submit_many_is_all_or_nothing():
+    """submit_many must not enqueue a partial batch when the queue cannot take all images."""
+    batcher = MicroBatcher(lambda images: images, max_batch_size=4, max_wait_ms=0, max_queue_size=2)
+    with pytest.raises(QueueFullError):
+        batcher.submit_many(["a", "b", "c"])
+    assert batcher.stats()["requests_total"] == 0
+
+    futures = batcher.submit_many(["a", "b"])
+    assert [f.result(timeout=5) for f in futures] == ["a", "b"]
+    batcher.stop()
@@ -0,0 +1,77 @@
+import time
+import numpy as np
+from forestfires_project.backends import Detections
+from forestfires_project.cache import ResultCache, content_hash, file_digest, model_version
+
+
+def make_detections(n):
+    return Detections(np.zeros((n, 4)), np.zeros(n), np.zeros(n), {0: "fire"}, (640, 640))
+
+
+def test_cache_hit_and_miss_counters():
+    """A stored entry is returned on the next lookup and counted as a hit."""
+    cache = ResultCache(max_bytes=1024 * 1024, ttl_s=60)
+    key = (content_hash(b"image"), 0.25, 0.7, 300, "v1")
+    assert cache.get(key) is None
+    cache.put(key, make_detections(3))
+    assert len(cache.get(key)) == 3
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_cache_evicts_least_recently_used():
+    """Entries beyond the memory bound are evicted oldest-first."""
+    entry_size = ResultCache().size_fn(make_detections(10))
+    cache = ResultCache(max_bytes=2 * entry_size, ttl_s=0)
+    cache.put("a", make_detections(10))
+    cache.put("b", make_detections(10))
+    cache.get("a")  # "b" is now least recently used
+    cache.put("c", make_detections(10))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_entries_expire():
+    """Entries older than the TTL are treated as misses."""
+    cache = ResultCache(ttl_s=0.01)
+    cache.put("a", make_detections(1))
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_cache_clear():
+    cache = ResultCache()
+    cache.put("a", make_detections(1))
+    cache.clear()
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_model_version_combines_backend_and_weights_digest(tmp_path):
+    """The same weights get one version per backend, shared by every caller."""
+    weights = tmp_path / "best.pt"
+    weights.write_bytes(b"weights")
+    assert model_version(str(weights)) == f"torch-{file_digest(str(weights))}"
+    assert model_version(str(weights), "onnx") == f"onnx-{file_digest(str(weights))}"
+
+
+def test_file_digest_of_model_directory_and_quantized_version(tmp_path):
+    """OpenVINO model directories are digested as a whole; the quantization mode is part of the version."""
+    model_dir = tmp_path / "best_openvino_model"
+    model_dir.mkdir()
+    (model_dir / "best.xml").write_text("graph")
+    (model_dir / "best.bin").write_bytes(b"weights")
+    digest = file_digest(str(model_dir))
+    (model_dir / "best.bin").write_bytes(b"other weights")
+    assert file_digest(str(model_dir)) != digest
+
+    int8 = tmp_path / "best_int8.onnx"
+    int8.write_bytes(b"int8")
+    assert model_version(str(int8), "onnx", "int8") == f"onnx-int8-{file_digest(str(int8))}"
@@ -77,3 +77,19 @@ def test_label_validity():
             label = label.item()
         logging.info(f"Checking class index: {label}")
         assert label in valid_labels, f"Label {label} not in {valid_labels}"
+
+
+def test_test_loader_collate_is_picklable():
+    """
+    Test that the test loader's collate function can be pickled (DataLoader workers under spawn).
+    """
+    import pickle
+
+    from forestfires_project.data import _collate_test_batch
+
+    collate = pickle.loads(pickle.dumps(_collate_test_batch))
+    assert collate([("img_a", "boxes_a", "a.jpg"), ("img_b", "boxes_b", "b.jpg")]) == (
+        ("img_a", "img_b"),
+        ("boxes_a", "boxes_b"),
+        ("a.jpg", "b.jpg"),
+    )
@@ -0,0 +1,53 @@
+import time
+import numpy as np
+import pytest
+from forestfires_project.backends import Detections
+from forestfires_project.detection_store import DetectionStore, parse_time
+from forestfires_project.visualize import rank_from_store
+
+NAMES = {0: "fire", 1: "smoke"}
+
+
+def _det(scores, class_ids):
+    boxes = np.array([[1, 2, 30, 40]] * len(scores), dtype=np.float32).reshape(-1, 4)
+    return Detections(boxes, scores, class_ids, NAMES, (64, 64))
+
+
+def test_query_filters(tmp_path):
+    store = DetectionStore(str(tmp_path / "detections.db"))
+    week_ago = time.time() - 8 * 86400
+    store.add([("old.jpg", _det([0.9], [1]))], "api", "torch-a", created_at=week_ago)
+    store.add([("a.jpg", _det([0.7, 0.5], [1, 1])), ("b.jpg", _det([0.95], [0]))], "api", "torch-a")
+    store.record([("c.jpg", _det([0.8], [1]))], "jobs", "torch-b")
+    store.flush()
+
+    rows = store.query(class_name="smoke", min_conf=0.6, model_version="torch-a", since="7d")
+    assert [(r["image"], r["confidence"]) for r in rows] == [("a.jpg", pytest.approx(0.7))]
+    assert {r["image"] for r in store.query(class_name="smoke")} == {"old.jpg", "a.jpg", "c.jpg"}
+    assert store.query(source="jobs")[0]["model_version"] == "torch-b"
+
+
+def test_parse_time():
+    assert parse_time("2d", now=1000000.0) == 1000000.0 - 2 * 86400
+    assert parse_time("1700000000") == 1700000000.0
+    with pytest.raises(ValueError):
+        parse_time("last week")
+
+
+class _Dataset:
+    img_files = ["a.jpg", "b.jpg", "c.jpg"]
+
+    def __getitem__(self, idx):
+        return np.zeros((8, 8, 3), dtype=np.uint8), [], self.img_files[idx]
+
+
+def test_visualize_ranks_from_store(tmp_path):
+    store = DetectionStore(str(tmp_path / "detections.db"))
+    items = [("a.jpg", _det([0.4], [0])), ("b.jpg", _det([0.9, 0.8], [1, 0]))]
+    store.add(items, "visualize", "torch-a")
+    assert rank_from_store(store, "torch-a", _Dataset()) is None  # c.jpg never scored
+
+    store.add([("c.jpg", _det([], []))], "visualize", "torch-a")
+    ranked = rank_from_store(store, "torch-a", _Dataset(), top_k=2)
+    assert [r["avg_conf"] for r in ranked] == pytest.approx([0.85, 0.4])
+    assert ranked[0]["pred_boxes"].shape == (2, 6)
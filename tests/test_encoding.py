@@ -0,0 +1,22 @@
+import numpy as np
+from forestfires_project.backends import Detections
+from forestfires_project.encoding import BINARY, COLUMNAR_JSON, JSON, MSGPACK, decode_binary, encode_binary, negotiate
+
+
+def test_negotiate_accept_header():
+    supported = [JSON, COLUMNAR_JSON, MSGPACK, BINARY]
+    assert negotiate(None, supported) == JSON
+    assert negotiate("*/*", supported) == JSON
+    assert negotiate("application/x-msgpack", supported) == MSGPACK
+    assert negotiate(f"{JSON};q=0.5, {BINARY}", supported) == BINARY
+    assert negotiate("text/csv", supported) is None
+    assert negotiate(MSGPACK, [JSON]) is None
+
+
+def test_binary_roundtrip():
+    det = Detections(np.array([[1, 2, 3, 4], [5, 6, 7, 8]]), [0.9, 0.5], [1, 0], {0: "fire", 1: "smoke"}, (480, 640))
+    decoded = decode_binary(encode_binary(det))
+    assert decoded["image_size"] == {"width": 640, "height": 480}
+    np.testing.assert_array_equal(decoded["boxes"], det.boxes)
+    np.testing.assert_allclose(decoded["scores"], [0.9, 0.5])
+    assert decoded["class_ids"].tolist() == [1, 0]
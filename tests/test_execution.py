@@ -0,0 +1,34 @@
+import numpy as np
+from forestfires_project.autotune import benchmark_candidate, candidate_grid
+from forestfires_project.execution import execution_settings
+from forestfires_project.serve import worker_cores
+
+
+def test_execution_settings_stage_overrides():
+    config = {"intra_op_threads": 4, "inter_op_threads": 1, "train": {"intra_op_threads": 8}, "api": {}}
+    assert execution_settings(config, "train") == {"intra_op_threads": 8, "inter_op_threads": 1, "cpu_affinity": None}
+    assert execution_settings(config, "api")["intra_op_threads"] == 4
+    assert execution_settings(None, "evaluate") == {
+        "intra_op_threads": None,
+        "inter_op_threads": None,
+        "cpu_affinity": None,
+    }
+
+
+def test_worker_cores_are_disjoint():
+    cpus = list(range(8))
+    assert [worker_cores(i, 2, cpus) for i in range(4)] == [[0, 1], [2, 3], [4, 5], [6, 7]]
+
+
+def test_autotune_grid_and_benchmark():
+    grid = candidate_grid(4, batch_sizes=[1, 4])
+    assert all(w * t <= 4 for w, t, _ in grid)
+    assert (2, 2, 4) in grid and (1, 4, 1) in grid
+
+    class FakeBackend:
+        def predict(self, images):
+            return [None] * len(images)
+
+    stats = benchmark_candidate([FakeBackend(), FakeBackend()], [np.zeros((8, 8, 3))], batch_size=4, batches=3)
+    assert stats["images_per_sec"] > 0
+    assert stats["p50_ms"] <= stats["p95_ms"]
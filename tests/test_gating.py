@@ -0,0 +1,55 @@
+import numpy as np
+from forestfires_project.gating import ChangeGate, gated_predict, make_gate
+
+
+def frame(value=100, patch=None):
+    img = np.full((120, 160, 3), value, dtype=np.uint8)
+    if patch is not None:
+        img[:40, :40] = patch
+    return img
+
+
+def test_gate_skips_static_frames_and_reruns_on_change():
+    gate = ChangeGate(threshold=0.01, max_interval_s=0)
+    assert gate.check("cam", frame(), now=0.0)
+    gate.remember("cam", "first")
+
+    # Sensor noise below pixel_delta does not count as a change
+    noisy = frame() + np.random.default_rng(0).integers(0, 5, size=(120, 160, 3), dtype=np.uint8)
+    assert not gate.check("cam", noisy, now=1.0)
+    assert gate.cached("cam") == "first"
+
+    # A new bright region does
+    assert gate.check("cam", frame(patch=255), now=2.0)
+    # Other sources have their own reference
+    assert gate.check("other", frame(), now=2.0)
+    assert gate.stats()["frames_skipped"] == 1
+
+
+def test_gate_keepalive_forces_inference():
+    gate = ChangeGate(max_interval_s=10)
+    assert gate.check("cam", frame(), now=0.0)
+    gate.remember("cam", "first")
+    assert not gate.check("cam", frame(), now=5.0)
+    assert gate.check("cam", frame(), now=10.0)
+
+
+def test_gated_predict_reuses_previous_detections():
+    calls = []
+
+    def predict_fn(images, conf):
+        calls.append(len(images))
+        return [f"det{len(calls)}"] * len(images)
+
+    gate = ChangeGate(max_interval_s=0)
+    outputs, num_run = gated_predict(gate, predict_fn, [("a", frame()), ("b", frame(50))], conf=0.25)
+    assert outputs == ["det1", "det1"] and num_run == 2
+
+    outputs, num_run = gated_predict(gate, predict_fn, [("a", frame()), ("b", frame(50, patch=255))], conf=0.25)
+    assert outputs == ["det1", "det2"] and num_run == 1
+    assert calls == [2, 1]
+
+
+def test_make_gate_disabled_by_default():
+    assert make_gate({}) is None
+    assert isinstance(make_gate({"gating": {"enabled": True}}), ChangeGate)
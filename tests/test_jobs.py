@@ -0,0 +1,70 @@
+import json
+import os
+import numpy as np
+from forestfires_project.backends import Detections
+from forestfires_project.jobs import JobRunner, JobStore
+
+
+def _write_images(folder, n):
+    os.makedirs(folder)
+    for i in range(n):
+        with open(os.path.join(folder, f"frame_{i:02d}.jpg"), "wb") as f:
+            f.write(b"not decoded in this test" if i != 3 else b"")
+
+
+def _decode(path):
+    if os.path.getsize(path) == 0:
+        raise ValueError("empty")
+    return np.zeros((48, 64, 3), dtype=np.uint8), (48, 64)
+
+
+def _predict(images, conf, iou, max_det, model=None):
+    det = Detections(np.array([[1, 2, 3, 4]]), [0.9], [0], {0: "fire"}, (48, 64))
+    return [det for _ in images], "v1"
+
+
+def _serialize(filename, r, conf, iou, max_det):
+    return {"filename": filename, "num_detections": len(r)}
+
+
+def test_job_runs_and_resumes_after_interruption(tmp_path):
+    _write_images(tmp_path / "frames", 10)
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job = store.create(str(tmp_path / "frames"), {"conf": 0.25}, output_dir=str(tmp_path / "out"))
+    runner = JobRunner(store, _predict, _decode, _serialize, batch_size=4)
+
+    # Simulate a restart after the first committed batch: 4 lines committed, a torn 5th line
+    os.makedirs(os.path.dirname(job["output_path"]))
+    with open(job["output_path"], "w") as f:
+        for i in range(4):
+            f.write(json.dumps({"filename": f"frame_{i:02d}.jpg"}) + "\n")
+        offset = f.tell()
+        f.write('{"filename": "frame_04')
+    store.update(job["id"], status="running", done=4, failed=1, offset=offset, worker_pid=2**22 + 1)
+    # A file added to the source after creation is not picked up and does not shift the resume point
+    with open(tmp_path / "frames" / "a_late.jpg", "wb") as f:
+        f.write(b"added later")
+
+    assert store.requeue_orphans() == [job["id"]]
+    runner.run_job(store.claim())
+
+    with open(job["output_path"]) as f:
+        filenames = [json.loads(line)["filename"] for line in f]
+    assert filenames == [f"frame_{i:02d}.jpg" for i in range(10)]
+    job = store.get(job["id"])
+    assert (job["status"], job["done"], job["failed"], job["model_version"]) == ("completed", 10, 1, "v1")
+    assert job["images_per_sec"] > 0
+
+
+def test_cancelled_job_stops(tmp_path):
+    _write_images(tmp_path / "frames", 6)
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job = store.create(str(tmp_path / "frames"), {}, output_dir=str(tmp_path / "out"))
+
+    def predict_and_cancel(images, *args):
+        store.cancel(job["id"])
+        return _predict(images, *args)
+
+    JobRunner(store, predict_and_cancel, _decode, _serialize, batch_size=2).run_job(store.claim())
+    job = store.get(job["id"])
+    assert (job["status"], job["done"]) == ("cancelled", 2)
@@ -1,4 +1,6 @@
 import logging
+
+import pytest
 from src.forestfires_project.model import ForestFireYOLO
 
 logging.basicConfig(level=logging.INFO)
@@ -51,3 +53,32 @@ def test_predict_output_type():
     results = model.predict(dummy_img, conf=0.1, save=False)
     logging.info(f"Predict returned type: {type(results)}")
     assert results is not None, "Predict returned None"
+
+
+def test_predict_stream_yields_per_image():
+    """Test that predict_stream lazily yields one result per input image."""
+    import types
+    import numpy as np
+
+    config = get_dummy_config()
+    model = ForestFireYOLO(config, config_path="configs/config.yaml")
+    dummy_imgs = [np.zeros((320, 320, 3), dtype=np.uint8) for _ in range(3)]
+    stream = model.predict_stream(dummy_imgs, conf=0.1)
+    assert isinstance(stream, types.GeneratorType)
+    results = list(stream)
+    logging.info(f"predict_stream yielded {len(results)} results")
+    assert len(results) == 3
+
+
+def test_tiled_predict_rejects_unreadable_images_and_save(tmp_path):
+    """Tiled inference raises clear errors instead of passing None to the tiler, and refuses save=True."""
+    import numpy as np
+
+    model = ForestFireYOLO(get_dummy_config(), config_path="configs/config.yaml")
+    with pytest.raises(FileNotFoundError):
+        model.predict(str(tmp_path / "missing.jpg"), tiled=True)
+    (tmp_path / "broken.jpg").write_bytes(b"not an image")
+    with pytest.raises(ValueError):
+        model.predict(str(tmp_path / "broken.jpg"), tiled=True)
+    with pytest.raises(ValueError):
+        model.predict(np.zeros((64, 64, 3), dtype=np.uint8), tiled=True, save=True)
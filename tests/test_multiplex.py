@@ -0,0 +1,42 @@
+import cv2
+import numpy as np
+from forestfires_project.backends import Detections
+from forestfires_project.multiplex import StreamMultiplexer
+from forestfires_project.video import DirectoryReader
+
+
+def make_frames(directory, num_frames):
+    directory.mkdir()
+    for i in range(num_frames):
+        cv2.imwrite(str(directory / f"{i:04d}.jpg"), np.full((32, 32, 3), 40 * i % 255, dtype=np.uint8))
+    return directory
+
+
+def test_multiplexer_shares_batches_and_routes_results(tmp_path):
+    batch_sizes = []
+
+    def predict_fn(images, conf, iou, max_det):
+        batch_sizes.append(len(images))
+        return [Detections(np.zeros((1, 4)), [0.9], [0], {0: "fire"}, im.shape[:2]) for im in images]
+
+    mux = StreamMultiplexer(predict_fn, batch_size=4, persistence_frames=2, names={0: "fire"})
+    mux.add_source("a", DirectoryReader(make_frames(tmp_path / "a", 5)))
+    mux.add_source("b", DirectoryReader(make_frames(tmp_path / "b", 3), queue_size=8), priority=2)
+    mux.start()
+    results = list(mux.run())
+    mux.stop()
+
+    per_source = {}
+    for name, frame, det, _ in results:
+        per_source.setdefault(name, []).append(frame.index)
+        assert len(det) == 1
+    assert per_source == {"a": [0, 1, 2, 3, 4], "b": [0, 1, 2]}
+    assert max(batch_sizes) <= 4
+
+    # One start event per source once fire persists for 2 frames
+    events = [(name, e["event"], e["frame_index"]) for name, _, _, evs in results for e in evs]
+    assert sorted(events) == [("a", "start", 1), ("b", "start", 1)]
+
+    stats = mux.stats()
+    assert stats["a"]["frames_processed"] == 5 and stats["b"]["frames_processed"] == 3
+    assert stats["a"]["avg_lag_ms"] >= 0.0
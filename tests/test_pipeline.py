@@ -5,7 +5,7 @@ from unittest import mock
 # Test visualize.py
 @mock.patch("forestfires_project.visualize.ForestFireYOLO")
 @mock.patch("forestfires_project.visualize.get_test_loader")
-def test_run_visualization_runs(mock_loader, mock_model):
+def test_run_visualization_runs(mock_loader, mock_model, config_path):
     """
     Test that run_visualization executes without error using mocks for model and loader.
     Ensures the visualization pipeline can be called with a config and model path.
@@ -18,7 +18,7 @@ def test_run_visualization_runs(mock_loader, mock_model):
     mock_model.return_value.predict.return_value = []
     # Should not raise
     try:
-        visualize.run_visualization(config_path="configs/config.yaml", model_path=None)
+        visualize.run_visualization(config_path=config_path, model_path=None)
     except Exception as e:
         pytest.fail(f"run_visualization raised {e}")
 
@@ -79,3 +79,77 @@ def test_run_training_runs(mock_model, mock_create_yaml, mock_wandb):
         assert isinstance(result, str)
     except Exception as e:
         pytest.fail(f"run_training raised {e}")
+
+
+# Test export.py
+@mock.patch("forestfires_project.export.load_backend")
+@mock.patch("forestfires_project.export.export_model")
+def test_run_export_runs(mock_export, mock_load_backend, tmp_path):
+    """
+    Test that run_export exports the weights and reports parity using mocked backends.
+    """
+    from forestfires_project import export
+
+    weights = tmp_path / "best.pt"
+    weights.write_bytes(b"weights")
+    mock_export.return_value = str(tmp_path / "best.onnx")
+    with mock.patch("forestfires_project.export.check_parity") as mock_parity:
+        mock_parity.return_value = {
+            "passed": True,
+            "matched": 3,
+            "unmatched_reference": 0,
+            "unmatched_candidate": 0,
+            "min_matched_iou": 0.99,
+            "max_score_diff": 0.01,
+        }
+        result = export.run_export(config_path="configs/config.yaml", model_path=str(weights))
+
+    assert result["exported"] == {"onnx": str(tmp_path / "best.onnx")}
+    assert result["parity"]["onnx"]["passed"]
+
+
+# Test quantize.py
+def test_calibration_reader_yields_letterboxed_batches():
+    """
+    Test that the calibration reader yields NCHW float batches and stops after the last image.
+    """
+    import glob
+    from forestfires_project.quantize import ValCalibrationReader
+
+    paths = sorted(glob.glob("data/samples/images/*.jpg"))[:2]
+    reader = ValCalibrationReader(paths, "images", imgsz=320)
+    batches = [reader.get_next() for _ in range(3)]
+    assert batches[0]["images"].shape == (1, 3, 320, 320)
+    assert batches[0]["images"].max() <= 1.0
+    assert batches[2] is None
+    reader.rewind()
+    assert reader.get_next() is not None
+
+
+@mock.patch("forestfires_project.quantize.evaluate_map")
+@mock.patch("forestfires_project.quantize.benchmark_latency")
+@mock.patch("forestfires_project.quantize.quantize_onnx")
+@mock.patch("forestfires_project.quantize.create_yolo_yaml")
+@mock.patch("forestfires_project.quantize.sample_dataset")
+@mock.patch("forestfires_project.quantize.export_model")
+def test_run_quantization_runs(mock_export, mock_sample, mock_yaml, mock_quantize, mock_latency, mock_map, tmp_path):
+    """
+    Test that run_quantization produces an FP32 vs INT8 report using mocks for export, calibration and eval.
+    """
+    from forestfires_project import quantize
+
+    weights = tmp_path / "best.pt"
+    weights.write_bytes(b"weights")
+    for name in ("best.onnx", "best_int8.onnx"):
+        (tmp_path / name).write_bytes(b"onnx")
+    mock_export.return_value = str(tmp_path / "best.onnx")
+    mock_sample.return_value = ["img_0", "img_1"]
+    mock_yaml.return_value = "dummy.yaml"
+    mock_latency.side_effect = [20.0, 10.0]
+    mock_map.side_effect = [{"mAP50": 0.5, "mAP50-95": 0.3}, {"mAP50": 0.48, "mAP50-95": 0.29}]
+
+    report = quantize.run_quantization(config_path="configs/config.yaml", model_path=str(weights), use_wandb=False)
+
+    assert report["int8"]["path"] == str(tmp_path / "best_int8.onnx")
+    assert report["int8"]["images_per_sec"] == 100.0
+    assert report["fp32"]["mAP50"] == 0.5
@@ -0,0 +1,58 @@
+import csv
+import json
+import os
+from unittest import mock
+from forestfires_project.jobs import list_images
+from forestfires_project.predict import ResultWriter, read_checkpoint, run_prediction
+
+
+def _result(name):
+    box = [1.0, 2.0, 3.0, 4.0]
+    return {
+        "filename": name,
+        "image_size": {"width": 8, "height": 8},
+        "detections": [{"class_id": 0, "class_name": "fire", "confidence": 0.9, "box_xyxy": box}],
+    }
+
+
+def test_csv_writer_resumes_at_checkpointed_position(tmp_path):
+    path = str(tmp_path / "predictions.csv")
+    writer = ResultWriter(path, "csv")
+    writer.write(_result("a.jpg"))
+    position = writer.flush()
+    writer.write(_result("b.jpg"))  # never checkpointed
+    writer.close()
+
+    writer = ResultWriter(path, "csv", position)
+    writer.write(_result("c.jpg"))
+    writer.close()
+    with open(path, newline="") as f:
+        assert [row["filename"] for row in csv.DictReader(f)] == ["a.jpg", "c.jpg"]
+
+
+def test_read_checkpoint_ignores_torn_line(tmp_path):
+    path = tmp_path / "predictions.jsonl.checkpoint.jsonl"
+    path.write_text(json.dumps({"files": ["a.jpg", "b.jpg"], "position": 42}) + '\n{"files": ["c.j')
+    assert read_checkpoint(str(path)) == ({"a.jpg", "b.jpg"}, 42)
+
+
+def test_run_prediction_skips_processed_files(tmp_path, config_path):
+    sources = tmp_path / "list.txt"
+    sources.write_text("\n".join(list_images("data/samples/images")[:3]))
+    output = str(tmp_path / "predictions.jsonl")
+
+    run_prediction(config_path=config_path, source=str(sources), output_path=output)
+    with open(output) as f:
+        assert len(f.readlines()) == 3
+
+    # A rerun finds everything checkpointed and leaves the output alone
+    mtime = os.path.getmtime(output)
+    run_prediction(config_path=config_path, source=str(sources), output_path=output)
+    assert os.path.getmtime(output) == mtime
+
+
+def test_run_prediction_rejects_parquet_without_engine(tmp_path):
+    output = str(tmp_path / "predictions.parquet")
+    with mock.patch("forestfires_project.predict.parquet_available", return_value=False):
+        assert run_prediction(source="data/samples/images", output_path=output, output_format="parquet") is None
+    assert not os.path.exists(output)
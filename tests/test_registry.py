@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+from forestfires_project.backends import Detections
+from forestfires_project.registry import ModelRegistry
+
+
+class FakeBackend:
+    names = {0: "fire"}
+
+    def __init__(self, weights_path, gate=None):
+        self.weights_path = weights_path
+        self.gate = gate
+
+    def predict(self, images, conf=0.25, iou=0.7, max_det=300):
+        if self.gate is not None:
+            self.gate.wait(5)
+        return [Detections(np.zeros((0, 4)), [], [], self.names, im.shape[:2]) for im in images]
+
+
+def make_registry(gate=None):
+    return ModelRegistry(
+        lambda path: FakeBackend(path, gate), lambda path: f"v-{path}", batcher_config={"max_wait_ms": 0}
+    )
+
+
+def test_registry_loads_and_swaps_default():
+    registry = make_registry()
+    swaps = []
+    registry.add_listener(lambda old, new: swaps.append((old and old.name, new.name)))
+
+    registry.load("a.pt", name="a", make_default=True, background=False)
+    entry = registry.load("b.pt", name="b")
+    for _ in range(100):
+        if entry.status == "ready":
+            break
+        threading.Event().wait(0.05)
+
+    assert registry.get().name == "a"
+    assert registry.get("v-b.pt").name == "b"  # lookup by version
+    registry.set_default("b")
+    assert registry.get().name == "b"
+    assert swaps == [(None, "a"), ("a", "b")]
+
+    future = registry.get("a").batcher.submit(np.zeros((8, 8, 3), dtype=np.uint8), conf=0.25, iou=0.7, max_det=300)
+    assert future.result(timeout=5).orig_shape == (8, 8)
+
+    with pytest.raises(KeyError):
+        registry.get("missing")
+    with pytest.raises(ValueError):
+        registry.unload("b")  # the default cannot be unloaded
+
+
+def test_registry_drains_in_flight_requests_before_freeing():
+    registry = make_registry()
+    registry.load("a.pt", name="a", make_default=True, background=False)
+    registry.load("b.pt", name="b", background=False)
+
+    with registry.acquire("b") as entry:
+        registry.unload("b")
+        assert entry.status == "draining"
+        with pytest.raises(KeyError):
+            registry.get("b")  # no new requests
+        assert entry.backend is not None
+
+    assert entry.status == "unloaded"
+    assert entry.backend is None
+    assert [m["name"] for m in registry.list()["models"]] == ["a"]
+
+
+def test_registry_unload_while_loading_discards_the_model():
+    loading, proceed = threading.Event(), threading.Event()
+
+    def load(path):
+        loading.set()
+        proceed.wait(5)
+        return FakeBackend(path)
+
+    registry = ModelRegistry(load, lambda path: f"v-{path}", batcher_config={"max_wait_ms": 0})
+    entry = registry.load("b.pt", name="b")
+    assert loading.wait(5)
+    registry.unload("b")
+    proceed.set()
+    for thread in threading.enumerate():
+        if thread.name == "model-load-b":
+            thread.join(5)
+
+    assert entry.status == "unloaded"
+    assert entry.backend is None
+    with pytest.raises(KeyError):
+        registry.get("b")
+    assert registry.list()["models"] == []
+
+
+def test_registry_watch_reloads_when_an_extra_path_changes(tmp_path):
+    weights, export = tmp_path / "best.pt", tmp_path / "best_int8.onnx"
+    weights.write_bytes(b"weights")
+    export.write_bytes(b"v1")
+    registry = ModelRegistry(
+        lambda path: FakeBackend(path), lambda path: f"v-{export.read_text()}", batcher_config={"max_wait_ms": 0}
+    )
+    registry.load(str(weights), make_default=True, background=False)
+
+    registry.watch(str(weights), interval_s=0.05, extra_paths=[str(export)])
+    try:
+        export.write_bytes(b"v2")
+        os.utime(export, (time.time() + 5, time.time() + 5))
+        for _ in range(100):
+            try:
+                if registry.get().version == "v-v2":
+                    break
+            except KeyError:
+                pass
+            time.sleep(0.05)
+    finally:
+        registry.stop_watching()
+    assert registry.get().version == "v-v2"
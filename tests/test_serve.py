@@ -0,0 +1,8 @@
+from forestfires_project.serve import plan_workers
+
+
+def test_plan_workers_partitions_cores():
+    assert plan_workers(cpu_count=8) == (8, 1)
+    assert plan_workers(workers=2, cpu_count=8) == (2, 4)
+    assert plan_workers(threads_per_worker=4, cpu_count=8) == (2, 4)
+    assert plan_workers(workers=3, cpu_count=2) == (3, 1)  # never below one thread
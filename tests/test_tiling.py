@@ -0,0 +1,37 @@
+import numpy as np
+from forestfires_project.backends import Detections
+from forestfires_project.tiling import make_tiles, predict_tiled, tile_windows
+
+
+def test_tile_windows_cover_image_with_overlap():
+    windows = tile_windows(1000, 1500, tile_size=640, overlap=0.25)
+    xs = sorted({w[0] for w in windows})
+    ys = sorted({w[1] for w in windows})
+    assert xs == [0, 430, 860]
+    assert ys == [0, 360]
+    assert all(x2 - x1 == 640 and y2 - y1 == 640 for x1, y1, x2, y2 in windows)
+
+    # Images smaller than a tile are a single window
+    assert tile_windows(300, 400, tile_size=640) == [(0, 0, 400, 300)]
+
+
+def test_make_tiles_adds_full_image():
+    img = np.zeros((700, 1300, 3), dtype=np.uint8)
+    tiles, offsets = make_tiles(img, tile_size=640, overlap=0.2, include_full=True)
+    assert tiles[-1] is img and offsets[-1] == (0, 0)
+    assert all(t.shape[:2] == (640, 640) for t in tiles[:-1])
+
+
+def test_predict_tiled_merges_in_full_image_coordinates():
+    img = np.zeros((640, 1200, 3), dtype=np.uint8)
+
+    def predict_fn(images, conf, iou, max_det):
+        # Every tile sees the same object at its local (10, 10) - (50, 50)
+        boxes = np.array([[10, 10, 50, 50]], dtype=np.float32)
+        return [Detections(boxes, [0.8], [1], {0: "fire", 1: "smoke"}, im.shape[:2]) for im in images]
+
+    det = predict_tiled(predict_fn, img, tile_size=640, overlap=0.1, include_full=True)
+    assert det.orig_shape == (640, 1200)
+    # Tiles at x=0 and x=560, plus the full image duplicating the x=0 box (merged by NMS)
+    np.testing.assert_allclose(det.boxes[np.argsort(det.boxes[:, 0])], [[10, 10, 50, 50], [570, 10, 610, 50]])
+    assert det.class_ids.tolist() == [1, 1]
@@ -0,0 +1,43 @@
+import contextvars
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from forestfires_project import tracing
+
+
+def test_spans_are_collected_per_trace():
+    with tracing.start_trace("request") as trace:
+        with tracing.span("decode"):
+            pass
+        tracing.record("inference", 12.5)
+        tracing.record("inference", 7.5)
+
+    assert tracing.current_trace() is None
+    durations = trace.durations()
+    assert list(durations) == ["decode", "inference"]
+    assert durations["inference"] == 20.0
+    assert "inference;dur=20.00" in trace.server_timing()
+
+
+def test_spans_from_copied_context_reach_trace():
+    with tracing.start_trace("request") as trace:
+        ctx = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(ctx.run, tracing.record, "encode", 1.0).result()
+    assert trace.durations() == {"encode": 1.0}
+
+
+def test_file_exporter_writes_json_lines(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracing.configure_tracing("file", path=str(path))
+    try:
+        with tracing.start_trace("request"):
+            with tracing.span("decode", image="a.jpg"):
+                pass
+    finally:
+        tracing.configure_tracing("none")
+
+    record = json.loads(path.read_text().splitlines()[0])
+    assert record["trace"] == "request"
+    assert record["name"] == "decode"
+    assert record["attributes"] == {"image": "a.jpg"}
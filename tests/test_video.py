@@ -0,0 +1,58 @@
+import time
+
+import cv2
+import numpy as np
+from forestfires_project.backends import Detections
+from forestfires_project.video import Frame, FrameReader, PersistenceFilter, iter_video_detections
+
+
+def write_video(path, num_frames=20, fps=50.0):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (64, 48))
+    for i in range(num_frames):
+        writer.write(np.full((48, 64, 3), i * 10 % 255, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def detections(class_ids):
+    n = len(class_ids)
+    return Detections(np.zeros((n, 4)), np.full(n, 0.9), class_ids, {0: "fire", 1: "smoke"}, (48, 64))
+
+
+def test_frame_reader_processes_every_frame_of_a_file(tmp_path):
+    reader = FrameReader(write_video(tmp_path / "clip.avi"), queue_size=2).start()
+
+    def predict_fn(images, conf, iou, max_det):
+        return [detections([]) for _ in images]
+
+    frames = [frame for frame, _, _ in iter_video_detections(predict_fn, reader, batch_size=4)]
+    assert [f.index for f in frames] == list(range(20))
+    assert reader.frames_dropped == 0
+
+
+def test_frame_reader_drops_oldest_frames_when_behind(tmp_path):
+    reader = FrameReader(write_video(tmp_path / "clip.avi", num_frames=30, fps=100.0), queue_size=2, realtime=True)
+    reader.start()
+
+    def slow_predict(images, conf, iou, max_det):
+        time.sleep(0.05)
+        return [detections([]) for _ in images]
+
+    frames = [frame for frame, _, _ in iter_video_detections(slow_predict, reader, batch_size=2)]
+    assert reader.frames_dropped > 0
+    assert len(frames) + reader.frames_dropped == reader.frames_read == 30
+    # The newest frame is never dropped
+    assert frames[-1].index == 29
+
+
+def test_persistence_filter_requires_consecutive_frames():
+    persistence = PersistenceFilter(min_frames=3, names={0: "fire", 1: "smoke"})
+    sequence = [[0], [], [0], [0, 1], [0], [0], []]
+    events = []
+    for i, class_ids in enumerate(sequence):
+        events += persistence.update(Frame(i, i / 10, 0.0, None), detections(class_ids))
+
+    assert [(e["event"], e["class_name"], e["frame_index"]) for e in events] == [
+        ("start", "fire", 4),
+        ("end", "fire", 6),
+    ]